@@ -30,4 +30,88 @@ INSERT INTO pois (name, x, y) VALUES
     ('Floricultura', 19, 21),
     ('Pub', 12, 8),
     ('Supermercado', 23, 6),
-    ('Churrascaria', 28, 2);
\ No newline at end of file
+    ('Churrascaria', 28, 2);
+
+-- Índice composto usado pela busca por proximidade (tabelas já existentes):
+CREATE INDEX IF NOT EXISTS ix_pois_x_y ON pois (x, y);
+
+-- Índice de trigramas para busca por nome e autocompletar (tabelas já existentes):
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS ix_pois_name_trgm ON pois USING gin (name gin_trgm_ops);
+
+-- Modo PostGIS (SPATIAL_BACKEND=postgis), o mesmo que python -m app.database.migrar_postgis:
+CREATE EXTENSION IF NOT EXISTS postgis;
+ALTER TABLE pois ADD COLUMN IF NOT EXISTS geom geometry(Point, 0)
+    GENERATED ALWAYS AS (ST_MakePoint(x, y)) STORED;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_pois_geom ON pois USING gist (geom);
+
+-- Os 10 POIs mais próximos de (20, 10) com o índice GiST:
+SELECT id, name, x, y FROM pois ORDER BY geom <-> ST_MakePoint(20, 10) LIMIT 10;
+
+-- Upsert (tabelas já existentes), o mesmo que python -m app.database.migrar_upsert:
+ALTER TABLE pois ADD COLUMN IF NOT EXISTS external_id VARCHAR;
+CREATE UNIQUE INDEX IF NOT EXISTS ux_pois_external_id ON pois (external_id);
+-- Chave natural (--chave-natural): remove as duplicatas e cria o índice único
+DELETE FROM pois WHERE id IN (
+    SELECT id FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY name, x, y ORDER BY id) AS rn FROM pois) AS ranked
+    WHERE rn > 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_pois_natural_key ON pois (name, x, y);
+
+-- Upsert de um POI pelo external_id (só grava se algo mudou):
+INSERT INTO pois (name, x, y, external_id) VALUES ('Casa', 19, 13, 'feed-1')
+ON CONFLICT (external_id) DO UPDATE SET name = excluded.name, x = excluded.x, y = excluded.y
+WHERE (pois.name, pois.x, pois.y) IS DISTINCT FROM (excluded.name, excluded.x, excluded.y);
+
+-- Log de mudanças (feed de /api/changes); criar_tabela cria as tabelas e a linha do contador
+CREATE TABLE IF NOT EXISTS poi_changes (
+    version BIGINT PRIMARY KEY, poi_id INTEGER NOT NULL, op VARCHAR(1) NOT NULL,
+    name VARCHAR, x INTEGER, y INTEGER
+);
+CREATE TABLE IF NOT EXISTS poi_change_version (
+    id INTEGER PRIMARY KEY, version BIGINT NOT NULL, pruned BIGINT NOT NULL
+);
+INSERT INTO poi_change_version (id, version, pruned) VALUES (1, 0, 0) ON CONFLICT DO NOTHING;
+
+-- Mudanças depois da versão 1500 (o cliente guarda a maior versão recebida):
+SELECT version, op, poi_id, name, x, y FROM poi_changes WHERE version > 1500 ORDER BY version LIMIT 1000;
+
+-- Layout em ladrilhos (python -m app.database.particionar_pois faz a cópia online em lotes):
+-- faixas de x subparticionadas por faixas de y, mais as partições DEFAULT
+CREATE TABLE pois_tiled (
+    id INTEGER NOT NULL DEFAULT nextval('pois_id_seq'::regclass),
+    name VARCHAR NOT NULL, x INTEGER NOT NULL, y INTEGER NOT NULL, external_id VARCHAR, zkey BIGINT,
+    CONSTRAINT check_x_positive CHECK (x >= 0), CONSTRAINT check_y_positive CHECK (y >= 0),
+    CONSTRAINT pois_tiled_pkey PRIMARY KEY (id, x, y)
+) PARTITION BY RANGE (x);
+CREATE TABLE pois_t0 PARTITION OF pois_tiled FOR VALUES FROM (0) TO (100000) PARTITION BY RANGE (y);
+CREATE TABLE pois_t0_0 PARTITION OF pois_t0 FOR VALUES FROM (0) TO (100000);
+CREATE TABLE pois_t0_default PARTITION OF pois_t0 DEFAULT;
+CREATE TABLE pois_t_default PARTITION OF pois_tiled DEFAULT;
+-- Durante a cópia, um gatilho anota os ids alterados em pois (por qualquer caminho)
+-- para reaplicá-los em pois_tiled antes da troca:
+CREATE TABLE pois_tiled_changes (seq BIGSERIAL PRIMARY KEY, poi_id INTEGER NOT NULL);
+CREATE FUNCTION pois_tiled_capture() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        INSERT INTO pois_tiled_changes (poi_id) VALUES (OLD.id);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO pois_tiled_changes (poi_id) VALUES (NEW.id);
+    END IF;
+    RETURN NULL;
+END $$;
+CREATE TRIGGER pois_tiled_capture AFTER INSERT OR UPDATE OR DELETE ON pois
+    FOR EACH ROW EXECUTE FUNCTION pois_tiled_capture();
+
+-- Só os ladrilhos que a caixa do círculo toca aparecem no plano:
+EXPLAIN SELECT id, name, x, y FROM pois
+WHERE x BETWEEN 19990 AND 20010 AND y BETWEEN 9990 AND 10010
+  AND (x - 20) * (x - 20) + (y - 10) * (y - 10) <= 100;
+
+-- Chave de Morton (backend zorder), o mesmo que python -m app.database.migrar_zorder;
+-- a API grava zkey em toda inserção e atualização (app/services/zorder.py)
+ALTER TABLE pois ADD COLUMN IF NOT EXISTS zkey BIGINT;
+CREATE INDEX IF NOT EXISTS ix_pois_zkey ON pois (zkey);
+-- Reescreve a tabela na ordem da curva Z (bloqueia a tabela; repita periodicamente)
+CLUSTER pois USING ix_pois_zkey;
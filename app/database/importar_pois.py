@@ -0,0 +1,44 @@
+# importar_pois.py
+import argparse
+import sys
+from app.services.importer import DEFAULT_CHUNK_SIZE, FORMATS, import_lines
+from app.services.upsert import INSERT, UPSERT
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa POIs em massa de um arquivo NDJSON ou CSV.")
+    parser.add_argument("arquivo", help="caminho do arquivo ('-' para ler da entrada padrão)")
+    parser.add_argument("--formato", choices=FORMATS, help="formato do arquivo (padrão: pela extensão)")
+    parser.add_argument("--lote", type=int, default=DEFAULT_CHUNK_SIZE, help="linhas por transação")
+    parser.add_argument("--upsert", action="store_true",
+                        help="não duplica POIs já importados (chave: external_id ou name, x, y)")
+    args = parser.parse_args(argv)
+
+    fmt = args.formato or ("csv" if args.arquivo.endswith(".csv") else "ndjson")
+    source = sys.stdin if args.arquivo == "-" else open(args.arquivo, encoding="utf-8", newline="")
+
+    accepted = rejected = 0
+    try:
+        mode = UPSERT if args.upsert else INSERT
+        for report in import_lines(source, fmt=fmt, chunk_size=args.lote, mode=mode):
+            accepted += report.accepted
+            rejected += report.rejected
+            line = f"lote {report.chunk}: {report.accepted} aceitos, {report.rejected} rejeitados"
+            if args.upsert:
+                line += f" ({report.updated} atualizados, {report.unchanged} sem alterações, {report.duplicates} repetidos)"
+            print(line)
+            for error in report.errors:
+                print(f"  {error}")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    print(f"Total: {accepted} aceitos, {rejected} rejeitados")
+    return 0 if rejected == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# Execute no terminal:
+# python -m app.database.importar_pois pois.ndjson
+# python -m app.database.importar_pois pois.csv --lote 10000
+# python -m app.database.importar_pois feed.ndjson --upsert
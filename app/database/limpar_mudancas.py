@@ -0,0 +1,31 @@
+# limpar_mudancas.py
+import argparse
+import sys
+from app.services.changes import prune_changes
+
+# Remove as mudanças mais antigas do log de /api/changes. Clientes cujo
+# `since` ficou antes do corte recebem 410 e voltam a baixar o /api/list.
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remove as mudanças antigas do log de mudanças dos POIs.")
+    parser.add_argument("--manter", type=int, default=1000000,
+                        help="quantidade de versões mais recentes mantidas no log (padrão: 1000000)")
+    args = parser.parse_args(argv)
+    if args.manter < 0:
+        parser.error("--manter deve ser maior ou igual a zero")
+
+    from app.database.pgsql import SessionLocal
+    session = SessionLocal()
+    try:
+        removed = prune_changes(session, args.manter)
+        session.commit()
+    finally:
+        session.close()
+    print(f"{removed} mudanças removidas do log.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# Execute no terminal:
+# python -m app.database.limpar_mudancas --manter 1000000
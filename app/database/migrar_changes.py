@@ -0,0 +1,32 @@
+# migrar_changes.py
+import sys
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from app.models.point import ChangeVersion, POIChange
+
+# Prepara um banco já existente para o log de mudanças (CHANGE_LOG=on):
+# cria poi_changes e poi_change_version e a linha do contador, que
+# criar_tabela só insere quando cria a tabela. Sem essa linha, toda gravação
+# com o log ligado falha.
+
+SEED_SQL = "INSERT INTO poi_change_version (id, version, pruned) VALUES (1, 0, 0) ON CONFLICT DO NOTHING"
+
+def migrate(engine: Engine, log=print):
+    """Cria as tabelas do log de mudanças que faltarem e a linha do contador."""
+    with engine.begin() as conn:
+        log("Criando as tabelas do log de mudanças...")
+        POIChange.__table__.create(conn, checkfirst=True)
+        ChangeVersion.__table__.create(conn, checkfirst=True)
+        conn.execute(text(SEED_SQL))
+    log("Migração concluída.")
+
+def main(argv=None):
+    from app.database.pgsql import engine
+    migrate(engine)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# Execute no terminal:
+# python -m app.database.migrar_changes
@@ -0,0 +1,70 @@
+# migrar_postgis.py
+import argparse
+import sys
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+# Coluna geometry gerada a partir de x/y (SRID 0: plano cartesiano, mesma
+# unidade das coordenadas) e índice GiST usado por ST_DWithin e pelo <->.
+# A coluna não faz parte do modelo POI: a API continua gravando só x/y e o
+# Postgres mantém a geometria; sem a migração, o modo SQL puro segue funcionando.
+GEOM_COLUMN = "geom"
+GEOM_INDEX = "ix_pois_geom"
+
+EXTENSION_SQL = "CREATE EXTENSION IF NOT EXISTS postgis"
+
+COLUMN_SQL = f"""
+ALTER TABLE pois ADD COLUMN IF NOT EXISTS {GEOM_COLUMN} geometry(Point, 0)
+    GENERATED ALWAYS AS (ST_MakePoint(x, y)) STORED
+"""
+
+INDEX_SQL = f"CREATE INDEX {{concurrently}} IF NOT EXISTS {GEOM_INDEX} ON pois USING gist ({GEOM_COLUMN})"
+
+def postgis_ready(engine: Engine) -> bool:
+    """Indica se a tabela pois já tem a coluna geometry e o índice GiST."""
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        column = conn.execute(text(
+            "SELECT 1 FROM information_schema.columns WHERE table_name = 'pois' AND column_name = :c"
+        ), {"c": GEOM_COLUMN}).first()
+        index = conn.execute(text(
+            "SELECT 1 FROM pg_indexes WHERE tablename = 'pois' AND indexname = :i"
+        ), {"i": GEOM_INDEX}).first()
+    return column is not None and index is not None
+
+def migrate(engine: Engine, concurrently: bool = True, log=print):
+    """
+    Habilita o PostGIS na tabela pois (idempotente).
+
+    Adicionar a coluna gerada reescreve a tabela sob lock exclusivo; o índice
+    é criado com CONCURRENTLY (por padrão) para não bloquear as gravações.
+    """
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("O modo PostGIS requer um banco Postgres")
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        log("Habilitando a extensão postgis...")
+        conn.execute(text(EXTENSION_SQL))
+        log(f"Adicionando a coluna {GEOM_COLUMN} (gerada a partir de x, y)...")
+        conn.execute(text(COLUMN_SQL))
+        log(f"Criando o índice GiST {GEOM_INDEX}...")
+        conn.execute(text(INDEX_SQL.format(concurrently="CONCURRENTLY" if concurrently else "")))
+        conn.execute(text("ANALYZE pois"))
+    log("Migração concluída. Use SPATIAL_BACKEND=postgis no .env.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Adiciona a coluna geometry e o índice GiST do modo PostGIS.")
+    parser.add_argument("--sem-concurrently", action="store_true",
+                        help="cria o índice sem CONCURRENTLY (mais rápido, mas bloqueia gravações)")
+    args = parser.parse_args(argv)
+
+    from app.database.pgsql import engine
+    migrate(engine, concurrently=not args.sem_concurrently)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# Execute no terminal:
+# python -m app.database.migrar_postgis
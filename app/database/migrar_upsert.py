@@ -0,0 +1,63 @@
+# migrar_upsert.py
+import argparse
+import sys
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from app.services.upsert import NATURAL_KEY_INDEX
+
+# Prepara uma tabela pois já existente para o upsert (tabelas novas, criadas
+# por criar_tabela, já nascem com a coluna external_id e seu índice único).
+
+COLUMN_SQL = "ALTER TABLE pois ADD COLUMN external_id VARCHAR"
+EXTERNAL_INDEX_SQL = "CREATE UNIQUE INDEX IF NOT EXISTS ux_pois_external_id ON pois (external_id)"
+
+# Mantém o POI mais antigo (menor id) de cada grupo com o mesmo (name, x, y)
+DEDUP_SQL = """
+DELETE FROM pois WHERE id IN (
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY name, x, y ORDER BY id) AS rn FROM pois
+    ) AS ranked WHERE rn > 1
+)
+"""
+NATURAL_INDEX_SQL = f"CREATE UNIQUE INDEX IF NOT EXISTS {NATURAL_KEY_INDEX} ON pois (name, x, y)"
+
+def migrate(engine: Engine, natural_key: bool = False, log=print) -> int:
+    """
+    Adiciona a coluna external_id (com índice único) se ela não existir e,
+    com `natural_key`, remove as duplicatas por (name, x, y) e cria o índice
+    único da chave natural. Retorna quantas duplicatas foram removidas.
+
+    Os POIs removidos não são retirados do cache nem dos índices em memória
+    de processos já em execução: rode com a API parada ou reinicie-a depois.
+    """
+    removed = 0
+    with engine.begin() as conn:
+        columns = {column["name"] for column in inspect(conn).get_columns("pois")}
+        if "external_id" not in columns:
+            log("Adicionando a coluna external_id...")
+            conn.execute(text(COLUMN_SQL))
+        conn.execute(text(EXTERNAL_INDEX_SQL))
+        if natural_key:
+            log("Removendo POIs duplicados por (name, x, y)...")
+            removed = conn.execute(text(DEDUP_SQL)).rowcount
+            log(f"{removed} duplicatas removidas. Criando o índice único {NATURAL_KEY_INDEX}...")
+            conn.execute(text(NATURAL_INDEX_SQL))
+    log("Migração concluída.")
+    return removed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepara a tabela pois para o upsert (importação idempotente).")
+    parser.add_argument("--chave-natural", action="store_true",
+                        help="remove duplicatas por (name, x, y) e cria o índice único usado pelo upsert sem external_id")
+    args = parser.parse_args(argv)
+
+    from app.database.pgsql import engine
+    migrate(engine, natural_key=args.chave_natural)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# Execute no terminal:
+# python -m app.database.migrar_upsert
+# python -m app.database.migrar_upsert --chave-natural
@@ -0,0 +1,106 @@
+# migrar_zorder.py
+import argparse
+import sys
+import time
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from app.services.finder import OPTIONAL_COLUMNS_RECHECK
+from app.services.zorder import morton_keys
+
+# Prepara uma tabela pois já existente para o backend espacial "zorder"
+# (tabelas novas, criadas por criar_tabela, já nascem com a coluna zkey e seu
+# índice, e a API grava a chave em toda inserção e atualização):
+#   1. adiciona a coluna zkey, se não existir, e espera a API em execução
+#      notar a coluna (OPTIONAL_COLUMNS_RECHECK): só então as atualizações
+#      passam a regravar a chave, e o preenchimento não deixa chaves velhas;
+#   2. preenche as chaves que faltam em lotes por id, cada um em sua
+#      transação (as chaves são calculadas em Python com NumPy);
+#   3. cria o índice B-tree ix_pois_zkey;
+#   4. opcionalmente (--cluster, só Postgres) reescreve a tabela na ordem da
+#      curva Z, para que as linhas de uma região fiquem nas mesmas páginas.
+#      CLUSTER bloqueia a tabela durante a reescrita e a ordem não é mantida
+#      pelas gravações seguintes: repita-o periodicamente, fora do pico.
+
+COLUMN_SQL = "ALTER TABLE pois ADD COLUMN zkey BIGINT"
+INDEX_SQL = "CREATE INDEX IF NOT EXISTS ix_pois_zkey ON pois (zkey)"
+
+DEFAULT_BACKFILL_CHUNK = 50000
+
+_PENDING_SQL = text("SELECT id, x, y FROM pois WHERE zkey IS NULL AND id > :last ORDER BY id LIMIT :chunk")
+_UPDATE_SQL = text("UPDATE pois SET zkey = :k WHERE id = :i AND x = :x AND y = :y")
+
+def backfill(engine: Engine, chunk: int = DEFAULT_BACKFILL_CHUNK, log=print) -> int:
+    """
+    Preenche zkey nas linhas em que ela é nula, em lotes de `chunk` ids.
+    Linhas movidas entre a leitura e a gravação são ignoradas (a própria
+    atualização já gravou a chave nova). Retorna quantas linhas foram preenchidas.
+    """
+    last, filled = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(_PENDING_SQL, {"last": last, "chunk": chunk}).all()
+            if not rows:
+                return filled
+            ids, xs, ys = zip(*rows)
+            keys = morton_keys(xs, ys).tolist()
+            conn.execute(_UPDATE_SQL, [
+                {"k": key, "i": poi_id, "x": x, "y": y} for key, poi_id, x, y in zip(keys, ids, xs, ys)
+            ])
+        filled += len(rows)
+        last = ids[-1]
+        log(f"  {filled} chaves preenchidas (até o id {last})")
+
+def migrate(engine: Engine, chunk: int = DEFAULT_BACKFILL_CHUNK, cluster: bool = False,
+            wait: float = OPTIONAL_COLUMNS_RECHECK, log=print) -> int:
+    """
+    Adiciona e preenche a coluna zkey, cria o índice e, com `cluster`,
+    reordena a tabela pela chave. Depois de criar a coluna, espera `wait`
+    segundos antes de preencher. Retorna quantas chaves foram preenchidas.
+    """
+    if cluster and engine.dialect.name != "postgresql":
+        raise RuntimeError("CLUSTER só existe no Postgres")
+    with engine.begin() as conn:
+        added = "zkey" not in {column["name"] for column in inspect(conn).get_columns("pois")}
+        if added:
+            log("Adicionando a coluna zkey...")
+            conn.execute(text(COLUMN_SQL))
+    if added and wait > 0:
+        log(f"Aguardando {wait:g}s para a API passar a gravar a chave...")
+        time.sleep(wait)
+
+    log("Preenchendo as chaves de Morton...")
+    filled = backfill(engine, chunk, log)
+
+    log("Criando o índice ix_pois_zkey...")
+    with engine.begin() as conn:
+        conn.execute(text(INDEX_SQL))
+
+    if cluster:
+        log("Reordenando a tabela pela chave (CLUSTER)...")
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("CLUSTER pois USING ix_pois_zkey"))
+            conn.execute(text("ANALYZE pois"))
+    log("Migração concluída.")
+    return filled
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepara a tabela pois para o backend espacial zorder (chave de Morton).")
+    parser.add_argument("--lote", type=int, default=DEFAULT_BACKFILL_CHUNK, help="linhas preenchidas por transação")
+    parser.add_argument("--cluster", action="store_true",
+                        help="reordena a tabela pela chave com CLUSTER (Postgres; bloqueia a tabela)")
+    args = parser.parse_args(argv)
+
+    from app.database.pgsql import engine
+    try:
+        migrate(engine, chunk=args.lote, cluster=args.cluster)
+    except RuntimeError as e:
+        print(f"Erro: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# Execute no terminal:
+# python -m app.database.migrar_zorder
+# python -m app.database.migrar_zorder --lote 100000 --cluster
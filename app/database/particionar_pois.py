@@ -0,0 +1,344 @@
+# particionar_pois.py
+import argparse
+import math
+import re
+import sys
+import time
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+
+# Layout em ladrilhos (opcional, só Postgres): a tabela pois vira uma tabela
+# particionada por faixas de x (PARTITION BY RANGE (x)) e cada faixa por
+# faixas de y, formando ladrilhos de `tile` x `tile`. As buscas já filtram por
+# x BETWEEN ... AND y BETWEEN ... (a caixa do círculo), então o Postgres só
+# lê as partições que a caixa toca; VACUUM e os índices passam a ser por
+# ladrilho. Partições DEFAULT recebem as coordenadas além da grade criada.
+#
+# A conversão é online:
+#   1. cria pois_tiled (particionada) e copia pois em lotes por id, cada
+#      lote em sua transação, sem bloquear leituras nem gravações;
+#   2. cria os índices de pois em pois_tiled depois da carga;
+#   3. reaplica as mudanças feitas durante a cópia: cada id alterado é
+#      apagado de pois_tiled e copiado de novo de pois;
+#   4. com a tabela bloqueada (LOCK ... IN ACCESS EXCLUSIVE MODE, o mesmo
+#      bloqueio do RENAME: pedir um mais fraco antes causaria deadlock com as
+#      gravações na fila), reaplica o resto e troca os nomes: pois ->
+#      pois_heap e pois_tiled -> pois. O bloqueio dura só essa reaplicação
+#      final; a espera por ele é limitada por lock_timeout, com novas
+#      tentativas. A tabela antiga fica para conferência/rollback.
+#
+# As mudanças feitas durante a cópia não vêm do log de mudanças (poi_changes):
+# ele vem desligado por padrão (CHANGE_LOG) e a importação por COPY não
+# o usa, e uma gravação fora dele se perderia na troca sem nenhum aviso. Antes
+# da cópia, um gatilho em pois (AFTER INSERT/UPDATE/DELETE, por linha) passa a
+# anotar os ids alterados em pois_tiled_changes, qualquer que seja o caminho
+# da gravação (API, importação, COPY ou SQL manual). A migração confere com
+# uma gravação de teste (desfeita em seguida) que o gatilho dispara e recusa
+# começar se não disparar. Requisito: nenhuma gravação em pois durante a
+# migração pode desligar os gatilhos (session_replication_role = replica) nem
+# usar TRUNCATE. Gatilho, função e tabela de ids são removidos na troca.
+#
+# Restrições do Postgres para tabelas particionadas: a chave primária passa a
+# ser (id, x, y) (o id continua vindo da mesma sequência) e índices únicos
+# precisam conter x e y. O índice único de external_id vira um índice comum,
+# então o upsert por external_id deixa de estar disponível (o upsert pela
+# chave natural (name, x, y) continua).
+
+TILED = "pois_tiled"
+OLD = "pois_heap"
+
+# Ids alterados em pois durante a cópia, anotados pelo gatilho CAPTURE
+CAPTURED = "pois_tiled_changes"
+CAPTURE = "pois_tiled_capture"
+
+_CAPTURE_DDL = (
+    f"CREATE TABLE {CAPTURED} (seq BIGSERIAL PRIMARY KEY, poi_id INTEGER NOT NULL)",
+    f"""CREATE FUNCTION {CAPTURE}() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        INSERT INTO {CAPTURED} (poi_id) VALUES (OLD.id);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO {CAPTURED} (poi_id) VALUES (NEW.id);
+    END IF;
+    RETURN NULL;
+END $$""",
+    f"CREATE TRIGGER {CAPTURE} AFTER INSERT OR UPDATE OR DELETE ON pois FOR EACH ROW EXECUTE FUNCTION {CAPTURE}()",
+)
+
+# Ladrilhos por eixo quando --ladrilho não é informado
+DEFAULT_TILES_PER_AXIS = 16
+
+# Máximo de ladrilhos: cada um é uma tabela, e o planejador paga por partição
+MAX_TILES = 4096
+
+DEFAULT_COPY_CHUNK = 50000
+
+# Colunas copiadas (geom, se existir, é gerada pelo próprio Postgres; zkey
+# entra quando a tabela de origem a tem)
+_COLUMNS = "id, name, x, y, external_id"
+
+_INDEXES_SQL = """
+SELECT c.relname, pg_get_indexdef(c.oid), x.indisunique,
+       ARRAY(SELECT a.attname FROM pg_attribute a
+             WHERE a.attrelid = x.indrelid AND a.attnum = ANY(x.indkey))::text[]
+FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid
+WHERE x.indrelid = 'pois'::regclass AND NOT x.indisprimary
+"""
+
+
+def is_tiled(conn: Connection, table: str = "pois") -> bool:
+    """Indica se a tabela já é particionada."""
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:t)"), {"t": table}
+    ).first() is not None
+
+
+def tile_grid(max_x: int, max_y: int, tile: Optional[int] = None) -> Tuple[int, int, int]:
+    """
+    Tamanho do ladrilho e quantidade de faixas em x e em y para cobrir
+    [0, max_x] x [0, max_y]. Sem `tile`, divide o maior eixo em
+    DEFAULT_TILES_PER_AXIS faixas.
+    """
+    if tile is None:
+        tile = max(1, math.ceil((max(max_x, max_y) + 1) / DEFAULT_TILES_PER_AXIS))
+    tiles_x, tiles_y = max_x // tile + 1, max_y // tile + 1
+    if tiles_x * tiles_y > MAX_TILES:
+        raise ValueError(f"{tiles_x * tiles_y} ladrilhos (máximo {MAX_TILES}): use um --ladrilho maior")
+    return tile, tiles_x, tiles_y
+
+
+def table_ddl(sequence: str, with_geom: bool, with_zkey: bool = False) -> str:
+    """CREATE TABLE da tabela particionada, com as colunas e restrições do modelo POI."""
+    geom = "    geom geometry(Point, 0) GENERATED ALWAYS AS (ST_MakePoint(x, y)) STORED,\n" if with_geom else ""
+    zkey = "    zkey BIGINT,\n" if with_zkey else ""
+    return (
+        f"CREATE TABLE {TILED} (\n"
+        f"    id INTEGER NOT NULL DEFAULT nextval('{sequence}'::regclass),\n"
+        "    name VARCHAR NOT NULL,\n"
+        "    x INTEGER NOT NULL,\n"
+        "    y INTEGER NOT NULL,\n"
+        "    external_id VARCHAR,\n"
+        f"{zkey}"
+        f"{geom}"
+        "    CONSTRAINT check_x_positive CHECK (x >= 0),\n"
+        "    CONSTRAINT check_y_positive CHECK (y >= 0),\n"
+        f"    CONSTRAINT {TILED}_pkey PRIMARY KEY (id, x, y)\n"
+        ") PARTITION BY RANGE (x)"
+    )
+
+
+def partition_ddl(tile: int, tiles_x: int, tiles_y: int) -> List[str]:
+    """Faixas de x (subparticionadas por y) e as partições DEFAULT de cada nível."""
+    statements = []
+    for i in range(tiles_x):
+        stripe = f"pois_t{i}"
+        statements.append(
+            f"CREATE TABLE {stripe} PARTITION OF {TILED} "
+            f"FOR VALUES FROM ({i * tile}) TO ({(i + 1) * tile}) PARTITION BY RANGE (y)"
+        )
+        for j in range(tiles_y):
+            statements.append(
+                f"CREATE TABLE {stripe}_{j} PARTITION OF {stripe} FOR VALUES FROM ({j * tile}) TO ({(j + 1) * tile})"
+            )
+        statements.append(f"CREATE TABLE {stripe}_default PARTITION OF {stripe} DEFAULT")
+    statements.append(f"CREATE TABLE pois_t_default PARTITION OF {TILED} DEFAULT")
+    return statements
+
+
+def tiled_index_ddl(name: str, definition: str, unique: bool, columns: List[str]) -> Tuple[str, bool]:
+    """
+    Reescreve a definição de um índice de pois para pois_tiled (nome com
+    sufixo _tiled). Índices únicos sem x e y viram comuns. Retorna (DDL, se
+    a unicidade foi removida).
+    """
+    dropped = unique and not {"x", "y"} <= set(columns)
+    ddl = re.sub(r" ON (ONLY )?(\S+\.)?pois ", f" ON {TILED} ", definition, count=1)
+    ddl = ddl.replace(f"INDEX {name} ON", f"INDEX {name}_tiled ON", 1)
+    if dropped:
+        ddl = ddl.replace("CREATE UNIQUE INDEX", "CREATE INDEX", 1)
+    return ddl, dropped
+
+
+def _copy(engine: Engine, chunk: int, columns: str, log) -> int:
+    """Copia pois para pois_tiled em lotes de `chunk` ids, um por transação."""
+    last, copied = 0, 0
+    while True:
+        with engine.begin() as conn:
+            upto = conn.execute(text(
+                "SELECT MAX(id) FROM (SELECT id FROM pois WHERE id > :last ORDER BY id LIMIT :chunk) AS lote"
+            ), {"last": last, "chunk": chunk}).scalar()
+            if upto is None:
+                return copied
+            copied += conn.execute(text(
+                f"INSERT INTO {TILED} ({columns}) SELECT {columns} FROM pois WHERE id > :last AND id <= :upto"
+            ), {"last": last, "upto": upto}).rowcount
+        last = upto
+        log(f"  {copied} POIs copiados (até o id {last})")
+
+
+def replay(conn: Connection, columns: str = _COLUMNS) -> int:
+    """
+    Reaplica em pois_tiled as mudanças anotadas pelo gatilho e já
+    confirmadas: os ids alterados são apagados e copiados de novo de pois
+    (inserções, atualizações e remoções do mesmo jeito). As anotações
+    reaplicadas saem de pois_tiled_changes; as de transações ainda abertas
+    ficam para a próxima rodada. Retorna quantos ids foram reaplicados.
+    """
+    ids = sorted(set(conn.execute(text(f"DELETE FROM {CAPTURED} RETURNING poi_id")).scalars()))
+    if not ids:
+        return 0
+    conn.execute(text(f"DELETE FROM {TILED} WHERE id = ANY(:ids)"), {"ids": ids})
+    conn.execute(text(f"INSERT INTO {TILED} ({columns}) SELECT {columns} FROM pois WHERE id = ANY(:ids)"),
+                 {"ids": ids})
+    return len(ids)
+
+
+def capture_fires(conn: Connection) -> bool:
+    """
+    Confere que o gatilho anota as gravações em pois: regrava uma linha sem
+    alterá-la (ou insere uma) e procura a anotação. Desfaz tudo ao final.
+    """
+    marker = conn.begin_nested()
+    try:
+        poi_id = conn.execute(text("UPDATE pois SET id = id WHERE id = (SELECT MIN(id) FROM pois) RETURNING id")).scalar()
+        if poi_id is None:
+            poi_id = conn.execute(text("INSERT INTO pois (name, x, y) VALUES ('', 0, 0) RETURNING id")).scalar_one()
+        return conn.execute(text(f"SELECT 1 FROM {CAPTURED} WHERE poi_id = :i"), {"i": poi_id}).first() is not None
+    finally:
+        marker.rollback()
+
+
+def _drop_capture(conn: Connection, table: str):
+    conn.execute(text(f"DROP TRIGGER IF EXISTS {CAPTURE} ON {table}"))
+    conn.execute(text(f"DROP FUNCTION IF EXISTS {CAPTURE}()"))
+    conn.execute(text(f"DROP TABLE IF EXISTS {CAPTURED}"))
+
+
+def _swap(conn: Connection, indexes: List[str], sequence: str):
+    conn.execute(text(f"ALTER TABLE pois RENAME TO {OLD}"))
+    conn.execute(text(f"ALTER TABLE {OLD} RENAME CONSTRAINT pois_pkey TO {OLD}_pkey"))
+    for name in indexes:
+        conn.execute(text(f"ALTER INDEX {name} RENAME TO {name}_heap"))
+        conn.execute(text(f"ALTER INDEX {name}_tiled RENAME TO {name}"))
+    conn.execute(text(f"ALTER TABLE {TILED} RENAME TO pois"))
+    conn.execute(text(f"ALTER TABLE pois RENAME CONSTRAINT {TILED}_pkey TO pois_pkey"))
+    # A sequência passa a pertencer à tabela nova (e sobrevive a DROP TABLE pois_heap)
+    conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY pois.id"))
+    _drop_capture(conn, OLD)
+
+
+def migrate(engine: Engine, tile: Optional[int] = None, extent: Optional[Tuple[int, int]] = None,
+            chunk: int = DEFAULT_COPY_CHUNK, lock_timeout: float = 10.0, attempts: int = 5, log=print) -> bool:
+    """
+    Converte a tabela pois para o layout em ladrilhos. `extent` (max_x,
+    max_y) define a grade (padrão: as maiores coordenadas atuais). Retorna
+    False se a tabela já estava particionada.
+    """
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("O layout em ladrilhos requer um banco Postgres")
+    with engine.begin() as conn:
+        if is_tiled(conn):
+            log("A tabela pois já está particionada.")
+            return False
+        leftovers = [t for t in (TILED, CAPTURED) if conn.execute(text("SELECT to_regclass(:t)"), {"t": t}).scalar()]
+        if leftovers:
+            raise RuntimeError(
+                f"{' e '.join(leftovers)} já existe (execução interrompida?): remova com "
+                f"DROP TRIGGER IF EXISTS {CAPTURE} ON pois; DROP FUNCTION IF EXISTS {CAPTURE}(); "
+                f"DROP TABLE IF EXISTS {CAPTURED}, {TILED}"
+            )
+        if extent is None:
+            extent = conn.execute(text("SELECT COALESCE(MAX(x), 0), COALESCE(MAX(y), 0) FROM pois")).one()
+        tile, tiles_x, tiles_y = tile_grid(extent[0], extent[1], tile)
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence('pois', 'id')")).scalar()
+        source_columns = set(conn.execute(text(
+            "SELECT column_name FROM information_schema.columns WHERE table_name = 'pois'"
+        )).scalars())
+        with_geom, with_zkey = "geom" in source_columns, "zkey" in source_columns
+        columns = _COLUMNS + (", zkey" if with_zkey else "")
+        source_indexes = conn.execute(text(_INDEXES_SQL)).all()
+
+        log(f"Criando {TILED}: {tiles_x} x {tiles_y} ladrilhos de {tile}...")
+        conn.execute(text(table_ddl(sequence, with_geom, with_zkey)))
+        for statement in partition_ddl(tile, tiles_x, tiles_y):
+            conn.execute(text(statement))
+        # Gravações confirmadas a partir daqui são anotadas e reaplicadas
+        # depois da cópia (CREATE TRIGGER espera as gravações em andamento)
+        for statement in _CAPTURE_DDL:
+            conn.execute(text(statement))
+        if not capture_fires(conn):
+            raise RuntimeError(
+                f"O gatilho {CAPTURE} não disparou (gatilhos desligados nesta sessão?): "
+                "as gravações feitas durante a cópia se perderiam"
+            )
+
+    log("Copiando os POIs...")
+    _copy(engine, chunk, columns, log)
+
+    log("Criando os índices...")
+    with engine.begin() as conn:
+        for name, definition, unique, index_columns in source_indexes:
+            ddl, dropped = tiled_index_ddl(name, definition, unique, index_columns)
+            if dropped:
+                log(f"  {name}: índice único sem x e y, criado como índice comum")
+            conn.execute(text(ddl))
+
+    # Reaplica as mudanças até sobrar pouco para o trecho com gravações bloqueadas
+    while True:
+        with engine.begin() as conn:
+            changed = replay(conn, columns)
+        log(f"  {changed} POIs alterados durante a cópia reaplicados")
+        if changed < chunk:
+            break
+
+    for attempt in range(1, attempts + 1):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{int(lock_timeout * 1000)}ms'"))
+                conn.execute(text("LOCK TABLE pois IN ACCESS EXCLUSIVE MODE"))
+                replay(conn, columns)
+                _swap(conn, [row[0] for row in source_indexes], sequence)
+            break
+        except OperationalError as e:
+            if attempt == attempts:
+                raise
+            log(f"  Troca adiada (tentativa {attempt}): {e.orig}")
+            time.sleep(1)
+            with engine.begin() as conn:
+                replay(conn, columns)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE pois"))
+    log(f"Migração concluída. A tabela anterior ficou como {OLD}: confira e remova com DROP TABLE {OLD}.")
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Particiona a tabela pois em ladrilhos de coordenadas (online, em lotes).")
+    parser.add_argument("--ladrilho", type=int, help="lado do ladrilho (padrão: o maior eixo dividido em 16)")
+    parser.add_argument("--extensao", type=int, nargs=2, metavar=("MAX_X", "MAX_Y"),
+                        help="coordenadas máximas cobertas pela grade (padrão: as atuais da tabela)")
+    parser.add_argument("--lote", type=int, default=DEFAULT_COPY_CHUNK, help="POIs copiados por transação")
+    parser.add_argument("--lock-timeout", type=float, default=10.0,
+                        help="segundos de espera pelo bloqueio das gravações na troca das tabelas")
+    args = parser.parse_args(argv)
+    if args.ladrilho is not None and args.ladrilho < 1:
+        parser.error("--ladrilho deve ser maior que zero")
+
+    from app.database.pgsql import engine
+    try:
+        migrate(engine, tile=args.ladrilho, extent=args.extensao, chunk=args.lote, lock_timeout=args.lock_timeout)
+    except (RuntimeError, ValueError) as e:
+        print(f"Erro: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# Execute no terminal:
+# python -m app.database.particionar_pois --ladrilho 100000
+# python -m app.database.particionar_pois --extensao 10000000 10000000 --lote 100000
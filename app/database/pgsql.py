@@ -1,6 +1,7 @@
 # database.py
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
@@ -10,12 +11,64 @@ load_dotenv(override=True)
 # URL de conexão com o banco de dados PostgreSQL
 DATABASE_URL = os.getenv('DATABASE_URL') 
 
+# URL para o driver assíncrono; o dialeto postgresql+psycopg serve para os dois modos
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL', DATABASE_URL)
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "sim", "on")
+
+def engine_options(url: str) -> dict:
+    """
+    Opções do engine lidas do .env: log de SQL (desligado por padrão) e
+    configuração do pool de conexões.
+    """
+    options = {
+        "echo": _env_bool("DB_ECHO", False),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+    # O SQLite não usa pool de conexões com tamanho configurável
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        )
+    return options
+
 # Cria o engine do SQLAlchemy para conectar ao banco
-engine = create_engine(DATABASE_URL, echo=True)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 # Cria uma fábrica de sessões para interagir com o banco
 SessionLocal = sessionmaker(bind=engine)
 
+# Engine e fábrica de sessões assíncronas, usadas pelos endpoints async
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+def async_url_for(url: str) -> str:
+    """URL equivalente para o driver assíncrono (o SQLite precisa do aiosqlite)."""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+def configure_database(url: str, async_url: str = None):
+    """
+    Aponta as fábricas de sessão para outro banco (ex.: benchmarks ou testes
+    com um banco descartável), recriando os engines síncrono e assíncrono.
+    """
+    global DATABASE_URL, ASYNC_DATABASE_URL, engine, async_engine
+    DATABASE_URL = url
+    ASYNC_DATABASE_URL = async_url or async_url_for(url)
+    engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+    SessionLocal.configure(bind=engine)
+    AsyncSessionLocal.configure(bind=async_engine)
+    return engine
+
 def get_db():
     """
     Dependência do FastAPI para obter uma sessão de banco de dados.
@@ -25,4 +78,11 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """
+    Dependência do FastAPI para obter uma sessão assíncrona de banco de dados.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,11 +1,70 @@
-from fastapi import FastAPI, Body, HTTPException
+import os
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Optional
+from fastapi import FastAPI, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.schemas.poi_schema import POISearchRequest, POISearchResponse, POIItem, POICreateResponse, POICreateRequest, POIUpdateRequest, POIDeleteResponse
-from app.services.finder import find_nearby_pois, find_pois, add_poi, list_pois, update_poi, delete_poi
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import pgsql
+from app.database.pgsql import get_async_db
+from app.database.migrar_postgis import postgis_ready
+from app.schemas.poi_schema import POISearchRequest, POISearchResponse, POIPageResponse, POIItem, POICreateResponse, POICreateRequest, POIUpdateRequest, POIDeleteResponse, POINearestRequest, POINearestResponse, POIBatchSearchRequest, POIBatchSearchResponse, POIImportResponse, POIImportChunk, CacheStatsResponse, POIBulkUpdateRequest, POIBulkDeleteRequest, POIBulkOutcome, POIBulkResponse, POIChangesResponse, POIChangeVersionResponse, POIViewportResponse
+from app.services.finder import nearby_columns, iter_pois, build_spatial_index, build_snapshot, build_name_index, spatial_backend
+from app.services.async_finder import find_nearby_rows, find_nearby_rows_batch, find_nearest_rows, find_rows, autocomplete_rows, add_poi, upsert_poi, list_rows, list_rows_page, update_poi, delete_poi
+from app.services.spatial_index import spatial_index_enabled
+from app.services.snapshot import snapshot_enabled
+from app.services.name_index import name_index_enabled
+from app.services.cache import get_query_cache
+from app.services.importer import DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE, LineSplitter, RecordParser, import_chunk
+from app.services.upsert import INSERT, MODES
+from app.services.bulk import DEFAULT_BULK_CHUNK_SIZE, MAX_BULK_CHUNK_SIZE, DELETED, UPDATED, bulk_delete_pois, bulk_update_pois
+from app.services.metrics import MetricsMiddleware, gauge_lines, process_memory, render_metrics, stage
+from app.services.changes import DEFAULT_CHANGES_LIMIT, ChangesPruned, change_log_enabled, current_version, iter_changes, read_changes
+from app.services.viewport import DEFAULT_MAX_POINTS, find_viewport_rows, viewport_cell_size
+from app.services.serializers import COLUMNS_MEDIA_TYPE, batch_json, changes_json, changes_ndjson, columns_binary, nearest_json, ndjson_line, rows_binary, search_json, viewport_json
 from app.models.point import POI
 
+# Indica se warmup() já rodou neste processo (ou no processo pai, antes do fork)
+_warm = False
+
+def warmup():
+    """
+    Prepara o estado caro do processo: confere a migração do modo PostGIS
+    (SPATIAL_BACKEND=postgis) e constrói os índices em memória habilitados
+    no .env (SPATIAL_INDEX=memory|snapshot e NAME_INDEX).
+
+    Roda uma única vez: com o app.servidor ela é chamada no processo pai e
+    os workers herdam os índices prontos pelo fork.
+    """
+    global _warm
+    if _warm:
+        return
+    if spatial_backend() == "postgis" and not postgis_ready(pgsql.engine):
+        raise RuntimeError("SPATIAL_BACKEND=postgis: execute antes python -m app.database.migrar_postgis")
+    if snapshot_enabled():
+        build_snapshot()
+    elif spatial_index_enabled():
+        build_spatial_index()
+    if name_index_enabled():
+        build_name_index()
+    _warm = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Inicialização da aplicação: aquece o processo (ver warmup) antes de
+    aceitar requisições e só então marca a aplicação como pronta (/ready).
+    """
+    app.state.ready = False
+    warmup()
+    app.state.ready = True
+    yield
+    app.state.ready = False
+
 # Instancia a aplicação FastAPI
-app = FastAPI(title="Points of Interest")
+app = FastAPI(title="Points of Interest", lifespan=lifespan)
 
 # Configurar CORS
 app.add_middleware(
@@ -16,66 +75,205 @@ app.add_middleware(
     allow_headers=["*"],  # Permite todos os headers
 )
 
+# Métricas por rota e por etapa (expostas em /metrics)
+app.add_middleware(MetricsMiddleware)
+
+
+# Documenta no OpenAPI o corpo alternativo das rotas com formato binário
+COLUMNS_RESPONSE = {200: {"content": {COLUMNS_MEDIA_TYPE: {}}}}
+
+def wants_columns(request: Request) -> bool:
+    """Negociação de conteúdo: o cliente pediu o formato binário colunar."""
+    return COLUMNS_MEDIA_TYPE in request.headers.get("accept", "")
+
+def rows_response(request: Request, rows, next_after: Optional[int] = None) -> Response:
+    """
+    Resposta das buscas e da listagem a partir das linhas (id, name, x, y[,
+    distância]): JSON (POISearchResponse/POIPageResponse) por padrão ou
+    binário colunar se pedido no Accept.
+    """
+    # O corpo depende do Accept: caches intermediários precisam distinguir
+    headers = {"Vary": "Accept"}
+    with stage("serialize"):
+        if wants_columns(request):
+            return Response(rows_binary(rows, next_after), media_type=COLUMNS_MEDIA_TYPE, headers=headers)
+        return Response(search_json(rows, next_after), media_type="application/json", headers=headers)
+
+@app.get("/api/list", response_model=POIPageResponse, response_model_exclude_none=True, responses=COLUMNS_RESPONSE)
+async def list_pois_endpoint(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    after: Optional[int] = None,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Retorna os POIs cadastrados.
+
+    - `limit`/`after`: paginação por cursor; use o `next_after` da resposta
+      como `after` da próxima página.
+    - `format=ndjson` (ou Accept: application/x-ndjson): envia um POI por
+      linha em streaming, lidos do banco em blocos.
+    - Sem parâmetros: retorna todos os POIs em uma única resposta.
+    - Accept: application/x-poi-columns: mesmo conteúdo no formato binário
+      colunar (ver app/services/serializers.py), com `next_after` no cabeçalho.
+    """
+
+    if format == "ndjson" or (format is None and "application/x-ndjson" in request.headers.get("accept", "")):
+        lines = (ndjson_line(row) for row in iter_pois(after=after))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
 
-@app.get("/api/list", response_model=POISearchResponse)
-def list_pois_endpoint():
+    if limit is not None:
+        rows = await list_rows_page(db, limit=limit, after=after)
+        next_after = rows[-1][0] if len(rows) == limit else None
+    else:
+        # Chama a função de listar os POIs no banco de dados
+        rows = await list_rows(db)
+        next_after = None
+
+    # Serializa as tuplas direto em JSON (mesmo corpo do POIPageResponse) ou no formato binário
+    return rows_response(request, rows, next_after)
+
+@app.get("/api/viewport", response_model=POIViewportResponse)
+async def viewport_endpoint(
+    min_x: int,
+    min_y: int,
+    max_x: int,
+    max_y: int,
+    cell_size: Optional[int] = Query(None, ge=1),
+    max_points: int = Query(DEFAULT_MAX_POINTS, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db),
+):
     """
-    Retorna todos os POIs cadastrados.
+    Retorna os POIs do retângulo [min_x, max_x] x [min_y, max_y] (viewport
+    do mapa). Até `max_points` POIs, eles voltam em `results`; acima disso,
+    a caixa é dividida em células de `cell_size` (o nível de zoom) e cada
+    célula ocupada vira um grupo em `clusters` (centróide e quantidade), ou
+    um POI em `results` se estiver sozinho. Sem `cell_size`, o lado maior é
+    dividido em 32 células; células pequenas demais para a caixa são
+    ampliadas (o valor usado volta em `cell_size`).
     """
+    if min_x > max_x or min_y > max_y:
+        raise HTTPException(status_code=422, detail="min_x/min_y devem ser menores ou iguais a max_x/max_y")
+    cell_size = viewport_cell_size(min_x, min_y, max_x, max_y, cell_size)
+    rows = await find_viewport_rows(db, min_x, min_y, max_x, max_y, cell_size, max_points)
+    with stage("serialize"):
+        return Response(viewport_json(rows, cell_size), media_type="application/json")
 
-    # Chama a função de listar os POIs no banco de dados
-    pois = list_pois()
+# Deve ser registrada antes de /api/{search}, que captura qualquer POST em /api/*
+@app.post("/api/nearest", response_model=POINearestResponse, responses=COLUMNS_RESPONSE)
+async def nearest_pois(request: POINearestRequest, http_request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Rota para buscar os k POIs mais próximos de (x, y), ordenados pela distância.
+    Com Accept: application/x-poi-columns, responde no formato binário colunar.
+    """
 
-    # Converta os objetos ORM para POIItem
-    poi_items = [POIItem(id=poi.id, name=poi.name, x=poi.x, y=poi.y) for poi in pois]
+    nearest = await find_nearest_rows(
+        db,
+        x=request.x,
+        y=request.y,
+        k=request.k,
+        max_distance=request.max_distance
+    )
 
-    # Retorna a resposta no formato esperado pelo cliente
-    return POISearchResponse(results=poi_items)
+    if wants_columns(http_request):
+        return rows_response(http_request, nearest)
+    with stage("serialize"):
+        return Response(nearest_json(nearest), media_type="application/json", headers={"Vary": "Accept"})
 
-@app.post("/api/{search}", response_model=POISearchResponse)
-def search_pois(request: POISearchRequest):
+@app.post("/api/{search}", response_model=POISearchResponse, responses=COLUMNS_RESPONSE)
+async def search_pois(request: POISearchRequest, http_request: Request, db: AsyncSession = Depends(get_async_db)):
     """
     Rota para buscar POIs próximos a um ponto (x, y), dentro de uma distância máxima (d-max).
+    Com Accept: application/x-poi-columns, responde no formato binário colunar.
     """
 
-    nearby_pois = find_nearby_pois(
+    # Com o snapshot colunar, o corpo binário sai direto das colunas, sem tuplas
+    if wants_columns(http_request):
+        columns = nearby_columns(request.x, request.y, request.max_distance)
+        if columns is not None:
+            with stage("serialize"):
+                return Response(columns_binary(*columns), media_type=COLUMNS_MEDIA_TYPE, headers={"Vary": "Accept"})
+
+    nearby = await find_nearby_rows(
+        db,
         x=request.x,
         y=request.y,
         max_distance=request.max_distance
     )
 
-    # Converte para POIItem
-    poi_items = [
-        POIItem(id=poi.id,name=poi.name, x=poi.x, y=poi.y) 
-        for poi in nearby_pois
-    ]
+    # Serializa as tuplas direto em JSON (mesmo corpo do POISearchResponse) ou no formato binário
+    return rows_response(http_request, nearby)
+
+@app.post("/api/search/batch", response_model=POIBatchSearchResponse)
+async def search_pois_batch(request: POIBatchSearchRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Rota para buscar POIs próximos de vários pontos de referência em uma única requisição.
+    """
+
+    batch = await find_nearby_rows_batch(db, [(query.x, query.y, query.max_distance) for query in request.queries])
 
-    return POISearchResponse(results=poi_items)
+    # Serializa as tuplas direto em JSON (mesmo corpo do POIBatchSearchResponse)
+    with stage("serialize"):
+        return Response(batch_json(batch), media_type="application/json")
 
-@app.get("/api/pois/{by_name}", response_model=POISearchResponse)
-def search_pois_by_name(name: str):   
+# Deve ser registrada antes de /api/pois/{by_name}, que captura qualquer GET em /api/pois/*
+@app.get("/api/pois/autocomplete", response_model=POISearchResponse, responses=COLUMNS_RESPONSE)
+async def autocomplete_pois_endpoint(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Rota para buscar POIs por nome.
+    Rota de autocompletar: POIs cujo nome começa com `q`, os mais parecidos primeiro.
     """
 
-    # Chama a função de busca no banco de dados
-    pois = find_pois(name=name)
+    rows = await autocomplete_rows(db, prefix=q, limit=limit)
+
+    return rows_response(request, rows)
+
+@app.get("/api/pois/{by_name}", response_model=POISearchResponse, responses=COLUMNS_RESPONSE)
+async def search_pois_by_name(
+    request: Request,
+    name: str,
+    limit: int = Query(100, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db)
+):   
+    """
+    Rota para buscar POIs por nome: até `limit` POIs (padrão 100, em ordem
+    de id) cujo nome contém `name`; % e _ são comparados literalmente.
+    """
 
-    # Converta os objetos ORM para POIItem
-    # Isso é necessário para garantir a serialização correta na resposta
-    poi_items = [POIItem(id=poi.id, name=poi.name, x=poi.x, y=poi.y) for poi in pois]
+    # Chama a função de busca no banco de dados
+    rows = await find_rows(db, name=name, limit=limit)
 
-    # Retorna a resposta no formato esperado pelo cliente
-    return POISearchResponse(results=poi_items)
+    # Serializa as tuplas direto em JSON (mesmo corpo do POISearchResponse) ou no formato binário
+    return rows_response(request, rows)
 
 @app.post("/api/pois/", response_model=POICreateResponse)
-def create_poi(poi_data: POICreateRequest):
+async def create_poi(poi_data: POICreateRequest, upsert: bool = False, db: AsyncSession = Depends(get_async_db)):
     """
-    Rota para cadastrar um POI.
+    Rota para cadastrar um POI. Com upsert=true o cadastro é idempotente: um
+    POI com o mesmo external_id é atualizado e, sem external_id, um POI com
+    o mesmo (name, x, y) é reaproveitado em vez de duplicado.
     """
+    if upsert:
+        if poi_data.x < 0 or poi_data.y < 0:
+            raise HTTPException(status_code=422, detail="coordenadas devem ser maiores ou iguais a zero")
+        try:
+            status, row = await upsert_poi(db, poi_data.name, poi_data.x, poi_data.y, poi_data.external_id or None)
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        messages = {"inserted": "criado", "updated": "atualizado", "unchanged": "já existia sem alterações"}
+        return POICreateResponse(
+            success=True,
+            message=f"POI '{poi_data.name}' {messages[status]}",
+            poi=POIItem(id=row[0], name=row[1], x=row[2], y=row[3]) if row else None
+        )
     try:
             # Adiciona o POI ao banco de dados
-            created_poi = add_poi(name=poi_data.name, x=poi_data.x, y=poi_data.y)
+            created_poi = await add_poi(db, name=poi_data.name, x=poi_data.x, y=poi_data.y, external_id=poi_data.external_id)
             
             if created_poi:
                 # Se necessário, poderia buscar o POI recém-criado para retornar seus dados
@@ -90,6 +288,9 @@ def create_poi(poi_data: POICreateRequest):
                     message="Falha ao criar POI - verifique os dados informados"
                 )
                 
+    except ValueError as e:
+        # external_id sem a coluna no banco (migração pendente)
+        return POICreateResponse(success=False, message=str(e))
     except Exception as e:
         # Log detalhado do erro (em produção, usar logging)
         print(f"Erro inesperado ao criar POI: {str(e)}")
@@ -98,10 +299,94 @@ def create_poi(poi_data: POICreateRequest):
             message="Ocorreu um erro interno ao processar sua requisição"
         )
 
+@app.post("/api/pois/bulk", response_model=POIImportResponse)
+async def bulk_import_pois(
+    request: Request,
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=MAX_CHUNK_SIZE),
+    mode: str = INSERT,
+):
+    """
+    Rota para importar POIs em massa a partir de um corpo NDJSON (padrão) ou
+    CSV (Content-Type: text/csv, com cabeçalho name,x,y e, opcionalmente,
+    external_id).
+
+    O corpo é lido em streaming e gravado em lotes de `chunk_size` linhas,
+    cada lote em sua própria transação (até 50000 linhas por lote). Com
+    mode=upsert, reimportar o mesmo feed não duplica POIs e só grava as
+    linhas novas ou alteradas.
+    """
+    if mode not in MODES:
+        raise HTTPException(status_code=422, detail=f"mode deve ser um de: {', '.join(MODES)}")
+
+    fmt = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    splitter = LineSplitter()
+    parser = RecordParser(fmt)
+    pending = []
+    chunks = []
+
+    async def flush():
+        report = await run_in_threadpool(import_chunk, len(chunks) + 1, pending.copy(), mode)
+        chunks.append(POIImportChunk(**asdict(report)))
+        pending.clear()
+
+    async for data in request.stream():
+        for line in splitter.feed(data):
+            parsed = parser.parse(line)
+            if parsed is not None:
+                pending.append(parsed)
+                if len(pending) >= chunk_size:
+                    await flush()
+    for line in splitter.close():
+        parsed = parser.parse(line)
+        if parsed is not None:
+            pending.append(parsed)
+    parsed = parser.close()
+    if parsed is not None:
+        pending.append(parsed)
+    if pending:
+        await flush()
+
+    return POIImportResponse(
+        accepted=sum(chunk.accepted for chunk in chunks),
+        rejected=sum(chunk.rejected for chunk in chunks),
+        chunks=chunks
+    )
+
+def bulk_response(outcomes) -> POIBulkResponse:
+    succeeded = sum(1 for outcome in outcomes if outcome.status in (UPDATED, DELETED))
+    return POIBulkResponse(
+        succeeded=succeeded,
+        failed=len(outcomes) - succeeded,
+        results=[POIBulkOutcome(**asdict(outcome)) for outcome in outcomes]
+    )
+
+@app.put("/api/pois/bulk", response_model=POIBulkResponse)
+async def bulk_update_endpoint(request: POIBulkUpdateRequest,
+                               chunk_size: int = Query(DEFAULT_BULK_CHUNK_SIZE, ge=1, le=MAX_BULK_CHUNK_SIZE)):
+    """
+    Rota para atualizar vários POIs de uma vez. Cada lote de `chunk_size` ids
+    é gravado com um único UPDATE ... FROM (VALUES ...) em sua própria
+    transação; o resultado traz o status de cada id.
+    """
+    patches = [item.model_dump(exclude_unset=True) for item in request.items]
+    outcomes = await run_in_threadpool(bulk_update_pois, patches, chunk_size)
+    return bulk_response(outcomes)
+
+@app.delete("/api/pois/bulk", response_model=POIBulkResponse)
+async def bulk_delete_endpoint(request: POIBulkDeleteRequest,
+                               chunk_size: int = Query(DEFAULT_BULK_CHUNK_SIZE, ge=1, le=MAX_BULK_CHUNK_SIZE)):
+    """
+    Rota para remover vários POIs de uma vez: um DELETE ... WHERE id = ANY(...)
+    por lote de `chunk_size` ids, com o status de cada id no resultado.
+    """
+    outcomes = await run_in_threadpool(bulk_delete_pois, request.ids, chunk_size)
+    return bulk_response(outcomes)
+
 @app.put("/api/pois/{poi_id}", response_model=POICreateResponse)
-def update_poi_endpoint(
+async def update_poi_endpoint(
     poi_id: int, 
-    update_data: POIUpdateRequest
+    update_data: POIUpdateRequest,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Atualiza um POI existente
@@ -116,7 +401,7 @@ def update_poi_endpoint(
     # Converte o Pydantic model para dict, removendo campos não informados (None)
     update_dict = update_data.model_dump(exclude_unset=True)
     
-    updated_poi = update_poi(poi_id, update_dict)
+    updated_poi = await update_poi(db, poi_id, update_dict)
     
     if not updated_poi:
         return POICreateResponse(
@@ -136,7 +421,7 @@ def update_poi_endpoint(
     )
 
 @app.delete("/api/pois/{poi_id}", response_model=POIDeleteResponse)
-def delete_poi_endpoint(poi_id: int):
+async def delete_poi_endpoint(poi_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Remove um POI pelo ID
     
@@ -146,7 +431,7 @@ def delete_poi_endpoint(poi_id: int):
     Returns:
         POIDeleteResponse: Resposta indicando sucesso/falha
     """
-    success = delete_poi(poi_id)
+    success = await delete_poi(db, poi_id)
     
     if success:
         return POIDeleteResponse(
@@ -158,4 +443,87 @@ def delete_poi_endpoint(poi_id: int):
         return POIDeleteResponse(
             success=False,
             message=f"POI {poi_id} não encontrado"
-        )
\ No newline at end of file
+        )
+
+def require_change_log():
+    """O feed só existe com o log ligado: sem ele, um cliente nunca veria mudanças."""
+    if not change_log_enabled():
+        raise HTTPException(status_code=404, detail="log de mudanças desligado (defina CHANGE_LOG=on)")
+
+@app.get("/api/changes", response_model=POIChangesResponse, dependencies=[Depends(require_change_log)])
+async def changes_endpoint(
+    request: Request,
+    since: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_CHANGES_LIMIT, ge=1, le=10000),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Retorna as inserções, atualizações e remoções de POIs posteriores à
+    versão `since`, só a última de cada POI. Um cliente novo baixa o
+    /api/list depois de ler /api/changes/version e, a partir daí, pede só
+    as mudanças (aplicando I/U como upsert e D como remoção).
+
+    - `version` da resposta é o `since` da próxima chamada; com `more`,
+      chame de novo em seguida.
+    - `format=ndjson` (ou Accept: application/x-ndjson): envia todas as
+      mudanças em streaming, uma por linha, terminando com {"version": ...}.
+    - 410: as mudanças depois de `since` já foram removidas do log; baixe
+      tudo de novo.
+    - 404: o log de mudanças está desligado (CHANGE_LOG=on o liga).
+    """
+    try:
+        if format == "ndjson" or (format is None and "application/x-ndjson" in request.headers.get("accept", "")):
+            batches = await run_in_threadpool(iter_changes, since)
+            return StreamingResponse(changes_ndjson(batches, since), media_type="application/x-ndjson")
+        changes, version, more = await read_changes(db, since, limit)
+    except ChangesPruned as e:
+        raise HTTPException(status_code=410, detail=str(e))
+
+    with stage("serialize"):
+        return Response(changes_json(changes, version, more), media_type="application/json")
+
+@app.get("/api/changes/version", response_model=POIChangeVersionResponse, dependencies=[Depends(require_change_log)])
+async def changes_version(db: AsyncSession = Depends(get_async_db)):
+    """Versão atual do log de mudanças: leia antes do /api/list na sincronização inicial."""
+    return POIChangeVersionResponse(version=await current_version(db))
+
+@app.get("/api/cache/stats", response_model=CacheStatsResponse)
+def cache_stats():
+    """
+    Retorna os contadores do cache de consultas (acertos, faltas, remoções e invalidações).
+    """
+    return CacheStatsResponse(**get_query_cache().stats())
+
+@app.get("/ready")
+def ready(request: Request):
+    """Prontidão do worker: 200 somente depois do warmup (índices construídos)."""
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Aplicação aquecendo")
+    return {"status": "ready", "pid": os.getpid()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Métricas no formato de exposição do Prometheus: latência por rota, tempo
+    por etapa (query, hydrate, filter, serialize), linhas examinadas x
+    retornadas, espera pelo pool de conexões, conexões em uso nos pools,
+    contadores do cache e memória do processo.
+    """
+    extra = []
+    pool = pgsql.async_engine.pool
+    if hasattr(pool, "checkedout"):
+        extra += gauge_lines("poi_db_pool_checked_out", "Conexões do pool assíncrono em uso.", pool.checkedout())
+        extra += gauge_lines("poi_db_pool_size", "Tamanho configurado do pool assíncrono.", pool.size())
+    sync_pool = pgsql.engine.pool
+    if hasattr(sync_pool, "checkedout"):
+        extra += gauge_lines("poi_db_sync_pool_checked_out", "Conexões do pool síncrono em uso.", sync_pool.checkedout())
+    stats = get_query_cache().stats()
+    extra += gauge_lines("poi_cache_entries", "Entradas no cache de consultas.", stats["entries"])
+    for name in ("hits", "misses", "evictions", "invalidations"):
+        extra += gauge_lines(f"poi_cache_{name}_total", f"Cache de consultas: {name}.", stats[name], kind="counter")
+    memory = process_memory()
+    if memory:
+        extra += gauge_lines("poi_process_rss_bytes", "Memória residente do worker que respondeu.", memory["rss"])
+        extra += gauge_lines("poi_process_uss_bytes", "Memória privada (não compartilhada pelo fork) do worker que respondeu.", memory["uss"])
+    return PlainTextResponse(render_metrics(extra), media_type="text/plain; version=0.0.4")
@@ -1,9 +1,16 @@
 # app/models/point.py
-from sqlalchemy import Column, Integer, String, CheckConstraint
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import BigInteger, Column, Integer, String, CheckConstraint, Index, DDL, event
+from sqlalchemy.orm import declarative_base, deferred
 
 Base = declarative_base()
 
+# O índice de trigramas do nome depende da extensão pg_trgm (apenas Postgres)
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
+
 class POI(Base):
     __tablename__ = 'pois'  # Nome da tabela no banco
 
@@ -11,12 +18,68 @@ class POI(Base):
     name = Column(String, nullable=False)
     x = Column(Integer, nullable=False)
     y = Column(Integer, nullable=False)
+    # Identificador do POI no feed de origem (opcional); chave do upsert.
+    # Adiado: só é carregado quando acessado, já que as leituras não o usam.
+    external_id = deferred(Column(String, nullable=True))
+    # Chave de Morton de (x, y) (app/services/zorder.py), gravada junto com as
+    # coordenadas; usada pelo backend espacial "zorder". Nula só em linhas
+    # anteriores à migração (python -m app.database.migrar_zorder).
+    zkey = deferred(Column(BigInteger, nullable=True))
 
     # Restrições para garantir apenas valores positivos
     __table_args__ = (
         CheckConstraint('x >= 0', name='check_x_positive'),
         CheckConstraint('y >= 0', name='check_y_positive'),
+        # Índice composto usado pelo pré-filtro de bounding box da busca por proximidade
+        Index('ix_pois_x_y', 'x', 'y'),
+        # Único: o upsert usa INSERT ... ON CONFLICT (external_id). NULLs não conflitam.
+        Index('ux_pois_external_id', 'external_id', unique=True),
+        # Faixas de chave de Morton: varreduras por região (e CLUSTER espacial)
+        Index('ix_pois_zkey', 'zkey'),
+        # Índice GIN de trigramas: acelera ILIKE '%nome%' e o autocompletar
+        Index(
+            'ix_pois_name_trgm', 'name',
+            postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'},
+        ),
     )
 
     def __repr__(self):
-        return f"<POI(id={self.id}, name='{self.name}', x={self.x}, y={self.y})>"
\ No newline at end of file
+        return f"<POI(id={self.id}, name='{self.name}', x={self.x}, y={self.y})>"
+
+class POIChange(Base):
+    """
+    Log de mudanças dos POIs (feed incremental de /api/changes): uma linha
+    por inserção (I), atualização (U) ou remoção (D), gravada na mesma
+    transação da alteração. Remoções guardam só o id.
+    """
+    __tablename__ = 'poi_changes'
+
+    version = Column(BigInteger, primary_key=True, autoincrement=False)
+    poi_id = Column(Integer, nullable=False)
+    op = Column(String(1), nullable=False)
+    name = Column(String, nullable=True)
+    x = Column(Integer, nullable=True)
+    y = Column(Integer, nullable=True)
+
+    def __repr__(self):
+        return f"<POIChange(version={self.version}, op='{self.op}', poi_id={self.poi_id})>"
+
+class ChangeVersion(Base):
+    """
+    Contador de versões do log (uma única linha). A trava da linha no UPDATE
+    que reserva as versões dura até o commit, então as versões ficam visíveis
+    em ordem crescente. `pruned` é a maior versão já removida do log.
+    """
+    __tablename__ = 'poi_change_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    pruned = Column(BigInteger, nullable=False, default=0)
+
+# A linha do contador nasce com a tabela
+event.listen(
+    ChangeVersion.__table__,
+    "after_create",
+    DDL("INSERT INTO poi_change_version (id, version, pruned) VALUES (1, 0, 0)"),
+)
@@ -1,5 +1,5 @@
 # app/schemas/poi_schema.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 class POISearchRequest(BaseModel):
@@ -25,12 +25,75 @@ class POISearchResponse(BaseModel):
     """
     results: List[POIItem]
 
+class POIPageResponse(POISearchResponse):
+    """
+    Modelo de resposta paginada: `next_after` é o cursor da próxima página
+    (ausente quando não há mais POIs).
+    """
+    next_after: Optional[int] = None
+
+class POIBatchSearchRequest(BaseModel):
+    """
+    Várias buscas por proximidade (x, y, max_distance) em uma única requisição.
+    """
+    queries: List[POISearchRequest] = Field(..., max_length=10000)
+
+class POIBatchSearchResponse(BaseModel):
+    """
+    Modelo de resposta da busca em lote: uma lista de POIs por consulta, na mesma ordem.
+    """
+    results: List[POISearchResponse]
+
+class POICluster(BaseModel):
+    """
+    Grupo de POIs de uma célula do viewport: centróide e quantidade.
+    """
+    x: float
+    y: float
+    count: int
+
+class POIViewportResponse(BaseModel):
+    """
+    Modelo de resposta da consulta por viewport: os POIs (todos, se a caixa
+    é esparsa, ou os que estão sozinhos na célula) e os grupos das células
+    com mais de um POI. `total` é a quantidade de POIs na caixa.
+    """
+    total: int
+    cell_size: int
+    results: List[POIItem]
+    clusters: List[POICluster]
+
+class POINearestRequest(BaseModel):
+    """
+    Busca pelos k POIs mais próximos de (x, y), opcionalmente limitada a um raio.
+    """
+    x: int
+    y: int
+    k: int = Field(10, gt=0, le=1000)
+    max_distance: Optional[int] = Field(None, ge=0)
+
+class POIDistanceItem(POIItem):
+    """
+    POI acompanhado da distância até o ponto de referência.
+    """
+    distance: float
+
+class POINearestResponse(BaseModel):
+    """
+    Modelo de resposta da busca k-NN: POIs ordenados pela distância.
+    """
+    results: List[POIDistanceItem]
+
 ###
 class POICreateRequest(BaseModel):
-    """Modelo de requisição para criação de um novo POI"""
+    """
+    Modelo de requisição para criação de um novo POI. O external_id
+    (opcional) identifica o POI no feed de origem e é a chave do upsert.
+    """
     name: str
     x: int
     y: int
+    external_id: Optional[str] = None
 
     class Config:
         json_schema_extra = {
@@ -62,8 +125,77 @@ class POIUpdateRequest(BaseModel):
             }
         }
 
+class POIPatch(POIUpdateRequest):
+    """Atualização de um POI dentro de uma atualização em massa"""
+    id: int
+
+class POIBulkUpdateRequest(BaseModel):
+    """Vários patches (id e campos a alterar) em uma única requisição"""
+    items: List[POIPatch] = Field(..., max_length=100000)
+
+class POIBulkDeleteRequest(BaseModel):
+    """Ids dos POIs a remover em uma única requisição"""
+    ids: List[int] = Field(..., max_length=100000)
+
+class POIBulkOutcome(BaseModel):
+    """Resultado de uma operação em massa para um id (updated, deleted, not_found, invalid ou error)"""
+    id: int
+    status: str
+    error: Optional[str] = None
+
+class POIBulkResponse(BaseModel):
+    """Modelo de resposta da atualização/remoção em massa"""
+    succeeded: int
+    failed: int
+    results: List[POIBulkOutcome]
+
+class POIChangesResponse(BaseModel):
+    """
+    Modelo de resposta do feed de mudanças: cada mudança é uma lista
+    [version, op, id, name, x, y] (op I ou U) ou [version, "D", id].
+    `version` é o `since` da próxima chamada; `more` indica que há mais.
+    """
+    changes: List[list]
+    version: int
+    more: bool
+
+class POIChangeVersionResponse(BaseModel):
+    """Versão atual do log de mudanças"""
+    version: int
+
 class POIDeleteResponse(BaseModel):
     """Modelo de resposta para deleção de POI"""
     success: bool
     message: str
-    deleted_id: Optional[int] = None
\ No newline at end of file
+    deleted_id: Optional[int] = None
+
+class POIImportChunk(BaseModel):
+    """
+    Resultado de um lote da importação em massa. No modo upsert, `updated`,
+    `unchanged` e `duplicates` (repetidos no próprio lote) fazem parte dos
+    aceitos; o restante foi inserido.
+    """
+    chunk: int
+    accepted: int
+    rejected: int
+    updated: int = 0
+    unchanged: int = 0
+    duplicates: int = 0
+    errors: List[str] = []
+
+class POIImportResponse(BaseModel):
+    """Modelo de resposta da importação em massa de POIs"""
+    accepted: int
+    rejected: int
+    chunks: List[POIImportChunk]
+
+class CacheStatsResponse(BaseModel):
+    """Contadores do cache de consultas"""
+    backend: str
+    entries: int
+    max_entries: int
+    ttl: float
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
@@ -0,0 +1,272 @@
+# app/services/async_finder.py
+
+import logging
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.concurrency import run_in_threadpool
+from app.models.point import POI
+from app.services.spatial_index import get_spatial_index
+from app.services.name_index import get_name_index
+from app.services.cache import Row, get_query_cache
+from app.services.metrics import record_rows, stage
+from app.services.upsert import upsert_records
+from app.services.changes import INSERTED, UPDATED, deletes, record_changes, upserts
+from app.services.zorder import morton_key
+from app.services.coalesce import get_search_coalescer
+from app.services.finder import find_nearby_rows_batch as find_nearby_rows_batch_sync
+from app.services.finder import (
+    POI_COLUMNS, autocomplete_statement, batch_chunks, batch_from_rows, batch_statement,
+    ids_statement, initial_nearest_radius, name_statement, nearby_from_index, nearby_statement, nearest_cache_radius, nearest_db_rows,
+    nearest_from_index, nearest_statement, next_nearest_radius, optional_columns,
+    order_by_ids, poi_values, page_statement, publish_write,
+)
+
+# Versões assíncronas das funções de app/services/finder.py. As consultas são
+# as mesmas (montadas pelos *_statement do finder); só a execução muda, para
+# que um worker mantenha muitas consultas em andamento sem ocupar threads.
+# A sessão é recebida do endpoint (dependência get_async_db), então cada
+# requisição usa uma única conexão do pool.
+#
+# As funções *_rows são o caminho rápido de leitura: retornam as tuplas
+# (id, name, x, y) lidas do banco, do índice ou do cache sem criar objetos
+# POI, para serem serializadas direto em JSON (app/services/serializers.py).
+
+logger = logging.getLogger(__name__)
+
+# As buscas no índice em memória usam a CPU sem ceder o event loop: acima
+# destes tamanhos (raio, k, consultas do lote, área do viewport) elas rodam
+# no pool de threads para não travar as outras requisições do worker.
+# Abaixo deles, a troca de thread custaria mais que a própria busca.
+INDEX_INLINE_RADIUS = 256
+INDEX_INLINE_K = 64
+INDEX_INLINE_QUERIES = 8
+INDEX_INLINE_AREA = (2 * INDEX_INLINE_RADIUS) ** 2
+
+async def run_index(large: bool, func, *args):
+    """Executa a busca no índice em memória no pool de threads se ela for `large`, ou aqui mesmo."""
+    if large:
+        return await run_in_threadpool(func, *args)
+    return func(*args)
+
+async def find_nearby_rows(session: AsyncSession, x: int, y: int, max_distance: int) -> List[Row]:
+    """
+    Retorna as linhas (id, name, x, y) dos POIs cuja distância até (x, y) seja menor ou igual à distância máxima.
+    """
+    if max_distance < 0:
+        return []
+
+    cache = get_query_cache()
+    key = ("nearby", x, y, max_distance)
+    generation = cache.generation()
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+
+    index = get_spatial_index()
+    coalescer = get_search_coalescer()
+    if index is not None:
+        rows = await run_index(max_distance > INDEX_INLINE_RADIUS, nearby_from_index, index, x, y, max_distance)
+    elif coalescer is not None:
+        # Buscas iguais em andamento (e, com o micro-batcher, as concorrentes) viram uma execução
+        rows = await coalescer.nearby(x, y, max_distance, generation)
+    else:
+        with stage("query"):
+            result = await session.execute(nearby_statement(x, y, max_distance))
+        with stage("hydrate"):
+            rows = [tuple(row) for row in result]
+        record_rows(len(rows), len(rows))
+
+    cache.put(key, rows, generation)
+    return rows
+
+async def find_nearby_rows_batch(session: AsyncSession, queries: Sequence[Tuple[int, int, int]]) -> List[List[Row]]:
+    """
+    Linhas (id, name, x, y) de cada consulta (x, y, max_distance), na mesma
+    ordem: um SELECT com as caixas combinadas por grupo de consultas (ou o
+    índice em memória), como finder.find_nearby_rows_batch.
+    """
+    index = get_spatial_index()
+    if index is not None:
+        large = len(queries) > INDEX_INLINE_QUERIES or any(d > INDEX_INLINE_RADIUS for _, _, d in queries)
+        return await run_index(large, find_nearby_rows_batch_sync, queries)
+    results: List[List[Row]] = [[] for _ in queries]
+    for chunk, boxes in batch_chunks(queries):
+        with stage("query"):
+            result = await session.execute(batch_statement(boxes))
+        with stage("hydrate"):
+            candidates = [tuple(row) for row in result]
+        batch_from_rows(chunk, candidates, results)
+    return results
+
+async def find_nearest_rows(session: AsyncSession, x: int, y: int, k: int, max_distance: Optional[int] = None) -> List[Row]:
+    """
+    Retorna até k linhas (id, name, x, y, distância) ordenadas pela distância até (x, y).
+    """
+    if k <= 0 or (max_distance is not None and max_distance < 0):
+        return []
+
+    cache = get_query_cache()
+    key = ("nearest", x, y, k, max_distance)
+    generation = cache.generation()
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+
+    index = get_spatial_index()
+    if index is not None:
+        # Sem max_distance, o k-NN pode varrer o índice inteiro até achar k POIs
+        large = k > INDEX_INLINE_K or max_distance is None or max_distance > INDEX_INLINE_RADIUS
+        rows = await run_index(large, nearest_from_index, index, x, y, k, max_distance)
+    else:
+        radius = initial_nearest_radius(max_distance)
+        scanned = 0
+        while True:
+            with stage("query"):
+                result = await session.execute(nearest_statement(x, y, k, radius))
+            with stage("hydrate"):
+                rows = result.all()
+            scanned += len(rows)
+            radius = next_nearest_radius(radius, len(rows), k, max_distance)
+            if radius is None:
+                rows = nearest_db_rows(rows)
+                break
+        record_rows(scanned, len(rows))
+
+    cache.put(key, rows, generation, nearest_cache_radius(rows, k, max_distance))
+    return rows
+
+async def list_rows(session: AsyncSession) -> List[Row]:
+    """Retorna as linhas (id, name, x, y) de todos os POIs, em ordem de id."""
+    with stage("query"):
+        result = await session.execute(select(*POI_COLUMNS).order_by(POI.id))
+    with stage("hydrate"):
+        return [tuple(row) for row in result]
+
+async def list_rows_page(session: AsyncSession, limit: int, after: Optional[int] = None) -> List[Row]:
+    """Retorna até `limit` linhas (id, name, x, y) com id maior que `after`, em ordem de id."""
+    with stage("query"):
+        result = await session.execute(page_statement(limit, after))
+    with stage("hydrate"):
+        return [tuple(row) for row in result]
+
+async def _rows_by_ids(session, ids: List[int]) -> List[Row]:
+    if not ids:
+        return []
+    return order_by_ids(await session.execute(ids_statement(ids)), ids)
+
+async def find_rows(session: AsyncSession, name: str, limit: Optional[int] = None) -> List[Row]:
+    """Retorna as linhas (id, name, x, y) dos POIs cujo nome contém `name` (sem diferenciar maiúsculas)."""
+    cache = get_query_cache()
+    key = ("name", name, limit)
+    generation = cache.generation()
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+
+    index = get_name_index()
+    if index is not None:
+        with stage("filter"):
+            ids = index.search(name, limit)
+        with stage("query"):
+            rows = await _rows_by_ids(session, ids)
+    else:
+        with stage("query"):
+            result = await session.execute(name_statement(name, limit))
+        with stage("hydrate"):
+            rows = [tuple(row) for row in result]
+
+    cache.put(key, rows, generation)
+    return rows
+
+async def autocomplete_rows(session: AsyncSession, prefix: str, limit: int = 10) -> List[Row]:
+    """Retorna até `limit` linhas (id, name, x, y) de POIs cujo nome começa com `prefix`, os mais parecidos primeiro."""
+    cache = get_query_cache()
+    key = ("autocomplete", prefix, limit)
+    generation = cache.generation()
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+
+    index = get_name_index()
+    if index is not None:
+        rows = await _rows_by_ids(session, index.autocomplete(prefix, limit))
+    else:
+        stmt = autocomplete_statement(prefix, limit, session.bind.dialect.name)
+        rows = [tuple(row) for row in await session.execute(stmt)]
+
+    cache.put(key, rows, generation)
+    return rows
+
+async def add_poi(session: AsyncSession, name: str, x: int, y: int,
+                  external_id: Optional[str] = None) -> Optional[POI]:
+    """
+    Cadastra um POI. Retorna None se a gravação falhar; lança ValueError se
+    vier um external_id e o banco ainda não tiver a coluna.
+    """
+    values = poi_values(await session.run_sync(optional_columns), name, x, y, external_id)
+    try:
+        poi_id = (await session.execute(insert(POI).values(values).returning(POI.id))).scalar_one()
+        row = (poi_id, name, x, y)
+        await session.run_sync(record_changes, upserts(INSERTED, [row]))
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        logger.exception("Erro ao adicionar POI")
+        return None
+    publish_write([row])
+    return POI(id=poi_id, name=name, x=x, y=y, external_id=external_id)
+
+async def upsert_poi(session: AsyncSession, name: str, x: int, y: int,
+                     external_id: Optional[str] = None) -> Tuple[str, Optional[Row]]:
+    """
+    Cadastra o POI sem duplicá-lo (ver app/services/upsert.py): pelo
+    external_id, se informado, ou pela chave natural (name, x, y).
+    Retorna ("inserted" | "updated" | "unchanged", linha (id, name, x, y)).
+    """
+    result = await session.run_sync(upsert_records, [(name, x, y, external_id)])
+    await session.commit()
+    result.publish()
+    status = "inserted" if result.inserted else "updated" if result.updated else "unchanged"
+    return status, result.rows[0]
+
+async def update_poi(session: AsyncSession, poi_id: int, update_data: dict) -> Optional[POI]:
+    """Atualiza um POI existente. Retorna None se ele não existir ou a gravação falhar."""
+    try:
+        poi = await session.get(POI, poi_id)
+        if not poi:
+            return None
+        old_row = (poi.id, poi.name, poi.x, poi.y)
+
+        for field, value in update_data.items():
+            if value is not None:  # Só atualiza campos que foram fornecidos
+                setattr(poi, field, value)
+        if "zkey" in await session.run_sync(optional_columns):
+            poi.zkey = morton_key(poi.x, poi.y)
+
+        await session.run_sync(record_changes, upserts(UPDATED, [(poi.id, poi.name, poi.x, poi.y)]))
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        logger.exception("Erro ao atualizar o POI %s", poi_id)
+        return None
+    publish_write([(poi.id, poi.name, poi.x, poi.y)], replaced=[old_row])
+    return poi
+
+async def delete_poi(session: AsyncSession, poi_id: int) -> bool:
+    """Remove um POI. Retorna True se foi deletado, False se não encontrado."""
+    try:
+        poi = await session.get(POI, poi_id)
+        if not poi:
+            return False
+
+        old_row = (poi.id, poi.name, poi.x, poi.y)
+        await session.delete(poi)
+        await session.run_sync(record_changes, deletes([poi_id]))
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        logger.exception("Erro ao deletar o POI %s", poi_id)
+        return False
+    publish_write(replaced=[old_row], removed=[poi_id])
+    return True
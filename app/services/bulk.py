@@ -0,0 +1,220 @@
+# app/services/bulk.py
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import Integer, any_, bindparam, delete, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.models.point import POI
+from app.database.pgsql import SessionLocal
+from app.services.finder import POI_COLUMNS, optional_columns, publish_write
+from app.services.metrics import record_rows, stage
+from app.services.changes import UPDATED as CHANGE_UPDATED, deletes, record_changes, upserts
+from app.services.zorder import morton_key
+
+# Atualização e remoção em massa: cada lote de ids vira um único UPDATE ...
+# FROM (VALUES ...) ou DELETE ... WHERE id = ANY(...) em sua própria
+# transação, sem carregar objetos POI. O resultado é um status por id.
+
+logger = logging.getLogger(__name__)
+
+# Quantidade padrão de ids por transação (5 parâmetros por linha no UPDATE)
+DEFAULT_BULK_CHUNK_SIZE = 1000
+
+# Maior lote aceito: 5 parâmetros por linha ficam abaixo do limite de
+# parâmetros por comando do psycopg (65.535) e do SQLite (32.766), e cada
+# tamanho de lote é um comando a mais no cache de update_statement
+MAX_BULK_CHUNK_SIZE = 5000
+
+UPDATED = "updated"
+DELETED = "deleted"
+NOT_FOUND = "not_found"
+INVALID = "invalid"
+ERROR = "error"
+
+_FIELDS = ("name", "x", "y")
+_COLUMNS = (("id", "INTEGER"), ("name", "VARCHAR"), ("x", "INTEGER"), ("y", "INTEGER"))
+_ZKEY = ("zkey", "BIGINT")
+
+
+@dataclass
+class BulkOutcome:
+    """Resultado da operação em massa para um id."""
+    id: int
+    status: str
+    error: Optional[str] = None
+
+
+def _chunks(items: Sequence, size: int) -> Iterator[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _ids_match(ids: Sequence[int], dialect: str):
+    """Condição id IN lote: no Postgres, um único array (= ANY) em vez de um parâmetro por id."""
+    if dialect == "postgresql":
+        return POI.id == any_(bindparam("ids", list(ids), type_=ARRAY(Integer)))
+    return POI.id.in_(list(ids))
+
+
+def merge_patches(patches: Sequence[dict]) -> Dict[int, dict]:
+    """
+    Junta os patches por id, na ordem da primeira ocorrência; para o mesmo
+    id, campos de patches posteriores prevalecem. Campos None são ignorados.
+    """
+    merged: Dict[int, dict] = {}
+    for patch in patches:
+        fields = merged.setdefault(patch["id"], {})
+        for name in _FIELDS:
+            if patch.get(name) is not None:
+                fields[name] = patch[name]
+    return merged
+
+
+def _check_patch(fields: dict) -> Optional[str]:
+    if not fields:
+        return "nenhum campo para atualizar"
+    if fields.get("x", 0) < 0 or fields.get("y", 0) < 0:
+        return "coordenadas devem ser maiores ou iguais a zero"
+    return None
+
+
+@lru_cache(maxsize=8)
+def update_statement(size: int, with_zkey: bool = True):
+    """
+    WITH v AS (VALUES ...) UPDATE pois ... FROM v para um lote de `size`
+    linhas: campos ausentes vão como NULL e o COALESCE mantém o valor atual
+    da coluna. A CTE (em vez de VALUES direto no FROM) também funciona no
+    SQLite, e os CASTs tipam as colunas do VALUES mesmo quando um campo vem
+    NULL em todas as linhas.
+
+    O SQL é texto com parâmetros nomeados (ver update_params): lotes do mesmo
+    tamanho reaproveitam o SQL compilado, já que compilar um VALUES de
+    milhares de linhas é o custo dominante do lote. Sem `with_zkey` (tabela
+    sem a coluna zkey), a chave de Morton fica de fora.
+    """
+    columns = _COLUMNS + (_ZKEY,) if with_zkey else _COLUMNS
+    rows = ",\n".join(
+        "(" + ", ".join(f"CAST(:{name}_{i} AS {sql_type})" for name, sql_type in columns) + ")"
+        for i in range(size)
+    )
+    names = ", ".join(f"v_{name}" for name, _ in columns)
+    zkey = ",\nzkey = COALESCE(v_zkey, zkey)" if with_zkey else ""
+    return text(
+        f"WITH v ({names}) AS (VALUES {rows})\n"
+        "UPDATE pois SET name = COALESCE(v_name, name), x = COALESCE(v_x, x), y = COALESCE(v_y, y)"
+        f"{zkey}\n"
+        "FROM v WHERE id = v_id RETURNING id, name, x, y"
+    )
+
+
+def update_params(patches: Sequence[Tuple[int, dict]], keys: Optional[Dict[int, int]] = None) -> dict:
+    """
+    Parâmetros de update_statement(len(patches)) para os patches do lote;
+    `keys` traz a chave de Morton final de cada id (ver zkey_updates) e
+    fica de fora, como no comando, quando é None.
+    """
+    params = {}
+    for i, (poi_id, fields) in enumerate(patches):
+        params[f"id_{i}"] = poi_id
+        for name in _FIELDS:
+            params[f"{name}_{i}"] = fields.get(name)
+        if keys is not None:
+            params[f"zkey_{i}"] = keys.get(poi_id)
+    return params
+
+
+def zkey_updates(patches: Sequence[Tuple[int, dict]], old_rows: Sequence[tuple]) -> Dict[int, int]:
+    """Chave de Morton da posição final de cada id existente: as coordenadas do patch ou as atuais."""
+    current = {row[0]: row for row in old_rows}
+    keys = {}
+    for poi_id, fields in patches:
+        if poi_id in current:
+            _, _, x, y = current[poi_id]
+            keys[poi_id] = morton_key(fields.get("x", x), fields.get("y", y))
+    return keys
+
+
+def _update_chunk(patches: Sequence[Tuple[int, dict]]) -> List[BulkOutcome]:
+    ids = [poi_id for poi_id, _ in patches]
+    session = SessionLocal()
+    try:
+        dialect = session.get_bind().dialect.name
+        with stage("query"):
+            # Valores anteriores, para invalidar o cache na posição antiga
+            old_rows = session.execute(select(*POI_COLUMNS).where(_ids_match(ids, dialect)).with_for_update()).all()
+            with_zkey = "zkey" in optional_columns(session)
+            keys = zkey_updates(patches, old_rows) if with_zkey else None
+            new_rows = session.execute(update_statement(len(patches), with_zkey), update_params(patches, keys)).all()
+        record_changes(session, upserts(CHANGE_UPDATED, new_rows))
+        session.commit()
+    except Exception:
+        session.rollback()
+        logger.exception("Falha ao gravar o lote de %d POIs (ids %s a %s)", len(ids), ids[0], ids[-1])
+        return [BulkOutcome(poi_id, ERROR, "falha ao gravar o lote") for poi_id in ids]
+    finally:
+        session.close()
+
+    new_rows = [tuple(row) for row in new_rows]
+    record_rows(len(ids), len(new_rows))
+    publish_write(new_rows, replaced=[tuple(row) for row in old_rows])
+    updated = {row[0] for row in new_rows}
+    return [BulkOutcome(poi_id, UPDATED if poi_id in updated else NOT_FOUND) for poi_id in ids]
+
+
+def bulk_update_pois(patches: Sequence[dict], chunk_size: int = DEFAULT_BULK_CHUNK_SIZE) -> List[BulkOutcome]:
+    """
+    Aplica patches {"id", "name"?, "x"?, "y"?} em lotes de `chunk_size` ids,
+    um UPDATE por lote. Retorna um BulkOutcome por id (updated, not_found,
+    invalid ou error). Se um lote falhar, só os ids dele ficam com erro.
+    """
+    chunk_size = min(chunk_size, MAX_BULK_CHUNK_SIZE)
+    merged = merge_patches(patches)
+    outcomes: Dict[int, BulkOutcome] = {}
+    valid: List[Tuple[int, dict]] = []
+    for poi_id, fields in merged.items():
+        problem = _check_patch(fields)
+        if problem:
+            outcomes[poi_id] = BulkOutcome(poi_id, INVALID, problem)
+        else:
+            valid.append((poi_id, fields))
+    for chunk in _chunks(valid, chunk_size):
+        outcomes.update((outcome.id, outcome) for outcome in _update_chunk(chunk))
+    # Mesma ordem dos ids na requisição
+    return [outcomes[poi_id] for poi_id in merged]
+
+
+def _delete_chunk(ids: Sequence[int]) -> List[BulkOutcome]:
+    session = SessionLocal()
+    try:
+        dialect = session.get_bind().dialect.name
+        with stage("query"):
+            statement = delete(POI).where(_ids_match(ids, dialect)).returning(*POI_COLUMNS)
+            deleted = session.execute(statement.execution_options(synchronize_session=False)).all()
+        record_changes(session, deletes([row[0] for row in deleted]))
+        session.commit()
+    except Exception:
+        session.rollback()
+        logger.exception("Falha ao remover o lote de %d POIs (ids %s a %s)", len(ids), ids[0], ids[-1])
+        return [BulkOutcome(poi_id, ERROR, "falha ao remover o lote") for poi_id in ids]
+    finally:
+        session.close()
+
+    deleted = [tuple(row) for row in deleted]
+    record_rows(len(ids), len(deleted))
+    publish_write(replaced=deleted, removed=[row[0] for row in deleted])
+    removed = {row[0] for row in deleted}
+    return [BulkOutcome(poi_id, DELETED if poi_id in removed else NOT_FOUND) for poi_id in ids]
+
+
+def bulk_delete_pois(ids: Sequence[int], chunk_size: int = DEFAULT_BULK_CHUNK_SIZE) -> List[BulkOutcome]:
+    """
+    Remove os POIs em lotes de `chunk_size` ids, um DELETE por lote. Ids
+    repetidos contam uma vez. Retorna um BulkOutcome por id (deleted,
+    not_found ou error).
+    """
+    unique = list(dict.fromkeys(ids))
+    outcomes: List[BulkOutcome] = []
+    for chunk in _chunks(unique, min(chunk_size, MAX_BULK_CHUNK_SIZE)):
+        outcomes.extend(_delete_chunk(chunk))
+    return outcomes
@@ -0,0 +1,294 @@
+# app/services/cache.py
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from app.models.point import POI
+
+# Chaves de cache: tuplas cujo primeiro item é o tipo da consulta
+#   ("nearby", x, y, max_distance)
+#   ("nearest", x, y, k, max_distance)
+#   ("name", name, limit)
+#   ("autocomplete", prefix, limit)
+#   ("viewport", x0, y0, x1, y1, cell_size, max_points)
+Key = Tuple[Any, ...]
+
+# Linha cacheada: (id, name, x, y) ou (id, name, x, y, distância)
+Row = Tuple[Any, ...]
+
+# Acima desta quantidade de pontos alterados de uma vez (ex.: importação em
+# massa) é mais barato limpar o cache do que testar entrada por entrada
+CLEAR_THRESHOLD = 100
+
+
+def _affected(key: Key, radius: Optional[float], points: Sequence[Tuple[str, int, int]]) -> bool:
+    """
+    Indica se a gravação de algum dos pontos (name, x, y) pode mudar o
+    resultado da consulta `key`, isto é, se o ponto cai na região da consulta.
+    """
+    kind = key[0]
+    if kind in ("nearby", "nearest"):
+        qx, qy = key[1], key[2]
+        if kind == "nearby":
+            radius = key[3]
+        if radius is None:
+            return bool(points)
+        return any((x - qx) ** 2 + (y - qy) ** 2 <= radius * radius for _, x, y in points)
+    if kind == "name":
+        text = key[1].lower()
+        # Curingas do ILIKE tornam o casamento imprevisível: invalida sempre
+        if "%" in text or "_" in text:
+            return bool(points)
+        return any(text in name.lower() for name, _, _ in points)
+    if kind == "viewport":
+        x0, y0, x1, y1 = key[1:5]
+        return any(x0 <= x <= x1 and y0 <= y <= y1 for _, x, y in points)
+    if kind == "autocomplete":
+        prefix = key[1].lower()
+        return any(name.lower().startswith(prefix) for name, _, _ in points)
+    return True
+
+
+class QueryCache:
+    """
+    Cache LRU com TTL, em memória, para resultados de busca.
+
+    Gravações invalidam apenas as entradas cuja região (círculo da busca por
+    proximidade ou k-NN, texto da busca por nome) contém o ponto alterado.
+    Cada processo tem o seu cache; com vários workers, a TTL limita por quanto
+    tempo um worker pode responder com um resultado de antes da gravação feita
+    em outro (use o RedisQueryCache para um cache compartilhado).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Key, Tuple[float, List[Row], Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self) -> int:
+        """Contador de gravações; use-o em put() para não cachear resultados obsoletos."""
+        return self._generation
+
+    def get(self, key: Key) -> Optional[List[Row]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Key, rows: List[Row], generation: int, radius: Optional[float] = None):
+        """
+        Guarda o resultado de `key`, a menos que alguma gravação tenha
+        acontecido desde `generation` (o resultado pode já estar obsoleto).
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, rows, radius)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_points(self, points: Sequence[Tuple[str, int, int]]):
+        """Remove as entradas afetadas pela gravação dos pontos (name, x, y)."""
+        if not points:
+            return
+        with self._lock:
+            self._generation += 1
+            if len(points) > CLEAR_THRESHOLD:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                return
+            stale = [key for key, (_, _, radius) in self._entries.items() if _affected(key, radius, points)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class RedisQueryCache(QueryCache):
+    """
+    Mesma interface do QueryCache, guardando as entradas em um Redis (ou
+    servidor compatível) local, compartilhado entre os workers.
+
+    As chaves ativas ficam registradas em um conjunto para que a invalidação
+    possa testar cada uma; a expiração por TTL fica a cargo do Redis.
+    """
+
+    PREFIX = "poi:cache:"
+
+    def __init__(self, url: str, max_entries: int = 1024, ttl: float = 60.0):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("QUERY_CACHE=redis requer o pacote 'redis' instalado") from e
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self._redis = redis.Redis.from_url(url)
+        self._keys = self.PREFIX + "keys"
+        self._gen_key = self.PREFIX + "generation"
+
+    def _name(self, key: Key) -> str:
+        return self.PREFIX + json.dumps(key, separators=(",", ":"))
+
+    def generation(self) -> int:
+        return int(self._redis.get(self._gen_key) or 0)
+
+    def get(self, key: Key) -> Optional[List[Row]]:
+        raw = self._redis.get(self._name(key))
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [tuple(row) for row in json.loads(raw)["rows"]]
+
+    def put(self, key: Key, rows: List[Row], generation: int, radius: Optional[float] = None):
+        if self.generation() != generation:
+            return
+        name = self._name(key)
+        pipe = self._redis.pipeline()
+        pipe.set(name, json.dumps({"rows": rows, "radius": radius}), px=int(self.ttl * 1000))
+        pipe.sadd(self._keys, name)
+        pipe.execute()
+
+    def invalidate_points(self, points: Sequence[Tuple[str, int, int]]):
+        if not points:
+            return
+        self._redis.incr(self._gen_key)
+        names = [n.decode() if isinstance(n, bytes) else n for n in self._redis.smembers(self._keys)]
+        stale = []
+        expired = []
+        for name in names:
+            key = tuple(json.loads(name[len(self.PREFIX):]))
+            radius = None
+            if key[0] == "nearest":
+                raw = self._redis.get(name)
+                if raw is None:
+                    expired.append(name)
+                    continue
+                radius = json.loads(raw)["radius"]
+            if len(points) > CLEAR_THRESHOLD or _affected(key, radius, points):
+                stale.append(name)
+        if stale or expired:
+            pipe = self._redis.pipeline()
+            if stale:
+                pipe.delete(*stale)
+            pipe.srem(self._keys, *(stale + expired))
+            pipe.execute()
+        with self._lock:
+            self.invalidations += len(stale)
+            self.evictions += len(expired)
+
+    def clear(self):
+        self._redis.incr(self._gen_key)
+        names = list(self._redis.smembers(self._keys))
+        if names:
+            self._redis.delete(*names)
+        self._redis.delete(self._keys)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["backend"] = "redis"
+        stats["entries"] = self._redis.scard(self._keys)
+        return stats
+
+
+class NullQueryCache(QueryCache):
+    """Cache desligado (QUERY_CACHE=off): nunca guarda nada."""
+
+    def get(self, key: Key) -> Optional[List[Row]]:
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: Key, rows: List[Row], generation: int, radius: Optional[float] = None):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["backend"] = "off"
+        return stats
+
+
+def create_query_cache() -> QueryCache:
+    """Cria o cache conforme o .env (QUERY_CACHE=memory|redis|off)."""
+    backend = os.getenv("QUERY_CACHE", "memory").lower()
+    max_entries = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+    ttl = float(os.getenv("QUERY_CACHE_TTL", "60"))
+    if backend in ("off", "none", "false", "0"):
+        return NullQueryCache(max_entries=max_entries, ttl=ttl)
+    if backend == "redis":
+        return RedisQueryCache(os.getenv("REDIS_URL", "redis://localhost:6379/0"), max_entries=max_entries, ttl=ttl)
+    return QueryCache(max_entries=max_entries, ttl=ttl)
+
+
+_cache: Optional[QueryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryCache:
+    """Retorna o cache de consultas do processo, criando-o no primeiro uso."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_query_cache()
+    return _cache
+
+
+def set_query_cache(cache: Optional[QueryCache]):
+    """Substitui o cache de consultas (None recria a partir do .env no próximo uso)."""
+    global _cache
+    _cache = cache
+
+
+def poi_rows(pois: Iterable[POI]) -> List[Row]:
+    """Converte POIs em linhas (id, name, x, y) para o cache."""
+    return [(poi.id, poi.name, poi.x, poi.y) for poi in pois]
+
+
+def rows_to_pois(rows: Iterable[Row]) -> List[POI]:
+    """Recria POIs (desanexados de sessão) a partir das linhas do cache."""
+    return [POI(id=row[0], name=row[1], x=row[2], y=row[3]) for row in rows]
+
+
+def invalidate_pois(rows: Iterable[Optional[Tuple[Any, str, int, int]]]):
+    """
+    Invalida o cache para as linhas (id, name, x, y) gravadas. Em uma
+    atualização, passe a linha antiga e a nova; linhas None são ignoradas.
+    """
+    points = [(name, x, y) for row in rows if row is not None for _, name, x, y in [row]]
+    get_query_cache().invalidate_points(points)
@@ -0,0 +1,169 @@
+# app/services/changes.py
+import os
+from typing import Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.point import ChangeVersion, POIChange
+from app.database.pgsql import SessionLocal
+from app.services.metrics import record_rows, stage
+
+# Log de mudanças para réplicas e clientes que sincronizam por diferença:
+# toda gravação de POIs (add/update/delete, upsert, importação e operações em
+# massa) registra aqui, na mesma transação, uma linha por POI alterado com
+# uma versão crescente. O cliente guarda a última versão recebida e pede só
+# o que mudou depois dela (GET /api/changes?since=...), em vez de baixar o
+# /api/list inteiro.
+#
+# As versões vêm de um contador de uma linha (poi_change_version): o UPDATE
+# que as reserva trava a linha até o commit, então uma transação só recebe
+# versões depois que as anteriores foram confirmadas e o leitor nunca vê a
+# versão N+1 antes da N. O custo é serializar o trecho final das gravações,
+# por isso o log é opcional (CHANGE_LOG=on). Em bancos criados antes dele,
+# rode python -m app.database.migrar_changes antes de ligá-lo.
+
+INSERTED = "I"
+UPDATED = "U"
+DELETED = "D"
+
+# Mudança a registrar: (op, poi_id, name, x, y); remoções levam só o id
+Change = Tuple[str, int, Optional[str], Optional[int], Optional[int]]
+
+DEFAULT_CHANGES_LIMIT = 1000
+
+
+class ChangesPruned(Exception):
+    """A versão pedida já foi removida do log: o cliente precisa ressincronizar tudo."""
+
+    def __init__(self, since: int, pruned: int):
+        super().__init__(f"mudanças até a versão {pruned} já foram removidas do log (pedido: {since})")
+        self.pruned = pruned
+
+
+def change_log_enabled() -> bool:
+    """Indica se o log de mudanças foi ligado no .env (CHANGE_LOG=on); desligado por padrão."""
+    return os.getenv("CHANGE_LOG", "off").lower() in ("1", "true", "on", "yes")
+
+
+def upserts(op: str, rows: Sequence[Tuple[int, str, int, int]]) -> List[Change]:
+    """Mudanças de inserção ou atualização para linhas (id, name, x, y)."""
+    return [(op, row[0], row[1], row[2], row[3]) for row in rows]
+
+
+def deletes(ids: Sequence[int]) -> List[Change]:
+    """Mudanças de remoção para os ids."""
+    return [(DELETED, poi_id, None, None, None) for poi_id in ids]
+
+
+def record_changes(session: Session, changes: Sequence[Change]):
+    """
+    Registra as mudanças na transação da sessão, reservando uma versão para
+    cada uma. Chame depois das gravações e logo antes do commit: a linha do
+    contador fica travada até o fim da transação. Não faz commit.
+    """
+    if not changes or not change_log_enabled():
+        return
+    counter = ChangeVersion.__table__
+    with stage("query"):
+        last = session.execute(
+            update(counter).where(counter.c.id == 1)
+            .values(version=counter.c.version + len(changes))
+            .returning(counter.c.version)
+        ).scalar_one()
+        first = last - len(changes) + 1
+        session.execute(insert(POIChange.__table__), [
+            {"version": first + i, "op": op, "poi_id": poi_id, "name": name, "x": x, "y": y}
+            for i, (op, poi_id, name, x, y) in enumerate(changes)
+        ])
+
+
+def compact(rows: Sequence[tuple]) -> List[tuple]:
+    """
+    Mantém só a última mudança de cada POI entre as linhas (version, op,
+    poi_id, name, x, y), em ordem de versão. Basta ao cliente: inserções e
+    atualizações são aplicadas como upsert e a remoção de um id desconhecido
+    é ignorada.
+    """
+    last = {row[2]: row for row in rows}
+    return sorted(last.values(), key=lambda row: row[0])
+
+
+def changes_statement(since: int, limit: Optional[int] = None):
+    stmt = (
+        select(POIChange.version, POIChange.op, POIChange.poi_id, POIChange.name, POIChange.x, POIChange.y)
+        .where(POIChange.version > since)
+        .order_by(POIChange.version)
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def _check_since(session: Session, since: int):
+    pruned = session.execute(select(ChangeVersion.pruned).where(ChangeVersion.id == 1)).scalar_one()
+    if since < pruned:
+        raise ChangesPruned(since, pruned)
+
+
+async def current_version(session: AsyncSession) -> int:
+    """Última versão registrada: o ponto de partida de um cliente que acabou de baixar tudo."""
+    return (await session.execute(select(ChangeVersion.version).where(ChangeVersion.id == 1))).scalar_one()
+
+
+async def read_changes(session: AsyncSession, since: int,
+                       limit: int = DEFAULT_CHANGES_LIMIT) -> Tuple[List[tuple], int, bool]:
+    """
+    Lê até `limit` mudanças posteriores a `since` e as compacta. Retorna
+    (mudanças, versão para o próximo `since`, se há mais mudanças). Lança
+    ChangesPruned se o log já não tem todas as mudanças depois de `since`.
+    """
+    with stage("query"):
+        rows = (await session.execute(changes_statement(since, limit))).all()
+        # Verificado depois da leitura: um corte confirmado antes dela é visto aqui
+        await session.run_sync(_check_since, since)
+    with stage("hydrate"):
+        changes = compact(rows)
+    record_rows(len(rows), len(changes))
+    version = rows[-1][0] if rows else since
+    return changes, version, len(rows) == limit
+
+
+def iter_changes(since: int, batch_size: int = 1000) -> Iterator[List[tuple]]:
+    """
+    Abre um cursor do lado do servidor com as mudanças posteriores a `since`
+    e retorna um gerador de blocos de até `batch_size` mudanças, em ordem de
+    versão e compactados por bloco. Lança ChangesPruned já na chamada (antes
+    do streaming começar) se o log não tem todas as mudanças depois de `since`.
+    """
+    session = SessionLocal()
+    try:
+        result = session.execute(changes_statement(since).execution_options(yield_per=batch_size))
+        _check_since(session, since)
+    except Exception:
+        session.close()
+        raise
+
+    def batches():
+        try:
+            for partition in result.partitions():
+                yield compact(partition)
+        finally:
+            session.close()
+    return batches()
+
+
+def prune_changes(session: Session, keep: int) -> int:
+    """
+    Remove do log as mudanças mais antigas, mantendo as últimas `keep`
+    versões. Clientes com `since` anterior ao corte recebem 410 e voltam a
+    baixar tudo. Retorna quantas linhas foram removidas. Não faz commit.
+    """
+    counter = ChangeVersion.__table__
+    version, pruned = session.execute(
+        select(counter.c.version, counter.c.pruned).where(counter.c.id == 1)
+    ).one()
+    upto = version - keep
+    if upto <= pruned:
+        return 0
+    session.execute(update(counter).where(counter.c.id == 1).values(pruned=upto))
+    return session.execute(delete(POIChange.__table__).where(POIChange.version <= upto)).rowcount
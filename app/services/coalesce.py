@@ -0,0 +1,198 @@
+# app/services/coalesce.py
+import asyncio
+import os
+import threading
+import weakref
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple, TypeVar
+from app.database import pgsql
+from app.services.cache import Row
+from app.services.finder import batch_from_rows, batch_statement, nearby_statement
+from app.services.metrics import COALESCED, SEARCH_BATCH_SIZE, record_rows, stage
+
+# Buscas por proximidade concorrentes no banco, em duas camadas:
+#
+# - single-flight: buscas idênticas (mesmo x, y, max_distance e geração do
+#   cache) em andamento ao mesmo tempo viram uma só execução; as demais
+#   aguardam o resultado dela. Cobre o intervalo entre a falha no cache e o
+#   put, em que um ponto quente geraria uma consulta por requisição.
+# - micro-batcher (opcional): as buscas que chegam enquanto `concurrency`
+#   lotes já estão no banco esperam e seguem juntas no próximo, em um único
+#   SELECT com as caixas combinadas (como find_nearby_rows_batch); o
+#   resultado de cada uma é separado no Python. Sem carga, a busca vai
+#   sozinha e na hora, então a latência não aumenta; `window` (padrão 0)
+#   segura cada lote por alguns milissegundos para juntar mais buscas.
+#
+# As execuções compartilhadas usam uma sessão própria (não a da requisição
+# que as iniciou) e são protegidas com asyncio.shield: se o cliente que as
+# iniciou desconectar, as demais continuam recebendo o resultado.
+#
+# Só o caminho do banco passa por aqui: com um índice em memória a busca é
+# síncrona e curta, sem nada em andamento para compartilhar.
+
+T = TypeVar("T")
+
+Query = Tuple[int, int, int]
+
+DEFAULT_BATCH_MAX = 64
+DEFAULT_BATCH_CONCURRENCY = 4
+
+
+async def nearby_rows(queries: Sequence[Query]) -> List[List[Row]]:
+    """
+    Executa as buscas (x, y, max_distance) em uma sessão própria: uma busca
+    usa nearby_statement; várias, um único SELECT com as caixas combinadas.
+    """
+    async with pgsql.AsyncSessionLocal() as session:
+        if len(queries) == 1:
+            with stage("query"):
+                result = await session.execute(nearby_statement(*queries[0]))
+            with stage("hydrate"):
+                rows = [tuple(row) for row in result]
+            record_rows(len(rows), len(rows))
+            return [rows]
+
+        boxes = [(x - d, y - d, x + d, y + d) for x, y, d in queries]
+        with stage("query"):
+            result = await session.execute(batch_statement(boxes))
+        with stage("hydrate"):
+            candidates = [tuple(row) for row in result]
+    results: List[List[Row]] = [[] for _ in queries]
+    batch_from_rows(list(enumerate(queries)), candidates, results)
+    return results
+
+
+class _LoopState:
+    """Estado por event loop: futures e tarefas não podem ser usadas em outro loop."""
+
+    def __init__(self):
+        self.flights: Dict[Hashable, asyncio.Future] = {}
+        self.pending: List[Tuple[Query, asyncio.Future]] = []
+        self.running = 0
+        # O loop só guarda referências fracas às tarefas: sem esta, um
+        # _drain pendente poderia ser coletado e deixar os pedidos esperando
+        self.drains: Set[asyncio.Task] = set()
+
+
+class SearchCoalescer:
+    """
+    Single-flight das buscas por proximidade e, com `batch`, o micro-batcher.
+    `runner` executa uma lista de buscas (padrão: nearby_rows, no banco).
+    Use get_search_coalescer() para a instância configurada pelo .env.
+    """
+
+    def __init__(self, batch: bool = False, window: float = 0.0,
+                 max_batch: int = DEFAULT_BATCH_MAX, concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+                 runner: Callable[[Sequence[Query]], Awaitable[List[List[Row]]]] = nearby_rows):
+        self.runner = runner
+        self.batch = batch
+        self.window = window
+        self.max_batch = max_batch
+        self.concurrency = concurrency
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState()
+        return state
+
+    async def single_flight(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Executa fn(), ou aguarda a execução de `key` que já estiver em andamento."""
+        flights = self._state().flights
+        flight = flights.get(key)
+        if flight is not None:
+            COALESCED.inc(1, "single_flight")
+        else:
+            flight = asyncio.ensure_future(fn())
+            flights[key] = flight
+            flight.add_done_callback(lambda done: flights.pop(key) if flights.get(key) is done else None)
+        return await asyncio.shield(flight)
+
+    async def nearby(self, x: int, y: int, max_distance: int, generation: int = 0) -> List[Row]:
+        """
+        Linhas (id, name, x, y) dos POIs a até `max_distance` de (x, y).
+        `generation` (a do cache de consultas) entra na chave: uma busca
+        iniciada depois de uma gravação não reaproveita uma anterior a ela.
+        """
+        query = (x, y, max_distance)
+        if self.batch:
+            return await self.single_flight(("nearby", generation) + query, lambda: self._submit(query))
+        return await self.single_flight(("nearby", generation) + query, lambda: self._run_one(query))
+
+    async def _run_one(self, query: Query) -> List[Row]:
+        return (await self.runner([query]))[0]
+
+    async def _submit(self, query: Query) -> List[Row]:
+        state = self._state()
+        future = asyncio.get_running_loop().create_future()
+        state.pending.append((query, future))
+        if state.running < self.concurrency:
+            state.running += 1
+            drain = asyncio.ensure_future(self._drain(state))
+            state.drains.add(drain)
+            drain.add_done_callback(state.drains.discard)
+        return await future
+
+    async def _drain(self, state: _LoopState):
+        try:
+            while state.pending:
+                if self.window > 0:
+                    await asyncio.sleep(self.window)
+                batch = state.pending[:self.max_batch]
+                del state.pending[:self.max_batch]
+                SEARCH_BATCH_SIZE.observe(len(batch))
+                if len(batch) > 1:
+                    COALESCED.inc(len(batch), "batch")
+                try:
+                    results = await self.runner([query for query, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for (_, future), rows in zip(batch, results):
+                        if not future.done():
+                            future.set_result(rows)
+        finally:
+            state.running -= 1
+
+
+def create_search_coalescer() -> Optional[SearchCoalescer]:
+    """
+    Cria o coalescedor conforme o .env: SEARCH_COALESCE=off desliga tudo;
+    SEARCH_BATCH=on liga o micro-batcher (SEARCH_BATCH_WINDOW_MS,
+    SEARCH_BATCH_MAX e SEARCH_BATCH_CONCURRENCY).
+    """
+    if os.getenv("SEARCH_COALESCE", "on").lower() in ("0", "false", "off", "no"):
+        return None
+    return SearchCoalescer(
+        batch=os.getenv("SEARCH_BATCH", "off").lower() in ("1", "true", "on", "yes"),
+        window=float(os.getenv("SEARCH_BATCH_WINDOW_MS", "0")) / 1000,
+        max_batch=int(os.getenv("SEARCH_BATCH_MAX", str(DEFAULT_BATCH_MAX))),
+        concurrency=int(os.getenv("SEARCH_BATCH_CONCURRENCY", str(DEFAULT_BATCH_CONCURRENCY))),
+    )
+
+
+_coalescer: Optional[SearchCoalescer] = None
+_configured = False
+_coalescer_lock = threading.Lock()
+
+
+def get_search_coalescer() -> Optional[SearchCoalescer]:
+    """Coalescedor do processo (None se desligado), criado na primeira chamada."""
+    global _coalescer, _configured
+    if not _configured:
+        with _coalescer_lock:
+            if not _configured:
+                _coalescer = create_search_coalescer()
+                _configured = True
+    return _coalescer
+
+
+def set_search_coalescer(coalescer: Optional[SearchCoalescer]):
+    """Substitui o coalescedor do processo (ex.: testes e benchmarks); None desliga."""
+    global _coalescer, _configured
+    with _coalescer_lock:
+        _coalescer = coalescer
+        _configured = True
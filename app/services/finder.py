@@ -1,46 +1,562 @@
 # app/services/finder.py
 
-from typing import List
+import logging
+import math
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import BigInteger, and_, cast, false, func, insert, inspect, literal_column, or_, select
+from sqlalchemy.orm import Session
 from app.models.point import POI
 from app.database.pgsql import SessionLocal
-import math
+from app.services.spatial_index import GridIndex, get_spatial_index, set_spatial_index
+from app.services.name_index import NameIndex, get_name_index, set_name_index
+from app.services.snapshot import ColumnarSnapshot, snapshot_options
+from app.services.cache import Row, get_query_cache, invalidate_pois, rows_to_pois
+from app.services.metrics import record_rows, stage
+from app.services.changes import INSERTED, UPDATED, deletes, record_changes, upserts
+from app.services.zorder import key_ranges, morton_key
+
+logger = logging.getLogger(__name__)
+
+# Raio que cobre todo o domínio de coordenadas int4 não negativas (a diagonal
+# do quadrado [0, 2^31) mede ~3.036.999.999) e cujo quadrado ainda cabe em int8
+_MAX_RADIUS = 3_037_000_000
+
+# Quantidade de consultas de um lote avaliadas por comando SQL
+_BATCH_QUERIES_PER_STATEMENT = 500
+
+# Limite de elementos da matriz consultas x candidatos calculada de uma vez
+_BATCH_MATRIX_ELEMENTS = 4_000_000
+
+# Colunas lidas pelas buscas: as consultas devolvem tuplas (id, name, x, y)
+# em vez de objetos POI, sem o custo de montar e rastrear entidades do ORM
+POI_COLUMNS = (POI.id, POI.name, POI.x, POI.y)
+
+# Backend das buscas espaciais no banco: "sql" (índice B-tree em (x, y)),
+# "postgis" (coluna geometry com índice GiST, ver app/database/migrar_postgis.py)
+# ou "zorder" (faixas da chave de Morton com o índice B-tree em zkey, ver
+# app/services/zorder.py e app/database/migrar_zorder.py)
+_spatial_backend = os.getenv("SPATIAL_BACKEND", "sql").lower()
+
+# Layout da tabela: "heap" ou "tiled" (particionada em ladrilhos de x/y, ver
+# app/database/particionar_pois.py). No modo SQL as buscas já filtram x e y
+# por faixa, o que basta para o Postgres descartar as partições fora da caixa
+# do círculo; no modo PostGIS os mesmos filtros são somados ao ST_DWithin.
+_tiled_layout = os.getenv("POIS_LAYOUT", "heap").lower() == "tiled"
+
+# Coluna geometry gerada pela migração do PostGIS (não mapeada no modelo POI)
+_GEOM = literal_column("pois.geom")
+
+def spatial_backend() -> str:
+    """Backend das buscas espaciais no banco ("sql", "postgis" ou "zorder")."""
+    return _spatial_backend
+
+def set_spatial_backend(backend: str):
+    """Troca o backend das buscas espaciais (ex.: benchmarks e testes)."""
+    global _spatial_backend
+    if backend not in ("sql", "postgis", "zorder"):
+        raise ValueError(f"backend espacial desconhecido: {backend}")
+    _spatial_backend = backend
+
+def set_tiled_layout(tiled: bool):
+    """Liga ou desliga os filtros de partição do layout em ladrilhos (ex.: testes)."""
+    global _tiled_layout
+    _tiled_layout = tiled
+
+def _tile_filter(x0: int, y0: int, x1: int, y1: int):
+    """Faixas de x e y da caixa: permitem descartar partições no layout em ladrilhos."""
+    return and_(POI.x.between(x0, x1), POI.y.between(y0, y1))
+
+def _box_filter(x0: int, y0: int, x1: int, y1: int):
+    """Filtro da caixa no modo SQL; no modo zorder, com as faixas de chave que a cobrem."""
+    box = _tile_filter(x0, y0, x1, y1)
+    if _spatial_backend == "zorder":
+        # Sem faixas (caixa fora do domínio) a condição vazia não casa nada
+        ranges = key_ranges(x0, y0, x1, y1)
+        return and_(or_(false(), *(POI.zkey.between(lo, hi) for lo, hi in ranges)), box)
+    return box
+
+def _point(x: int, y: int):
+    return func.ST_MakePoint(x, y)
+
+def _distance_sq(x: int, y: int):
+    """Expressão SQL da distância ao quadrado até (x, y)."""
+    # BigInteger evita overflow de int4 ao elevar as diferenças ao quadrado
+    dx = cast(POI.x, BigInteger) - x
+    dy = cast(POI.y, BigInteger) - y
+    return dx * dx + dy * dy
+
+def nearby_statement(x: int, y: int, max_distance: int):
+    """SELECT (id, name, x, y) dos POIs a uma distância <= max_distance de (x, y)."""
+    if _spatial_backend == "postgis":
+        # ST_DWithin usa o índice GiST; a comparação inteira mantém o resultado exato
+        stmt = select(*POI_COLUMNS).where(
+            func.ST_DWithin(_GEOM, _point(x, y), max_distance),
+            _distance_sq(x, y) <= max_distance * max_distance,
+        )
+        if _tiled_layout:
+            stmt = stmt.where(_tile_filter(x - max_distance, y - max_distance, x + max_distance, y + max_distance))
+        return stmt
+    return select(*POI_COLUMNS).where(
+        _box_filter(x - max_distance, y - max_distance, x + max_distance, y + max_distance),
+        _distance_sq(x, y) <= max_distance * max_distance,
+    )
+
+def nearest_statement(x: int, y: int, k: int, radius: int):
+    """
+    SELECT (id, name, x, y, distância ao quadrado) dos k POIs mais próximos
+    de (x, y) dentro do círculo de raio `radius`.
+    """
+    dist_sq = _distance_sq(x, y)
+    if _spatial_backend == "postgis":
+        # Ordenação KNN pelo índice GiST (<->); o desempate por (dist², id)
+        # deixa a ordem igual à do modo SQL
+        stmt = select(*POI_COLUMNS, dist_sq)
+        if radius < _MAX_RADIUS:
+            stmt = stmt.where(func.ST_DWithin(_GEOM, _point(x, y), radius), dist_sq <= radius * radius)
+            if _tiled_layout:
+                stmt = stmt.where(_tile_filter(x - radius, y - radius, x + radius, y + radius))
+        return stmt.order_by(_GEOM.op("<->")(_point(x, y)), dist_sq, POI.id).limit(k)
+    return (
+        select(*POI_COLUMNS, dist_sq)
+        .where(
+            _box_filter(x - radius, y - radius, x + radius, y + radius),
+            dist_sq <= radius * radius,
+        )
+        .order_by(dist_sq, POI.id)
+        .limit(k)
+    )
+
+def next_nearest_radius(radius: int, found: int, k: int, max_distance: Optional[int]) -> Optional[int]:
+    """
+    Próximo raio da busca k-NN no banco, ou None quando a busca terminou.
+
+    O círculo de raio `radius` está todo dentro da janela consultada, então
+    k resultados nele já são exatamente os k mais próximos.
+    """
+    if found >= k or radius >= _MAX_RADIUS:
+        return None
+    if max_distance is not None and radius >= max_distance:
+        return None
+    radius = min(radius * 2, _MAX_RADIUS)
+    if max_distance is not None:
+        radius = min(radius, max_distance)
+    return radius
+
+def nearest_cache_radius(rows: List[Row], k: int, max_distance: Optional[int]) -> Optional[float]:
+    """
+    Raio de invalidação de um resultado k-NN (id, name, x, y, distância): com
+    k resultados, só uma gravação até a k-ésima distância pode alterá-lo; com
+    menos, qualquer gravação dentro de max_distance (ou em qualquer lugar, sem limite).
+    """
+    return rows[-1][4] if len(rows) == k else max_distance
+
+def nearest_db_rows(rows) -> List[Row]:
+    """Converte as linhas de nearest_statement (distância ao quadrado) em (id, name, x, y, distância)."""
+    return [(poi_id, name, px, py, math.sqrt(d2)) for poi_id, name, px, py, d2 in rows]
+
+def nearest_from_rows(rows) -> List[Tuple[POI, float]]:
+    """Recria os pares (POI, distância) a partir das linhas do cache."""
+    return [(POI(id=r[0], name=r[1], x=r[2], y=r[3]), r[4]) for r in rows]
+
+def initial_nearest_radius(max_distance: Optional[int]) -> int:
+    """Raio da primeira janela da busca k-NN no banco."""
+    if _spatial_backend == "postgis":
+        # O <-> já percorre o índice em ordem de distância: uma única consulta
+        return _MAX_RADIUS if max_distance is None else min(max_distance, _MAX_RADIUS)
+    return 16 if max_distance is None else min(16, max_distance)
+
+def nearby_from_index(index: GridIndex, x: int, y: int, max_distance: int) -> List[Row]:
+    """Busca por proximidade no índice em memória; retorna linhas (id, name, x, y)."""
+    stats = {}
+    with stage("filter"):
+        rows = index.query_rows(x, y, max_distance, stats)
+    record_rows(stats.get("scanned", 0), len(rows))
+    return rows
+
+def nearby_columns(x: int, y: int, max_distance: int):
+    """
+    Busca por proximidade direto nas colunas do snapshot (ids, xs, ys,
+    offsets, nomes), para o formato binário; None se o índice ativo não
+    for um ColumnarSnapshot.
+    """
+    index = get_spatial_index()
+    if not isinstance(index, ColumnarSnapshot):
+        return None
+    stats = {}
+    with stage("filter"):
+        columns = index.query_columns(x, y, max_distance, stats)
+    record_rows(stats.get("scanned", 0), len(columns[0]))
+    return columns
+
+def nearest_from_index(index: GridIndex, x: int, y: int, k: int, max_distance: Optional[int]) -> List[Row]:
+    """Busca k-NN no índice em memória; retorna linhas (id, name, x, y, distância)."""
+    with stage("filter"):
+        return index.nearest_rows(x, y, k, max_distance)
 
 # Função ára encontrar POIs próximos a (x,y) dentro da distância máxima.
 def find_nearby_pois(x: int, y: int, max_distance: int) -> List[POI]:
     """
     Retorna uma lista de POIs cuja distância até (x, y) seja menor ou igual à distância máxima.
+
+    O filtro é feito no banco: um pré-filtro de bounding box (que usa o índice
+    composto em (x, y)) seguido da comparação exata da distância ao quadrado,
+    sem raiz quadrada. Apenas as linhas que atendem ao raio saem do banco.
+    """
+    if max_distance < 0:
+        return []
+
+    cache = get_query_cache()
+    key = ("nearby", x, y, max_distance)
+    generation = cache.generation()
+    rows = cache.get(key)
+    if rows is not None:
+        return rows_to_pois(rows)
+
+    # Modo em memória: responde sem ir ao banco
+    index = get_spatial_index()
+    if index is not None:
+        rows = nearby_from_index(index, x, y, max_distance)
+    else:
+        session = SessionLocal()
+        try:
+            with stage("query"):
+                result = session.execute(nearby_statement(x, y, max_distance))
+            with stage("hydrate"):
+                rows = [tuple(row) for row in result]
+            # O filtro é feito no banco: só as linhas dentro do raio chegam aqui
+            record_rows(len(rows), len(rows))
+        finally:
+            session.close()
+
+    cache.put(key, rows, generation)
+    return rows_to_pois(rows)
+
+def boxes_filter(boxes: Sequence[Tuple[int, int, int, int]]):
+    """Condição SQL: o POI cai em alguma das caixas (x0, y0, x1, y1)."""
+    if _spatial_backend == "postgis":
+        envelopes = [_GEOM.op("&&")(func.ST_MakeEnvelope(*box)) for box in boxes]
+        if _tiled_layout:
+            envelopes = [and_(envelope, _tile_filter(*box)) for envelope, box in zip(envelopes, boxes)]
+        return or_(*envelopes)
+    if len(boxes) != 1:
+        # Lotes de caixas ficam no índice (x, y): as faixas de chave de
+        # centenas de caixas tornariam o comando grande demais
+        return or_(*(_tile_filter(*box) for box in boxes))
+    return _box_filter(*boxes[0])
+
+# Função para buscar POIs próximos de vários pontos de referência de uma vez
+def find_nearby_pois_batch(queries: Sequence[Tuple[int, int, int]],
+                           session: Optional[Session] = None) -> List[List[POI]]:
+    """
+    Recebe uma lista de consultas (x, y, max_distance) e retorna, na mesma
+    ordem, a lista de POIs de cada uma (ver find_nearby_rows_batch).
+    """
+    return [rows_to_pois(rows) for rows in find_nearby_rows_batch(queries, session)]
+
+def find_nearby_rows_batch(queries: Sequence[Tuple[int, int, int]],
+                           session: Optional[Session] = None) -> List[List[Row]]:
+    """
+    Como find_nearby_pois_batch, mas com as linhas (id, name, x, y) de cada
+    consulta. Se `session` for informada (ex.: pela dependência get_db), ela
+    é reutilizada em todos os comandos do lote.
+
+    Os candidatos de um grupo de consultas são lidos uma única vez (do índice
+    em memória ou de um único SELECT com as bounding boxes combinadas) e as
+    distâncias de todas as consultas são calculadas de forma vetorizada.
+    """
+    results: List[List[Row]] = [[] for _ in queries]
+    index = get_spatial_index()
+    for chunk, boxes in batch_chunks(queries):
+        if index is not None:
+            batch_from_index(index, chunk, boxes, results)
+            continue
+        db = session if session is not None else SessionLocal()
+        try:
+            with stage("query"):
+                result = db.execute(batch_statement(boxes))
+            with stage("hydrate"):
+                candidates = [tuple(row) for row in result]
+        finally:
+            if session is None:
+                db.close()
+        batch_from_rows(chunk, candidates, results)
+    return results
+
+def batch_chunks(queries: Sequence[Tuple[int, int, int]]):
+    """
+    Divide as consultas de um lote em grupos lidos por um único comando:
+    gera (consultas numeradas [(posição, (x, y, d))], caixas de cada uma).
+    Consultas com distância negativa ficam de fora (resultado vazio).
+    """
+    for start in range(0, len(queries), _BATCH_QUERIES_PER_STATEMENT):
+        chunk = [
+            (i, q) for i, q in enumerate(queries[start:start + _BATCH_QUERIES_PER_STATEMENT], start)
+            if q[2] >= 0
+        ]
+        if chunk:
+            yield chunk, [(x - d, y - d, x + d, y + d) for _, (x, y, d) in chunk]
+
+def batch_statement(boxes: Sequence[Tuple[int, int, int, int]]):
+    """SELECT dos candidatos de um grupo de consultas: os POIs em alguma das caixas."""
+    return select(*POI_COLUMNS).where(boxes_filter(boxes))
+
+def batch_from_rows(chunk, candidates: Sequence[Row], results: List[List[Row]]):
+    """Separa os candidatos (id, name, x, y) lidos do banco entre as consultas do grupo."""
+    cand_x = np.array([row[2] for row in candidates], dtype=np.int64)
+    cand_y = np.array([row[3] for row in candidates], dtype=np.int64)
+    returned = 0
+    with stage("filter"):
+        for (i, _), matches in zip(chunk, batch_matches([q for _, q in chunk], cand_x, cand_y)):
+            results[i] = [candidates[j] for j in matches]
+            returned += len(results[i])
+    record_rows(len(candidates), returned)
+
+def batch_from_index(index, chunk, boxes, results: List[List[Row]]):
+    """Como batch_from_rows, com os candidatos das células do índice em memória."""
+    with stage("query"):
+        ids, xs, ys = index.collect_boxes(boxes)
+    if not len(ids):
+        return
+    cand_x = np.asarray(xs, dtype=np.int64)
+    cand_y = np.asarray(ys, dtype=np.int64)
+    # Linhas criadas sob demanda, só para os candidatos que casarem
+    rows: List[Optional[Row]] = [None] * len(ids)
+    returned = 0
+    with stage("filter"):
+        for (i, _), matches in zip(chunk, batch_matches([q for _, q in chunk], cand_x, cand_y)):
+            found = []
+            for j in matches:
+                row = rows[j]
+                if row is None:
+                    poi_id = int(ids[j])
+                    try:
+                        name = index.name_of(poi_id)
+                    except KeyError:
+                        # Removido por outro thread depois de collect_boxes
+                        continue
+                    row = rows[j] = (poi_id, name, int(xs[j]), int(ys[j]))
+                found.append(row)
+            results[i] = found
+            returned += len(found)
+    record_rows(len(ids), returned)
+
+def batch_matches(queries: Sequence[Tuple[int, int, int]],
+                  cand_x: np.ndarray, cand_y: np.ndarray) -> Iterator[np.ndarray]:
+    """
+    Para cada consulta (x, y, max_distance), na ordem, os índices dos
+    candidatos (cand_x, cand_y) dentro do círculo. A matriz consultas x
+    candidatos é calculada em blocos de linhas.
+    """
+    qx = np.array([q[0] for q in queries], dtype=np.int64)
+    qy = np.array([q[1] for q in queries], dtype=np.int64)
+    qd2 = np.array([q[2] for q in queries], dtype=np.int64) ** 2
+    rows_per_block = max(1, _BATCH_MATRIX_ELEMENTS // max(len(cand_x), 1))
+    for row in range(0, len(queries), rows_per_block):
+        block = slice(row, row + rows_per_block)
+        dx = cand_x[np.newaxis, :] - qx[block, np.newaxis]
+        dy = cand_y[np.newaxis, :] - qy[block, np.newaxis]
+        for matches in dx * dx + dy * dy <= qd2[block, np.newaxis]:
+            yield np.flatnonzero(matches)
+
+# Função para encontrar os k POIs mais próximos de (x,y)
+def find_nearest_pois(x: int, y: int, k: int, max_distance: Optional[int] = None) -> List[Tuple[POI, float]]:
+    """
+    Retorna até k pares (POI, distância) ordenados pela distância até (x, y).
+
+    Com o índice em memória a busca é best-first sobre as células da grade.
+    Sem ele, a busca vai ao banco com uma janela (bounding box) que dobra de
+    tamanho até conter k POIs dentro do círculo, usando o índice em (x, y).
+    """
+    if k <= 0 or (max_distance is not None and max_distance < 0):
+        return []
+
+    cache = get_query_cache()
+    key = ("nearest", x, y, k, max_distance)
+    generation = cache.generation()
+    cached = cache.get(key)
+    if cached is not None:
+        return nearest_from_rows(cached)
+
+    index = get_spatial_index()
+    if index is not None:
+        rows = nearest_from_index(index, x, y, k, max_distance)
+    else:
+        session = SessionLocal()
+        try:
+            radius = initial_nearest_radius(max_distance)
+            scanned = 0
+            while True:
+                with stage("query"):
+                    result = session.execute(nearest_statement(x, y, k, radius))
+                with stage("hydrate"):
+                    rows = result.all()
+                scanned += len(rows)
+                radius = next_nearest_radius(radius, len(rows), k, max_distance)
+                if radius is None:
+                    rows = nearest_db_rows(rows)
+                    break
+            record_rows(scanned, len(rows))
+        finally:
+            session.close()
+
+    cache.put(key, rows, generation, nearest_cache_radius(rows, k, max_distance))
+    return nearest_from_rows(rows)
+
+# Função para construir o índice espacial em memória a partir da tabela pois
+def build_spatial_index(cell_size: Optional[int] = None) -> GridIndex:
+    """
+    Carrega (id, name, x, y) de todos os POIs em um GridIndex e o registra
+    como índice ativo de find_nearby_pois.
     """
+    index = GridIndex() if cell_size is None else GridIndex(cell_size)
     session = SessionLocal()
     try:
-        # Primeiro busca todos os POIs
-        all_pois = session.query(POI).all()
-        
-        # Filtra localmente (alternativa: poderia usar funções do banco para filtrar)
-        nearby = []
-        for poi in all_pois:
-            distance = math.sqrt((poi.x - x)**2 + (poi.y - y)**2)
-            if distance <= max_distance:
-                nearby.append(poi)
-        return nearby
+        rows = session.query(POI.id, POI.name, POI.x, POI.y).yield_per(10_000)
+        index.bulk_load(rows)
+    finally:
+        session.close()
+    set_spatial_index(index)
+    return index
+
+def _all_poi_rows() -> Iterator[Tuple[int, str, int, int]]:
+    """Lê (id, name, x, y) de todos os POIs em blocos, com uma sessão própria."""
+    session = SessionLocal()
+    try:
+        for row in session.execute(select(*POI_COLUMNS).execution_options(yield_per=10_000)):
+            yield tuple(row)
+    finally:
+        session.close()
+
+# Função para construir o snapshot colunar (NumPy) da tabela pois
+def build_snapshot(path: Optional[str] = None) -> ColumnarSnapshot:
+    """
+    Carrega a tabela pois em um ColumnarSnapshot e o registra como índice
+    espacial ativo (no lugar do GridIndex). Com `path` (ou SNAPSHOT_PATH),
+    as colunas ficam em um arquivo mapeado em memória compartilhado pelos workers.
+    """
+    options = snapshot_options()
+    if path is not None:
+        options["path"] = path
+    snapshot = ColumnarSnapshot(_all_poi_rows, **options).load()
+    set_spatial_index(snapshot)
+    return snapshot
+
+# Função para construir o índice de nomes em memória a partir da tabela pois
+def build_name_index() -> NameIndex:
+    """
+    Carrega (id, name) de todos os POIs em um NameIndex e o registra como
+    índice ativo de find_pois e autocomplete_pois.
+    """
+    index = NameIndex()
+    session = SessionLocal()
+    try:
+        index.bulk_load(session.query(POI.id, POI.name).yield_per(10_000))
     finally:
         session.close()
+    set_name_index(index)
+    return index
+
+# Colunas opcionais de pois: tabelas criadas antes das migrações não têm zkey
+# (migrar_zorder) nem external_id (migrar_upsert), e as gravações só as
+# incluem quando existem. Uma coluna ausente é procurada de novo a cada
+# OPTIONAL_COLUMNS_RECHECK segundos: depois da migração, a API passa a
+# gravá-la sem ser reiniciada.
+OPTIONAL_COLUMNS = ("zkey", "external_id")
+OPTIONAL_COLUMNS_RECHECK = 30.0
+_optional_columns: Dict[str, Tuple[frozenset, float]] = {}
+
+def optional_columns(session: Session) -> frozenset:
+    """Colunas opcionais de pois (OPTIONAL_COLUMNS) presentes no banco da sessão."""
+    key = str(session.get_bind().url)
+    cached = _optional_columns.get(key)
+    if cached is not None and (len(cached[0]) == len(OPTIONAL_COLUMNS) or time.monotonic() < cached[1]):
+        return cached[0]
+    names = {column["name"] for column in inspect(session.connection()).get_columns(POI.__tablename__)}
+    columns = frozenset(name for name in OPTIONAL_COLUMNS if name in names)
+    _optional_columns[key] = (columns, time.monotonic() + OPTIONAL_COLUMNS_RECHECK)
+    return columns
+
+def check_external_id(columns: frozenset):
+    """Lança ValueError se o banco ainda não tem a coluna external_id (migrar_upsert)."""
+    if "external_id" not in columns:
+        raise ValueError("external_id requer a coluna external_id: execute python -m app.database.migrar_upsert")
+
+def poi_values(columns: frozenset, name: str, x: int, y: int, external_id: Optional[str] = None) -> dict:
+    """
+    Valores do INSERT de um POI com as colunas opcionais presentes no banco
+    (`columns`, de optional_columns). O INSERT do ORM nomearia todas as
+    colunas mapeadas, mesmo nulas, e falharia em tabelas sem elas. Lança
+    ValueError se `external_id` vier sem a coluna no banco.
+    """
+    values = {"name": name, "x": x, "y": y}
+    if "zkey" in columns:
+        values["zkey"] = morton_key(x, y)
+    if external_id is not None:
+        check_external_id(columns)
+        values["external_id"] = external_id
+    return values
+
+def indexes_active() -> bool:
+    """Indica se algum índice em memória precisa acompanhar as gravações."""
+    return get_spatial_index() is not None or get_name_index() is not None
+
+def index_pois(rows: Sequence[Tuple[int, str, int, int]]):
+    """Insere/atualiza as linhas (id, name, x, y) nos índices em memória ativos."""
+    spatial = get_spatial_index()
+    if spatial is not None:
+        spatial.bulk_load(rows)
+    names = get_name_index()
+    if names is not None:
+        names.bulk_load((poi_id, name) for poi_id, name, _, _ in rows)
+
+def unindex_poi(poi_id: int):
+    """Remove um POI dos índices em memória ativos."""
+    spatial = get_spatial_index()
+    if spatial is not None:
+        spatial.remove(poi_id)
+    names = get_name_index()
+    if names is not None:
+        names.remove(poi_id)
+
+def publish_write(rows: Sequence[Row] = (), replaced: Sequence[Row] = (), removed: Sequence[int] = ()):
+    """
+    Leva uma gravação já confirmada aos índices em memória (linhas `rows`
+    gravadas, ids `removed` apagados) e invalida no cache as posições novas e
+    as anteriores (`replaced`). Chame depois do commit: uma falha aqui não
+    desfaz a gravação, então só vai para o log.
+    """
+    try:
+        for poi_id in removed:
+            unindex_poi(poi_id)
+        index_pois(rows)
+    except Exception:
+        logger.exception("Falha ao atualizar os índices em memória depois do commit")
+    try:
+        invalidate_pois(list(replaced) + list(rows))
+    except Exception:
+        logger.exception("Falha ao invalidar o cache depois do commit")
 
 # Função para adicionar um POI
 def add_poi(name: str, x: int, y: int):
     session = SessionLocal()
     try:
-        poi = POI(name=name, x=x, y=y)
-        session.add(poi)
+        values = poi_values(optional_columns(session), name, x, y)
+        poi_id = session.execute(insert(POI).values(values).returning(POI.id)).scalar_one()
+        row = (poi_id, name, x, y)
+        record_changes(session, upserts(INSERTED, [row]))
         session.commit()
         # print(f"POI '{name}' adicionado com sucesso!")
-        session.refresh(poi)     
-        return poi 
     except Exception as e:
         session.rollback()
         print("Erro ao adicionar POI:", e)
         return None      
     finally:
         session.close()
+    publish_write([row])
+    return POI(id=poi_id, name=name, x=x, y=y)
 
 # Função para listar todos os POIs
 def list_pois():
@@ -52,15 +568,143 @@ def list_pois():
     finally:
         session.close()
 
+def page_statement(limit: int, after: Optional[int] = None):
+    """SELECT (id, name, x, y) de uma página de POIs em ordem de id, a partir do cursor `after`."""
+    stmt = select(*POI_COLUMNS)
+    if after is not None:
+        stmt = stmt.where(POI.id > after)
+    return stmt.order_by(POI.id).limit(limit)
+
+# Função para listar uma página de POIs (paginação por cursor de id)
+def list_pois_page(limit: int, after: Optional[int] = None) -> List[POI]:
+    """
+    Retorna até `limit` POIs com id maior que `after`, em ordem de id.
+
+    A paginação por keyset usa a chave primária, então o custo de cada
+    página não depende de quantas páginas vieram antes (ao contrário de OFFSET).
+    """
+    session = SessionLocal()
+    try:
+        with stage("query"):
+            result = session.execute(page_statement(limit, after))
+        with stage("hydrate"):
+            return rows_to_pois(result)
+    finally:
+        session.close()
+
+# Função para percorrer todos os POIs sem carregá-los de uma vez
+def iter_pois(after: Optional[int] = None, batch_size: int = 1000) -> Iterator[Tuple[int, str, int, int]]:
+    """
+    Gera tuplas (id, name, x, y) em ordem de id usando um cursor do lado do
+    servidor: no máximo `batch_size` linhas ficam em memória por vez.
+    """
+    session = SessionLocal()
+    try:
+        stmt = select(*POI_COLUMNS).order_by(POI.id)
+        if after is not None:
+            stmt = stmt.where(POI.id > after)
+        result = session.execute(stmt.execution_options(yield_per=batch_size))
+        for row in result:
+            yield tuple(row)
+    finally:
+        session.close()
+
+def _escape_like(text: str) -> str:
+    """Escapa os curingas do LIKE para que o texto seja comparado literalmente."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def order_by_ids(rows: Sequence[Row], ids: List[int]) -> List[Row]:
+    """Reordena as linhas lidas com ids_statement(ids) na ordem de `ids`."""
+    by_id = {row[0]: tuple(row) for row in rows}
+    return [by_id[poi_id] for poi_id in ids if poi_id in by_id]
+
+def ids_statement(ids: List[int]):
+    """SELECT (id, name, x, y) dos POIs pela chave primária."""
+    return select(*POI_COLUMNS).where(POI.id.in_(ids))
+
+def _rows_by_ids(session, ids: List[int]) -> List[Row]:
+    """Busca linhas de POIs pela chave primária, preservando a ordem de `ids`."""
+    if not ids:
+        return []
+    return order_by_ids(session.execute(ids_statement(ids)), ids)
+
+def name_statement(name: str, limit: Optional[int] = None):
+    """SELECT (id, name, x, y) dos POIs cujo nome contém `name` (ILIKE)."""
+    stmt = select(*POI_COLUMNS).where(POI.name.ilike(f"%{_escape_like(name)}%", escape="\\"))
+    if limit is not None:
+        stmt = stmt.order_by(POI.id).limit(limit)
+    return stmt
+
+def autocomplete_statement(prefix: str, limit: int, dialect: str):
+    """SELECT (id, name, x, y) dos POIs cujo nome começa com `prefix`, os mais parecidos primeiro."""
+    stmt = select(*POI_COLUMNS).where(POI.name.ilike(f"{_escape_like(prefix)}%", escape="\\"))
+    if dialect == "postgresql":
+        stmt = stmt.order_by(func.similarity(POI.name, prefix).desc(), POI.name, POI.id)
+    else:
+        stmt = stmt.order_by(func.length(POI.name), POI.name, POI.id)
+    return stmt.limit(limit)
+
 # Função para buscar POI por nome
-def find_pois(name: str):
+def find_pois(name: str, limit: Optional[int] = None):
+    """
+    Retorna os POIs cujo nome contém `name` (sem diferenciar maiúsculas).
+
+    No Postgres o ILIKE usa o índice GIN de trigramas (pg_trgm); com o
+    índice de nomes em memória, os ids são resolvidos sem consultar o nome no banco.
+    """
+    cache = get_query_cache()
+    key = ("name", name, limit)
+    generation = cache.generation()
+    rows = cache.get(key)
+    if rows is not None:
+        return rows_to_pois(rows)
+
     session = SessionLocal()
     try:
-        pois = session.query(POI).filter(POI.name.ilike(f"%{name}%")).all()
-        return pois
+        index = get_name_index()
+        if index is not None:
+            with stage("filter"):
+                ids = index.search(name, limit)
+            with stage("query"):
+                rows = _rows_by_ids(session, ids)
+        else:
+            with stage("query"):
+                result = session.execute(name_statement(name, limit))
+            with stage("hydrate"):
+                rows = [tuple(row) for row in result]
     finally:
         session.close()
 
+    cache.put(key, rows, generation)
+    return rows_to_pois(rows)
+
+# Função para autocompletar nomes de POIs
+def autocomplete_pois(prefix: str, limit: int = 10) -> List[POI]:
+    """
+    Retorna até `limit` POIs cujo nome começa com `prefix`, os mais parecidos
+    com o texto digitado primeiro (similaridade de trigramas).
+    """
+    cache = get_query_cache()
+    key = ("autocomplete", prefix, limit)
+    generation = cache.generation()
+    rows = cache.get(key)
+    if rows is not None:
+        return rows_to_pois(rows)
+
+    session = SessionLocal()
+    try:
+        index = get_name_index()
+        if index is not None:
+            rows = _rows_by_ids(session, index.autocomplete(prefix, limit))
+        else:
+            stmt = autocomplete_statement(prefix, limit, session.get_bind().dialect.name)
+            rows = [tuple(row) for row in session.execute(stmt)]
+    finally:
+        session.close()
+
+    cache.put(key, rows, generation)
+    return rows_to_pois(rows)
+
 # Função para atualizar POI
 def update_poi(poi_id: int, update_data: dict):
     """Atualiza um POI existente"""
@@ -70,21 +714,26 @@ def update_poi(poi_id: int, update_data: dict):
         poi = session.query(POI).filter(POI.id == poi_id).first()
         if not poi:
             return None
+        old_row = (poi.id, poi.name, poi.x, poi.y)
         
         # Aplica as atualizações
         for field, value in update_data.items():
             if value is not None:  # Só atualiza campos que foram fornecidos
                 setattr(poi, field, value)
+        if "zkey" in optional_columns(session):
+            poi.zkey = morton_key(poi.x, poi.y)
         
+        record_changes(session, upserts(UPDATED, [(poi.id, poi.name, poi.x, poi.y)]))
         session.commit()
         session.refresh(poi)
-        return poi
     except Exception as e:
         session.rollback()
         print(f"Erro ao atualizar POI: {str(e)}")
         return None
     finally:
         session.close()
+    publish_write([(poi.id, poi.name, poi.x, poi.y)], replaced=[old_row])
+    return poi
 
 # Função para deletar POI
 def delete_poi(poi_id: int)-> bool:
@@ -102,12 +751,15 @@ def delete_poi(poi_id: int)-> bool:
         if not poi:
             return False
         
+        old_row = (poi.id, poi.name, poi.x, poi.y)
         session.delete(poi)
+        record_changes(session, deletes([poi_id]))
         session.commit()
-        return True
     except Exception as e:
         session.rollback()
         print(f"Erro ao deletar POI: {str(e)}")
         return False
     finally:
         session.close()
+    publish_write(replaced=[old_row], removed=[poi_id])
+    return True
@@ -0,0 +1,349 @@
+# app/services/importer.py
+import codecs
+import csv
+import json
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert
+from app.models.point import POI
+from app.database.pgsql import SessionLocal
+from app.schemas.poi_schema import POICreateRequest
+from app.services.finder import check_external_id, indexes_active, optional_columns, publish_write
+from app.services.upsert import INSERT, MODES, UPSERT, Record, upsert_records
+from app.services.changes import INSERTED, change_log_enabled, record_changes, upserts
+from app.services.zorder import morton_keys
+
+# Quantidade padrão de linhas validadas e gravadas por transação
+DEFAULT_CHUNK_SIZE = 5000
+
+# Maior lote aceito pela API: o lote inteiro fica em memória até ser gravado
+MAX_CHUNK_SIZE = 50000
+
+# Máximo de mensagens de erro guardadas por lote (o restante só é contado)
+MAX_ERRORS_PER_CHUNK = 10
+
+# Maior registro CSV (em caracteres): aspas abertas por engano não acumulam o resto do arquivo
+MAX_CSV_RECORD_SIZE = 65536
+
+FORMATS = ("ndjson", "csv")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChunkReport:
+    """
+    Resultado da importação de um lote de linhas.
+    """
+    chunk: int
+    accepted: int = 0
+    rejected: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    duplicates: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def reject(self, line: int, message: str):
+        self.rejected += 1
+        self.error(f"linha {line}: {message}")
+
+    def error(self, message: str):
+        """Guarda a mensagem enquanto o lote não passou de MAX_ERRORS_PER_CHUNK."""
+        if len(self.errors) < MAX_ERRORS_PER_CHUNK:
+            self.errors.append(message)
+
+
+class LineSplitter:
+    """
+    Converte blocos de bytes (ex.: corpo de uma requisição em streaming) em
+    linhas de texto completas, sem precisar do conteúdo inteiro em memória.
+    """
+
+    def __init__(self, encoding: str = "utf-8"):
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._pending = ""
+
+    def feed(self, data: bytes) -> List[str]:
+        text = self._pending + self._decoder.decode(data)
+        lines = text.split("\n")
+        self._pending = lines.pop()
+        return lines
+
+    def close(self) -> List[str]:
+        text = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        return [text] if text else []
+
+
+class _PendingLines:
+    """
+    Iterador alimentado aos poucos: o csv.reader único do RecordParser só
+    avança quando já há um registro completo na fila.
+    """
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+def _ends_quoted(line: str, quoted: bool) -> bool:
+    """Indica se a linha termina dentro de um campo entre aspas (regras do csv padrão)."""
+    at_start = not quoted
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quoted:
+            if char == '"':
+                if line[i + 1:i + 2] == '"':
+                    i += 1
+                else:
+                    quoted = False
+        elif char == '"' and at_start:
+            quoted = True
+        at_start = not quoted and char == ","
+        i += 1
+    return quoted
+
+
+class RecordParser:
+    """
+    Transforma linhas NDJSON ou CSV (com cabeçalho name,x,y) em dicionários.
+
+    Cada chamada de parse retorna (número da linha, registro ou None, erro).
+    No CSV, um campo entre aspas pode ter quebras de linha: as linhas ficam
+    guardadas até o registro fechar, e parse retorna None até lá. Chame
+    close no fim da entrada para receber o erro de aspas não fechadas.
+    """
+
+    def __init__(self, fmt: str = "ndjson"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato inválido: {fmt} (use {', '.join(FORMATS)})")
+        self.fmt = fmt
+        self._header: Optional[List[str]] = None
+        self._line = 0
+        self._pending = _PendingLines()
+        self._reader = csv.reader(self._pending)
+        self._quoted = False
+        self._start = 0
+        self._size = 0
+
+    def parse(self, line: str) -> Optional[Tuple[int, Optional[dict], Optional[str]]]:
+        self._line += 1
+        line = line.rstrip("\r\n")
+        if self.fmt == "csv":
+            return self._parse_csv(line)
+        if not line.strip():
+            return None
+
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            return self._line, None, f"JSON inválido ({e})"
+        if not isinstance(record, dict):
+            return self._line, None, "cada linha deve ser um objeto JSON"
+        return self._line, record, None
+
+    def close(self) -> Optional[Tuple[int, Optional[dict], Optional[str]]]:
+        """Fim da entrada: um registro CSV com aspas abertas vira erro."""
+        if not self._quoted:
+            return None
+        self._discard()
+        return self._start, None, "aspas não fechadas"
+
+    def _parse_csv(self, line: str):
+        if not self._quoted:
+            if not line.strip():
+                return None
+            self._start = self._line
+            self._size = 0
+        self._pending.lines.append(line + "\n")
+        self._size += len(line)
+        self._quoted = _ends_quoted(line, self._quoted)
+        if self._quoted:
+            if self._size > MAX_CSV_RECORD_SIZE:
+                self._discard()
+                return self._start, None, "registro longo demais (aspas não fechadas?)"
+            return None
+
+        values = next(self._reader)
+        if self._header is None:
+            self._header = [value.strip() for value in values]
+            return None
+        if len(values) != len(self._header):
+            return self._start, None, f"esperadas {len(self._header)} colunas, recebidas {len(values)}"
+        return self._start, dict(zip(self._header, values)), None
+
+    def _discard(self):
+        self._pending.lines.clear()
+        self._quoted = False
+
+
+def validate_record(record: dict) -> POICreateRequest:
+    """
+    Valida um registro com POICreateRequest e com as restrições da tabela pois.
+    Um external_id vazio (ex.: coluna em branco no CSV) vale como ausente.
+    """
+    poi = POICreateRequest(**record)
+    if poi.x < 0 or poi.y < 0:
+        raise ValueError("coordenadas devem ser maiores ou iguais a zero")
+    if not poi.external_id:
+        poi.external_id = None
+    return poi
+
+
+def _write_rows(rows: List[Record]) -> List[Tuple[int, str, int, int]]:
+    """
+    Grava os POIs (name, x, y, external_id) em uma única transação.
+
+    No Postgres (psycopg) usa COPY; quando os ids são necessários (índice em
+    memória ou log de mudanças ativos), ou em outros bancos, usa um INSERT de
+    várias linhas com RETURNING. Retorna as linhas (id, name, x, y) inseridas
+    quando conhecidas.
+    """
+    indexed = indexes_active()
+    logged = change_log_enabled()
+    points = [row[:3] for row in rows]
+    # A coluna external_id só entra no comando quando o lote a usa
+    with_external = any(row[3] is not None for row in rows)
+    session = SessionLocal()
+    try:
+        present = optional_columns(session)
+        if with_external:
+            check_external_id(present)
+        columns = ("name", "x", "y", "external_id") if with_external else ("name", "x", "y")
+        values = [row if with_external else row[:3] for row in rows]
+        if "zkey" in present:
+            # Chaves de Morton calculadas de uma vez para o lote
+            keys = morton_keys([row[1] for row in rows], [row[2] for row in rows]).tolist()
+            columns += ("zkey",)
+            values = [value + (key,) for value, key in zip(values, keys)]
+
+        connection = session.connection()
+        if not indexed and not logged and connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg":
+            raw = connection.connection.driver_connection
+            with raw.cursor() as cursor:
+                with cursor.copy(f"COPY pois ({', '.join(columns)}) FROM STDIN") as copy:
+                    for value in values:
+                        copy.write_row(value)
+            session.commit()
+            inserted = None
+        else:
+            params = [dict(zip(columns, value)) for value in values]
+            inserted = session.execute(insert(POI).returning(POI.id, POI.name, POI.x, POI.y), params).all()
+            record_changes(session, upserts(INSERTED, inserted))
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    if inserted is None:
+        # O COPY não devolve os ids: o cache é invalidado pelas posições
+        publish_write(replaced=[(None,) + tuple(point) for point in points])
+        return []
+    inserted = [tuple(row) for row in inserted]
+    publish_write(inserted)
+    return inserted
+
+
+def _upsert_rows(rows: List[Record], report: ChunkReport):
+    """Grava o lote no modo upsert (ver app/services/upsert.py) em uma única transação."""
+    session = SessionLocal()
+    try:
+        result = upsert_records(session, rows)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    result.publish()
+    report.updated = result.updated
+    report.unchanged = result.unchanged
+    report.duplicates = result.duplicates
+
+
+def import_chunk(number: int, parsed: List[Tuple[int, Optional[dict], Optional[str]]],
+                 mode: str = INSERT) -> ChunkReport:
+    """
+    Valida e grava um lote de registros já interpretados pelo RecordParser.
+    No modo "upsert", registros já existentes (pelo external_id ou pela
+    chave natural name, x, y) são atualizados ou ignorados em vez de duplicados.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Modo inválido: {mode} (use {', '.join(MODES)})")
+    report = ChunkReport(chunk=number)
+    rows = []
+    for line, record, error in parsed:
+        if error is not None:
+            report.reject(line, error)
+            continue
+        try:
+            poi = validate_record(record)
+        except ValidationError as e:
+            report.reject(line, "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+            ))
+            continue
+        except (ValueError, TypeError) as e:
+            report.reject(line, str(e))
+            continue
+        rows.append((poi.name, poi.x, poi.y, poi.external_id))
+
+    if rows:
+        try:
+            if mode == UPSERT:
+                _upsert_rows(rows, report)
+            else:
+                _write_rows(rows)
+            report.accepted = len(rows)
+        except ValueError as e:
+            # Pré-requisito ausente no banco (ex.: migração pendente): a
+            # mensagem é da própria aplicação e diz o que fazer
+            report.rejected += len(rows)
+            report.error(f"falha ao gravar o lote: {e}")
+        except Exception:
+            # Se a gravação falhar, o lote inteiro é descartado (rollback); o
+            # erro do banco fica no log, não na resposta
+            logger.exception("Falha ao gravar o lote %d (%d POIs)", number, len(rows))
+            report.rejected += len(rows)
+            report.error("falha ao gravar o lote")
+    return report
+
+
+def import_lines(lines: Iterable[str], fmt: str = "ndjson",
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, mode: str = INSERT) -> Iterator[ChunkReport]:
+    """
+    Importa POIs de um iterável de linhas, lote a lote, gerando um
+    ChunkReport por lote. A memória usada é limitada ao tamanho do lote.
+    """
+    parser = RecordParser(fmt)
+    pending = []
+    number = 0
+    for line in lines:
+        parsed = parser.parse(line)
+        if parsed is None:
+            continue
+        pending.append(parsed)
+        if len(pending) >= chunk_size:
+            number += 1
+            yield import_chunk(number, pending, mode)
+            pending = []
+    parsed = parser.close()
+    if parsed is not None:
+        pending.append(parsed)
+    if pending:
+        number += 1
+        yield import_chunk(number, pending, mode)
+
@@ -0,0 +1,314 @@
+# app/services/metrics.py
+import contextvars
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("app.slow_requests")
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    """Contador monotônico com rótulos, no formato do Prometheus."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    """Histograma com buckets cumulativos e rótulos, no formato do Prometheus."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # contagens por bucket + [+Inf, soma]
+                series = self._series[label_values] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + (repr(bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + ('+Inf',))} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.labels, values)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+REQUESTS = Counter("poi_http_requests_total", "Requisições HTTP atendidas.", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("poi_http_request_duration_seconds", "Duração das requisições HTTP.", ("method", "route"))
+STAGE_SECONDS = Histogram("poi_stage_duration_seconds", "Duração de cada etapa (query, hydrate, filter, serialize, other).", ("route", "stage"))
+ROWS_SCANNED = Counter("poi_rows_scanned_total", "Linhas/candidatos examinados pelas buscas.", ("route",))
+ROWS_RETURNED = Counter("poi_rows_returned_total", "Linhas retornadas pelas buscas.", ("route",))
+POOL_WAIT_SECONDS = Histogram("poi_db_pool_wait_seconds", "Tempo para obter uma conexão do pool.")
+SLOW_REQUESTS = Counter("poi_slow_requests_total", "Requisições acima de SLOW_REQUEST_MS.", ("route",))
+COALESCED = Counter("poi_search_coalesced_total", "Buscas atendidas por uma execução compartilhada (single_flight ou batch).", ("mode",))
+SEARCH_BATCH_SIZE = Histogram("poi_search_batch_size", "Buscas por execução do micro-batcher.",
+                              buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+REGISTRY = (REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, ROWS_SCANNED, ROWS_RETURNED, POOL_WAIT_SECONDS, SLOW_REQUESTS,
+            COALESCED, SEARCH_BATCH_SIZE)
+
+
+class RequestMetrics:
+    """Medições acumuladas durante uma requisição (ou uma chamada fora do HTTP)."""
+
+    __slots__ = ("stages", "scanned", "returned")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.scanned = 0
+        self.returned = 0
+
+
+_current: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar("poi_request_metrics", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Mede uma etapa do caminho quente (query, hydrate, filter, serialize).
+
+    Dentro de uma requisição o tempo é somado ao da requisição e publicado
+    pelo middleware com o rótulo da rota; fora dela, vai direto para o histograma.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        current = _current.get()
+        if current is None:
+            STAGE_SECONDS.observe(elapsed, "-", name)
+        else:
+            current.stages[name] = current.stages.get(name, 0.0) + elapsed
+
+
+def record_rows(scanned: int, returned: int):
+    """Registra quantas linhas uma busca examinou e quantas retornou."""
+    current = _current.get()
+    if current is None:
+        ROWS_SCANNED.inc(scanned, "-")
+        ROWS_RETURNED.inc(returned, "-")
+    else:
+        current.scanned += scanned
+        current.returned += returned
+
+
+def begin_request() -> Tuple[RequestMetrics, contextvars.Token]:
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def finish_request(metrics: RequestMetrics, token: contextvars.Token, method: str, route: str,
+                   status: int, elapsed: float):
+    """Publica as medições de uma requisição nos contadores e histogramas."""
+    _current.reset(token)
+    REQUESTS.inc(1, method, route, str(status))
+    REQUEST_SECONDS.observe(elapsed, method, route)
+    measured = 0.0
+    for name, seconds in metrics.stages.items():
+        STAGE_SECONDS.observe(seconds, route, name)
+        measured += seconds
+    # O restante (validação, serialização do FastAPI, middlewares) vai para "other"
+    STAGE_SECONDS.observe(max(0.0, elapsed - measured), route, "other")
+    if metrics.scanned or metrics.returned:
+        ROWS_SCANNED.inc(metrics.scanned, route)
+        ROWS_RETURNED.inc(metrics.returned, route)
+
+
+# Tempo de espera pelo pool: entre o primeiro comando de uma transação e o
+# momento em que a sessão recebe a conexão (inclui conectar e o pre-ping).
+# Vale também para AsyncSession, que executa sobre uma Session síncrona.
+@event.listens_for(Session, "do_orm_execute")
+def _checkout_started(orm_execute_state):
+    session = orm_execute_state.session
+    if not session.in_transaction():
+        session.info["pool_wait_start"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_begin")
+def _checkout_finished(session, transaction, connection):
+    start = session.info.pop("pool_wait_start", None)
+    if start is not None:
+        POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+
+class SlowRequestProfiler:
+    """
+    Log opcional de requisições lentas (SLOW_REQUEST_MS) com captura cProfile
+    de uma amostra delas (SLOW_PROFILE_SAMPLE, fração entre 0 e 1).
+
+    Como só se sabe que a requisição foi lenta no final, a amostra é
+    perfilada desde o início e o perfil é descartado se ela foi rápida. Apenas
+    uma requisição é perfilada por vez, e o perfil inclui o que mais rodou no
+    mesmo thread/event loop no período.
+    """
+
+    def __init__(self):
+        threshold = os.getenv("SLOW_REQUEST_MS")
+        self.threshold = float(threshold) / 1000 if threshold else None
+        self.sample = float(os.getenv("SLOW_PROFILE_SAMPLE", "0"))
+        self.directory = os.getenv("SLOW_PROFILE_DIR")
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold is not None
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if not self.enabled or self.sample <= 0 or random.random() >= self.sample:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Outro profiler já está ativo neste processo
+            self._busy.release()
+            return None
+        return profile
+
+    def finish(self, profile: Optional[cProfile.Profile], method: str, path: str, route: str, elapsed: float):
+        if profile is not None:
+            profile.disable()
+            self._busy.release()
+        if not self.enabled or elapsed < self.threshold:
+            return
+        SLOW_REQUESTS.inc(1, route)
+        message = f"Requisição lenta: {method} {path} ({elapsed * 1000:.1f} ms)"
+        if profile is None:
+            logger.warning(message)
+            return
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(15)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(os.path.join(self.directory, f"{int(time.time() * 1000)}_{route.strip('/').replace('/', '_') or 'root'}.prof"))
+        logger.warning("%s\n%s", message, out.getvalue())
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mede cada requisição HTTP: latência total por rota,
+    etapas acumuladas pelo finder (stage/record_rows) e, se configurado, o
+    log de requisições lentas.
+
+    O rótulo `route` é o caminho declarado da rota (ex.: /api/pois/{by_name}),
+    para que a quantidade de séries não cresça com os valores da URL.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.profiler = SlowRequestProfiler()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics, token = begin_request()
+        profile = self.profiler.start()
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", "unmatched")
+            finish_request(metrics, token, scope["method"], route, status, elapsed)
+            self.profiler.finish(profile, scope["method"], scope["path"], route, elapsed)
+
+
+def process_memory(pid: str = "self") -> Dict[str, int]:
+    """
+    Memória de um processo em bytes (Linux, /proc/<pid>/smaps_rollup): rss,
+    pss (páginas compartilhadas divididas entre os processos) e uss (só as
+    páginas privadas). Com workers criados por fork, o uss é o custo real de
+    cada worker; o restante é compartilhado com o processo pai.
+    Retorna um dicionário vazio se o arquivo não existir.
+    """
+    fields = {"Rss": "rss", "Pss": "pss", "Private_Clean": "uss", "Private_Dirty": "uss"}
+    memory: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    name = fields[key]
+                    memory[name] = memory.get(name, 0) + int(value.split()[0]) * 1024
+    except OSError:
+        return {}
+    return memory
+
+
+def render_metrics(extra: Sequence[str] = ()) -> str:
+    """Texto do endpoint /metrics (formato de exposição do Prometheus)."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
+
+
+def gauge_lines(name: str, help_text: str, value: float, kind: str = "gauge") -> List[str]:
+    """Linhas de uma métrica sem rótulos lida no momento da coleta (pool, cache)."""
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
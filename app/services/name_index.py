@@ -0,0 +1,125 @@
+# app/services/name_index.py
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def _grams(text: str) -> Set[str]:
+    """Trigramas de um texto já normalizado (substrings de 3 caracteres)."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity_trigrams(text: str) -> Set[str]:
+    """
+    Trigramas no estilo do pg_trgm: cada palavra em minúsculas é completada
+    com dois espaços à esquerda e um à direita antes de ser fatiada.
+    """
+    grams = set()
+    for word in text.lower().split():
+        grams |= _grams(f"  {word} ")
+    return grams
+
+
+def similarity(a: str, b: str) -> float:
+    """Equivalente à função similarity() do pg_trgm (índice de Jaccard)."""
+    ta, tb = similarity_trigrams(a), similarity_trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+class NameIndex:
+    """
+    Índice invertido de trigramas em memória para buscas por nome.
+
+    Faz o papel do índice GIN pg_trgm quando o banco não é Postgres: uma
+    busca por substring intersecta as listas de ids dos trigramas da consulta
+    e só confere os nomes candidatos, em vez de varrer todos.
+    """
+
+    def __init__(self):
+        self._names: Dict[int, str] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def insert(self, poi_id: int, name: str):
+        """Insere (ou substitui) o nome de um POI no índice."""
+        with self._lock:
+            if poi_id in self._names:
+                self._remove_unlocked(poi_id)
+            self._names[poi_id] = name
+            for gram in _grams(name.lower()):
+                self._postings.setdefault(gram, set()).add(poi_id)
+
+    def remove(self, poi_id: int) -> bool:
+        """Remove um POI do índice. Retorna False se ele não estava indexado."""
+        with self._lock:
+            if poi_id not in self._names:
+                return False
+            self._remove_unlocked(poi_id)
+            return True
+
+    def _remove_unlocked(self, poi_id: int):
+        name = self._names.pop(poi_id)
+        for gram in _grams(name.lower()):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(poi_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def bulk_load(self, rows: Iterable[Tuple[int, str]]):
+        """Carrega vários pares (id, name) de uma vez."""
+        with self._lock:
+            for poi_id, name in rows:
+                self.insert(poi_id, name)
+
+    def _candidates(self, text: str) -> Iterable[int]:
+        grams = _grams(text)
+        if not grams:
+            # Consultas com menos de 3 caracteres não têm trigramas
+            return list(self._names)
+        postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+        return set.intersection(*postings) if postings[0] else set()
+
+    def search(self, name: str, limit: Optional[int] = None) -> List[int]:
+        """Ids dos POIs cujo nome contém `name` (sem diferenciar maiúsculas), em ordem de id."""
+        text = name.lower()
+        with self._lock:
+            ids = sorted(i for i in self._candidates(text) if text in self._names[i].lower())
+        return ids if limit is None else ids[:limit]
+
+    def autocomplete(self, prefix: str, limit: int) -> List[int]:
+        """
+        Ids dos POIs cujo nome começa com `prefix`, ordenados pela similaridade
+        de trigramas com o prefixo (e depois pelo nome), limitados a `limit`.
+        """
+        text = prefix.lower()
+        with self._lock:
+            matches = [(self._names[i], i) for i in self._candidates(text)
+                       if self._names[i].lower().startswith(text)]
+        matches.sort(key=lambda m: (-similarity(m[0], prefix), m[0], m[1]))
+        return [poi_id for _, poi_id in matches[:limit]]
+
+
+# Índice global do processo; só existe quando o modo em memória é habilitado
+_index: Optional[NameIndex] = None
+
+
+def name_index_enabled() -> bool:
+    """Indica se o índice de nomes em memória foi habilitado no .env."""
+    return os.getenv("NAME_INDEX", "").lower() in ("1", "true", "memory")
+
+
+def get_name_index() -> Optional[NameIndex]:
+    """Retorna o índice de nomes em memória, ou None se ele não foi construído."""
+    return _index
+
+
+def set_name_index(index: Optional[NameIndex]):
+    """Define (ou remove, com None) o índice de nomes usado pelo finder."""
+    global _index
+    _index = index
@@ -0,0 +1,144 @@
+# app/services/serializers.py
+import struct
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+import orjson
+from app.services.cache import Row
+
+# Serialização direta das linhas (id, name, x, y[, distância]) para JSON com
+# orjson. Produz exatamente o mesmo corpo dos modelos de app/schemas/poi_schema.py
+# (POISearchResponse, POIPageResponse, POINearestResponse e
+# POIBatchSearchResponse), sem criar um
+# POIItem por linha nem revalidar a resposta.
+
+def _item(row: Row) -> dict:
+    return {"id": row[0], "name": row[1], "x": row[2], "y": row[3]}
+
+def _distance_item(row: Row) -> dict:
+    return {"id": row[0], "name": row[1], "x": row[2], "y": row[3], "distance": float(row[4])}
+
+def search_json(rows: Iterable[Row], next_after: Optional[int] = None) -> bytes:
+    """Corpo de POISearchResponse (ou de POIPageResponse, quando há `next_after`)."""
+    body = {"results": [_item(row) for row in rows]}
+    if next_after is not None:
+        body["next_after"] = next_after
+    return orjson.dumps(body)
+
+def batch_json(batches: Iterable[Iterable[Row]]) -> bytes:
+    """Corpo de POIBatchSearchResponse: as linhas de cada consulta, na ordem."""
+    return orjson.dumps({"results": [{"results": [_item(row) for row in rows]} for rows in batches]})
+
+def nearest_json(rows: Iterable[Row]) -> bytes:
+    """Corpo de POINearestResponse a partir de linhas (id, name, x, y, distância)."""
+    return orjson.dumps({"results": [_distance_item(row) for row in rows]})
+
+def ndjson_line(row: Row) -> bytes:
+    """Uma linha NDJSON (um POI) do /api/list em streaming."""
+    return orjson.dumps(_item(row)) + b"\n"
+
+def _change_item(row: tuple) -> list:
+    # [version, op, id, name, x, y]; remoções só com [version, "D", id]
+    if row[1] == "D":
+        return [row[0], row[1], row[2]]
+    return [row[0], row[1], row[2], row[3], row[4], row[5]]
+
+def changes_json(changes: Iterable[tuple], version: int, more: bool) -> bytes:
+    """Corpo de POIChangesResponse a partir das linhas (version, op, poi_id, name, x, y)."""
+    return orjson.dumps({"changes": [_change_item(row) for row in changes], "version": version, "more": more})
+
+def changes_ndjson(batches: Iterable[List[tuple]], since: int) -> Iterator[bytes]:
+    """Uma linha NDJSON por mudança e, no fim, {"version": ...} para o próximo `since`."""
+    version = since
+    for batch in batches:
+        for row in batch:
+            yield orjson.dumps(_change_item(row)) + b"\n"
+        if batch:
+            version = max(version, batch[-1][0])
+    yield orjson.dumps({"version": version}) + b"\n"
+
+def viewport_json(rows: Iterable[tuple], cell_size: int) -> bytes:
+    """Corpo de POIViewportResponse a partir das linhas (count, x, y, id, name)."""
+    results, clusters, total = [], [], 0
+    for count, x, y, poi_id, name in rows:
+        total += count
+        if count == 1:
+            results.append({"id": poi_id, "name": name, "x": x, "y": y})
+        else:
+            clusters.append({"x": float(x), "y": float(y), "count": count})
+    return orjson.dumps({"total": total, "cell_size": cell_size, "results": results, "clusters": clusters})
+
+
+# Formato binário colunar (Accept: application/x-poi-columns), alternativa
+# compacta ao JSON das buscas e da listagem. Little-endian, nesta ordem:
+#   cabeçalho (24 bytes): magic "POIC", versão (u8), flags (u8), reservado
+#     (u16), quantidade n (u32), bytes de nomes (u32), next_after (i64, -1
+#     se não houver);
+#   distance: f64[n], só com a flag HAS_DISTANCE (k-NN);
+#   id, x, y: i32[n] cada;
+#   offsets: u32[n + 1]; o nome i é names[offsets[i]:offsets[i + 1]];
+#   names: UTF-8 concatenado.
+# Todas as colunas ficam alinhadas ao próprio tamanho, então um cliente lê
+# cada uma com um único np.frombuffer (ou DataView/TypedArray no navegador).
+
+COLUMNS_MEDIA_TYPE = "application/x-poi-columns"
+
+_COLUMNS_MAGIC = b"POIC"
+_COLUMNS_VERSION = 1
+_COLUMNS_HEADER = struct.Struct("<4sBBHIIq")
+HAS_DISTANCE = 1
+
+def columns_binary(ids, xs, ys, offsets, names: bytes, distances=None,
+                   next_after: Optional[int] = None) -> bytes:
+    """Corpo binário a partir de colunas já prontas (ex.: posições de um snapshot)."""
+    count = len(ids)
+    flags = HAS_DISTANCE if distances is not None else 0
+    parts = [_COLUMNS_HEADER.pack(_COLUMNS_MAGIC, _COLUMNS_VERSION, flags, 0, count, len(names),
+                                  -1 if next_after is None else next_after)]
+    if distances is not None:
+        parts.append(np.asarray(distances, dtype="<f8").tobytes())
+    for column in (ids, xs, ys):
+        parts.append(np.asarray(column, dtype="<i4").tobytes())
+    parts.append(np.asarray(offsets, dtype="<u4").tobytes())
+    parts.append(names)
+    return b"".join(parts)
+
+def rows_binary(rows: Sequence[Row], next_after: Optional[int] = None) -> bytes:
+    """
+    Corpo binário a partir das linhas (id, name, x, y[, distância]); com a
+    distância (linhas do k-NN), inclui a coluna distance.
+    """
+    count = len(rows)
+    encoded = [row[1].encode("utf-8") for row in rows]
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=count), out=offsets[1:])
+    distances = None
+    if count and len(rows[0]) > 4:
+        distances = np.fromiter((row[4] for row in rows), dtype=np.float64, count=count)
+    return columns_binary(
+        np.fromiter((row[0] for row in rows), dtype=np.int64, count=count),
+        np.fromiter((row[2] for row in rows), dtype=np.int64, count=count),
+        np.fromiter((row[3] for row in rows), dtype=np.int64, count=count),
+        offsets, b"".join(encoded), distances, next_after,
+    )
+
+def read_columns(body: bytes) -> Tuple[List[Row], Optional[int]]:
+    """Decodifica o formato binário em (linhas (id, name, x, y[, distância]), next_after)."""
+    magic, version, flags, _, count, names_len, next_after = _COLUMNS_HEADER.unpack_from(body)
+    if magic != _COLUMNS_MAGIC or version != _COLUMNS_VERSION:
+        raise ValueError("corpo não está no formato application/x-poi-columns")
+    pos = _COLUMNS_HEADER.size
+    distances = None
+    if flags & HAS_DISTANCE:
+        distances = np.frombuffer(body, dtype="<f8", count=count, offset=pos).tolist()
+        pos += 8 * count
+    ids, xs, ys = (np.frombuffer(body, dtype="<i4", count=count, offset=pos + 4 * count * i).tolist() for i in range(3))
+    pos += 12 * count
+    offsets = np.frombuffer(body, dtype="<u4", count=count + 1, offset=pos).tolist()
+    start = pos + 4 * (count + 1)
+    names = body[start:start + names_len]
+    rows = [
+        (ids[i], names[offsets[i]:offsets[i + 1]].decode("utf-8"), xs[i], ys[i])
+        + ((distances[i],) if distances is not None else ())
+        for i in range(count)
+    ]
+    return rows, None if next_after < 0 else next_after
@@ -0,0 +1,471 @@
+# app/services/snapshot.py
+import fcntl
+import math
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+# Linha (id, name, x, y) lida do banco para montar o snapshot
+Row = Tuple[int, str, int, int]
+
+# Coordenadas válidas (int4 não negativo, ver app/models/point.py). Com a
+# consulta dentro deste domínio, |dx| e |dy| < 2^31 e dx² + dy² cabe em int64.
+_COORD_LIMIT = 2 ** 31
+
+# Cabeçalho do arquivo: magic, quantidade de POIs, bytes de nomes, instante da leitura
+_MAGIC = b"POISNAP1"
+_HEADER = struct.Struct("<8sQQd")
+_HEADER_SIZE = 64
+
+
+class _Columns(NamedTuple):
+    """Colunas do snapshot, ordenadas por (x, y)."""
+    ids: np.ndarray        # int64[n]
+    id_order: np.ndarray   # int64[n]: posições em ordem de id (busca de nome por id)
+    xs: np.ndarray         # int32[n]
+    ys: np.ndarray         # int32[n]
+    offsets: np.ndarray    # int64[n + 1]: nome i = names[offsets[i]:offsets[i + 1]]
+    names: np.ndarray      # uint8[...]: nomes em UTF-8, concatenados
+    built_at: float        # time.time() do início da leitura do banco
+
+
+def _layout(count: int, names_len: int) -> Dict[str, Tuple[int, int, str]]:
+    """Deslocamento, quantidade e dtype de cada coluna dentro do arquivo."""
+    layout = {}
+    pos = _HEADER_SIZE
+    for name, n, dtype, size in (
+        ("ids", count, "<i8", 8), ("id_order", count, "<i8", 8),
+        ("xs", count, "<i4", 4), ("ys", count, "<i4", 4),
+        ("offsets", count + 1, "<i8", 8), ("names", names_len, "u1", 1),
+    ):
+        pos = (pos + 7) // 8 * 8
+        layout[name] = (pos, n, dtype)
+        pos += n * size
+    return layout
+
+
+def build_columns(rows: Iterable[Row], built_at: float) -> _Columns:
+    """Monta as colunas a partir das linhas (id, name, x, y)."""
+    ids, xs, ys, lengths, encoded = [], [], [], [], []
+    for poi_id, name, x, y in rows:
+        data = name.encode("utf-8")
+        ids.append(poi_id)
+        xs.append(x)
+        ys.append(y)
+        lengths.append(len(data))
+        encoded.append(data)
+    xs_arr = np.array(xs, dtype=np.int32)
+    ys_arr = np.array(ys, dtype=np.int32)
+    order = np.lexsort((ys_arr, xs_arr))
+    ids_arr = np.array(ids, dtype=np.int64)[order]
+    lengths_arr = np.array(lengths, dtype=np.int64)[order]
+    offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(lengths_arr, out=offsets[1:])
+    names = np.frombuffer(b"".join(encoded[i] for i in order.tolist()), dtype=np.uint8)
+    return _Columns(ids_arr, np.argsort(ids_arr, kind="stable").astype(np.int64),
+                    xs_arr[order], ys_arr[order], offsets, names, built_at)
+
+
+def write_columns(cols: _Columns, path: str):
+    """
+    Grava as colunas em `path` de forma atômica (arquivo temporário + rename):
+    processos que já mapearam a versão anterior continuam lendo-a até reabrir.
+    """
+    count, names_len = len(cols.ids), len(cols.names)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, count, names_len, cols.built_at).ljust(_HEADER_SIZE, b"\0"))
+        for name, (pos, _, dtype) in _layout(count, names_len).items():
+            f.write(b"\0" * (pos - f.tell()))
+            np.ascontiguousarray(getattr(cols, name), dtype=dtype).tofile(f)
+    os.replace(tmp, path)
+
+
+def map_columns(path: str) -> _Columns:
+    """Mapeia o arquivo em memória (somente leitura): as páginas são compartilhadas entre os processos."""
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    magic, count, names_len, built_at = _HEADER.unpack_from(data[:_HEADER.size].tobytes())
+    if magic != _MAGIC:
+        raise ValueError(f"{path} não é um snapshot de POIs")
+    columns = {
+        name: np.frombuffer(data, dtype=dtype, count=n, offset=pos)
+        for name, (pos, n, dtype) in _layout(count, names_len).items()
+    }
+    return _Columns(built_at=built_at, **columns)
+
+
+class ColumnarSnapshot:
+    """
+    Snapshot colunar da tabela pois para buscas por proximidade com NumPy.
+
+    As colunas (ids, x/y int32, nomes UTF-8 codificados por deslocamento) ficam
+    ordenadas por x: uma busca por raio localiza a faixa [x - d, x + d] por
+    busca binária e compara as distâncias ao quadrado da faixa inteira com
+    operações vetorizadas. Tem a mesma interface do GridIndex, então o finder
+    o usa no lugar dele (SPATIAL_INDEX=snapshot).
+
+    Com `path` (SNAPSHOT_PATH), as colunas ficam em um arquivo mapeado em
+    memória: os workers do uvicorn compartilham as mesmas páginas em vez de
+    manter uma cópia cada. As gravações de cada processo entram em uma camada
+    incremental (overlay) consultada junto com o snapshot; quando ela cresce
+    ou envelhece, o snapshot é relido do banco em segundo plano e trocado, e
+    os demais processos passam a usar o arquivo novo na próxima consulta.
+    """
+
+    def __init__(self, loader: Callable[[], Iterable[Row]], path: Optional[str] = None,
+                 max_overlay: int = 10_000, refresh_interval: float = 30.0, max_age: float = 60.0):
+        self._loader = loader
+        self.path = path
+        self.max_overlay = max_overlay
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self._cols: Optional[_Columns] = None
+        self._file_id: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+        # Gravações ainda não incorporadas: id -> (name, x, y, instante) e id -> instante
+        self._overlay: Dict[int, Tuple[str, int, int, float]] = {}
+        self._deleted: Dict[int, float] = {}
+        self._masked = np.empty(0, dtype=np.int64)
+        self._refreshing = False
+        self._lock = threading.RLock()
+
+    # Carga e troca do snapshot
+
+    def load(self):
+        """
+        Carrega o snapshot. Com `path`, reaproveita o arquivo se ele tiver
+        menos de `max_age` segundos (ex.: gerado por outro worker ou pelo
+        processo pai); senão, relê o banco e regrava o arquivo.
+        """
+        if self.path is None:
+            self._swap(self._read())
+            return self
+        with self._file_lock():
+            if not self._file_is_fresh():
+                write_columns(self._read(), self.path)
+            self._remap()
+        return self
+
+    def _read(self) -> _Columns:
+        built_at = time.time()
+        return build_columns(self._loader(), built_at)
+
+    @contextmanager
+    def _file_lock(self):
+        """Trava entre processos: só um deles relê o banco e regrava o arquivo."""
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _file_is_fresh(self) -> bool:
+        try:
+            return time.time() - os.stat(self.path).st_mtime < self.max_age
+        except FileNotFoundError:
+            return False
+
+    def _remap(self):
+        stat = os.stat(self.path)
+        self._swap(map_columns(self.path))
+        self._file_id = (stat.st_ino, stat.st_mtime_ns)
+
+    def _swap(self, cols: _Columns):
+        """Troca as colunas e descarta do overlay o que já foi lido do banco."""
+        with self._lock:
+            self._cols = cols
+            self._overlay = {k: v for k, v in self._overlay.items() if v[3] >= cols.built_at}
+            self._deleted = {k: t for k, t in self._deleted.items() if t >= cols.built_at}
+            self._update_mask()
+
+    def _update_mask(self):
+        self._masked = np.array(sorted(set(self._overlay) | set(self._deleted)), dtype=np.int64)
+
+    def _check(self):
+        """Reabre o arquivo trocado por outro processo e agenda a releitura do banco."""
+        now = time.monotonic()
+        if now - self._checked_at < 1.0:
+            return
+        self._checked_at = now
+        if self.path is not None:
+            try:
+                stat = os.stat(self.path)
+                if (stat.st_ino, stat.st_mtime_ns) != self._file_id:
+                    self._remap()
+            except FileNotFoundError:
+                pass
+        pending = len(self._overlay) + len(self._deleted)
+        if pending and (pending >= self.max_overlay
+                        or time.time() - self._cols.built_at >= self.refresh_interval):
+            self.refresh_async()
+
+    def refresh(self):
+        """Relê o banco e troca o snapshot (no arquivo, se houver)."""
+        if self.path is None:
+            self._swap(self._read())
+            return
+        with self._file_lock():
+            # Outro processo pode ter acabado de regravar o arquivo
+            if map_columns(self.path).built_at <= self._cols.built_at or not self._file_is_fresh():
+                write_columns(self._read(), self.path)
+            self._remap()
+
+    def refresh_async(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="poi-snapshot-refresh", daemon=True).start()
+
+    # Gravações (mesma interface do GridIndex)
+
+    def insert(self, poi_id: int, name: str, x: int, y: int):
+        with self._lock:
+            self._overlay[poi_id] = (name, x, y, time.time())
+            self._deleted.pop(poi_id, None)
+            self._update_mask()
+
+    def bulk_load(self, rows: Iterable[Row]):
+        with self._lock:
+            now = time.time()
+            for poi_id, name, x, y in rows:
+                self._overlay[poi_id] = (name, x, y, now)
+                self._deleted.pop(poi_id, None)
+            self._update_mask()
+        self._check()
+
+    def remove(self, poi_id: int) -> bool:
+        with self._lock:
+            found = self._overlay.pop(poi_id, None) is not None or self._base_position(poi_id) is not None
+            self._deleted[poi_id] = time.time()
+            self._update_mask()
+        self._check()
+        return found
+
+    # Consultas
+
+    def __len__(self):
+        cols = self._cols
+        hidden = np.isin(self._masked, cols.ids).sum() if len(self._masked) else 0
+        return len(cols.ids) - int(hidden) + len(self._overlay)
+
+    def __contains__(self, poi_id: int):
+        return poi_id in self._overlay or (poi_id not in self._deleted and self._base_position(poi_id) is not None)
+
+    def _base_position(self, poi_id: int) -> Optional[int]:
+        cols = self._cols
+        i = int(np.searchsorted(cols.ids, poi_id, sorter=cols.id_order))
+        if i < len(cols.ids) and cols.ids[cols.id_order[i]] == poi_id:
+            return int(cols.id_order[i])
+        return None
+
+    def _name_at(self, cols: _Columns, pos: int) -> str:
+        return cols.names[cols.offsets[pos]:cols.offsets[pos + 1]].tobytes().decode("utf-8")
+
+    def name_of(self, poi_id: int) -> str:
+        entry = self._overlay.get(poi_id)
+        if entry is not None:
+            return entry[0]
+        pos = self._base_position(poi_id)
+        if pos is None:
+            raise KeyError(poi_id)
+        return self._name_at(self._cols, pos)
+
+    def _state(self):
+        self._check()
+        with self._lock:
+            return self._cols, list(self._overlay.items()), self._masked
+
+    def _window(self, cols: _Columns, masked: np.ndarray, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        """Posições do snapshot dentro da caixa, sem os ids alterados pelo overlay."""
+        # Recorta a caixa ao domínio para que os limites caibam em int32
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, _COORD_LIMIT - 1), min(y1, _COORD_LIMIT - 1)
+        if x0 > x1 or y0 > y1:
+            return np.empty(0, dtype=np.int64)
+        lo = int(np.searchsorted(cols.xs, x0, side="left"))
+        hi = int(np.searchsorted(cols.xs, x1, side="right"))
+        ys = cols.ys[lo:hi]
+        pos = np.flatnonzero((ys >= y0) & (ys <= y1)) + lo
+        if len(masked):
+            pos = pos[~np.isin(cols.ids[pos], masked, assume_unique=True)]
+        return pos
+
+    def _within(self, cols: _Columns, pos: np.ndarray, x: int, y: int, max_sq: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Filtra as posições pelo círculo; retorna (posições, distâncias²)."""
+        if 0 <= x < _COORD_LIMIT and 0 <= y < _COORD_LIMIT:
+            dx = cols.xs[pos].astype(np.int64) - x
+            dy = cols.ys[pos].astype(np.int64) - y
+            d2 = dx * dx + dy * dy
+            keep = d2 <= min(max_sq, np.iinfo(np.int64).max)
+            return pos[keep], d2[keep]
+        # Consulta fora do domínio: dx² + dy² pode passar de int64, compara em Python
+        d2 = [(int(px) - x) ** 2 + (int(py) - y) ** 2 for px, py in zip(cols.xs[pos], cols.ys[pos])]
+        keep = [i for i, d in enumerate(d2) if d <= max_sq]
+        return pos[keep], np.array([d2[i] for i in keep], dtype=object)
+
+    def _radius(self, x: int, y: int, max_distance: int, stats: Optional[Dict[str, int]]):
+        """Posições do snapshot e entradas do overlay dentro do círculo."""
+        cols, overlay, masked = self._state()
+        max_sq = max_distance * max_distance
+        pos = self._window(cols, masked, x - max_distance, y - max_distance, x + max_distance, y + max_distance)
+        if stats is not None:
+            stats["scanned"] = len(pos) + len(overlay)
+        pos, _ = self._within(cols, pos, x, y, max_sq)
+        extra = [(poi_id, entry) for poi_id, entry in overlay
+                 if (entry[1] - x) ** 2 + (entry[2] - y) ** 2 <= max_sq]
+        return cols, pos, extra
+
+    def query_radius(self, x: int, y: int, max_distance: int,
+                     stats: Optional[Dict[str, int]] = None) -> List[Tuple[int, int, int]]:
+        """Retorna as tuplas (id, x, y) dos POIs a uma distância <= max_distance de (x, y)."""
+        if max_distance < 0:
+            return []
+        cols, pos, extra = self._radius(x, y, max_distance, stats)
+        results = list(zip(cols.ids[pos].tolist(), cols.xs[pos].tolist(), cols.ys[pos].tolist()))
+        results.extend((poi_id, px, py) for poi_id, (_, px, py, _) in extra)
+        return results
+
+    def query_rows(self, x: int, y: int, max_distance: int,
+                   stats: Optional[Dict[str, int]] = None) -> List[Row]:
+        """Como query_radius, mas já com os nomes: linhas (id, name, x, y)."""
+        if max_distance < 0:
+            return []
+        cols, pos, extra = self._radius(x, y, max_distance, stats)
+        # Os nomes vêm direto do buffer, pelas posições (sem buscar por id)
+        starts = cols.offsets[pos].tolist()
+        ends = cols.offsets[pos + 1].tolist()
+        names = cols.names
+        results = [
+            (poi_id, names[a:b].tobytes().decode("utf-8"), px, py)
+            for poi_id, a, b, px, py in zip(cols.ids[pos].tolist(), starts, ends,
+                                             cols.xs[pos].tolist(), cols.ys[pos].tolist())
+        ]
+        results.extend((poi_id, name, px, py) for poi_id, (name, px, py, _) in extra)
+        return results
+
+    def query_columns(self, x: int, y: int, max_distance: int,
+                      stats: Optional[Dict[str, int]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, bytes]:
+        """
+        Como query_rows, mas em colunas (ids, xs, ys, offsets, nomes em UTF-8),
+        na mesma ordem: os nomes são copiados do buffer por fatias, sem criar
+        uma str por POI (ver serializers.columns_binary).
+        """
+        if max_distance < 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty, np.zeros(1, dtype=np.int64), b""
+        cols, pos, extra = self._radius(x, y, max_distance, stats)
+        starts = cols.offsets[pos]
+        lengths = cols.offsets[pos + 1] - starts
+        offsets = np.zeros(len(pos) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Índice de cada byte de nome no buffer: início da fatia + posição dentro dela
+        gather = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        names = cols.names[gather].tobytes()
+        ids, xs, ys = cols.ids[pos], cols.xs[pos].astype(np.int64), cols.ys[pos].astype(np.int64)
+        if extra:
+            encoded = [name.encode("utf-8") for _, (name, _, _, _) in extra]
+            extra_offsets = offsets[-1] + np.cumsum([len(data) for data in encoded])
+            offsets = np.concatenate([offsets, extra_offsets])
+            names += b"".join(encoded)
+            ids = np.concatenate([ids, np.array([poi_id for poi_id, _ in extra], dtype=np.int64)])
+            xs = np.concatenate([xs, np.array([entry[1] for _, entry in extra], dtype=np.int64)])
+            ys = np.concatenate([ys, np.array([entry[2] for _, entry in extra], dtype=np.int64)])
+        return ids, xs, ys, offsets, names
+
+    def collect_boxes(self, boxes: Iterable[Tuple[int, int, int, int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Colunas (ids, x, y) dos POIs que caem em alguma das caixas (x0, y0, x1, y1)."""
+        cols, overlay, masked = self._state()
+        parts = [self._window(cols, masked, *box) for box in boxes]
+        pos = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+        ids = cols.ids[pos]
+        xs = cols.xs[pos].astype(np.int64)
+        ys = cols.ys[pos].astype(np.int64)
+        if overlay:
+            ids = np.concatenate([ids, np.array([k for k, _ in overlay], dtype=np.int64)])
+            xs = np.concatenate([xs, np.array([v[1] for _, v in overlay], dtype=np.int64)])
+            ys = np.concatenate([ys, np.array([v[2] for _, v in overlay], dtype=np.int64)])
+        return ids, xs, ys
+
+    def _nearest(self, x: int, y: int, k: int, max_distance: Optional[int]):
+        """
+        Os k mais próximos como (cols, [(distância², id, x, y, origem)]), em
+        que a origem é a posição no snapshot ou o nome vindo do overlay.
+        """
+        if k <= 0 or (max_distance is not None and max_distance < 0):
+            return None, []
+        cols, overlay, masked = self._state()
+        limit = 2 * _COORD_LIMIT + abs(x) + abs(y) if max_distance is None else max_distance
+        radius = min(16, limit)
+        while True:
+            max_sq = radius * radius
+            pos = self._window(cols, masked, x - radius, y - radius, x + radius, y + radius)
+            pos, d2 = self._within(cols, pos, x, y, max_sq)
+            extra = [
+                ((px - x) ** 2 + (py - y) ** 2, poi_id, px, py, name) for poi_id, (name, px, py, _) in overlay
+                if (px - x) ** 2 + (py - y) ** 2 <= max_sq
+            ]
+            if len(pos) + len(extra) >= k or radius >= limit:
+                break
+            radius = min(radius * 2, limit)
+
+        ids = cols.ids[pos]
+        if len(pos) > k and d2.dtype != object:
+            # Só os k melhores do snapshot (distância², id) viram objetos Python
+            top = np.lexsort((ids, d2))[:k]
+            pos, d2, ids = pos[top], d2[top], ids[top]
+        found = list(zip(d2.tolist(), ids.tolist(), cols.xs[pos].tolist(), cols.ys[pos].tolist(), pos.tolist()))
+        found.extend(extra)
+        found.sort(key=lambda item: (item[0], item[1]))
+        return cols, found[:k]
+
+    def nearest(self, x: int, y: int, k: int,
+                max_distance: Optional[int] = None) -> List[Tuple[int, int, int, float]]:
+        """
+        Retorna até k tuplas (id, x, y, distância) ordenadas pela distância a
+        (x, y) e, no empate, pelo id. A janela dobra de tamanho até o círculo
+        inscrito conter k POIs (ou atingir max_distance / todo o domínio).
+        """
+        _, found = self._nearest(x, y, k, max_distance)
+        return [(poi_id, px, py, math.sqrt(d)) for d, poi_id, px, py, _ in found]
+
+    def nearest_rows(self, x: int, y: int, k: int,
+                     max_distance: Optional[int] = None) -> List[Tuple[int, str, int, int, float]]:
+        """
+        Como nearest, mas já com os nomes: linhas (id, name, x, y, distância).
+        Os nomes vêm do mesmo estado da busca, então uma remoção concorrente
+        não deixa um id sem nome.
+        """
+        cols, found = self._nearest(x, y, k, max_distance)
+        return [
+            (poi_id, source if isinstance(source, str) else self._name_at(cols, source), px, py, math.sqrt(d))
+            for d, poi_id, px, py, source in found
+        ]
+
+
+# Snapshot global do processo; existe quando SPATIAL_INDEX=snapshot
+def snapshot_enabled() -> bool:
+    """Indica se o modo snapshot colunar (NumPy) foi habilitado no .env."""
+    return os.getenv("SPATIAL_INDEX", "").lower() == "snapshot"
+
+
+def snapshot_options() -> dict:
+    """Opções do snapshot lidas do .env."""
+    return {
+        "path": os.getenv("SNAPSHOT_PATH") or None,
+        "max_overlay": int(os.getenv("SNAPSHOT_MAX_OVERLAY", "10000")),
+        "refresh_interval": float(os.getenv("SNAPSHOT_REFRESH", "30")),
+        "max_age": float(os.getenv("SNAPSHOT_MAX_AGE", "60")),
+    }
@@ -0,0 +1,309 @@
+# app/services/spatial_index.py
+import heapq
+import math
+import os
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Tamanho padrão da célula da grade (mesma unidade das coordenadas x/y)
+DEFAULT_CELL_SIZE = int(os.getenv("SPATIAL_INDEX_CELL_SIZE", "64"))
+
+
+class _Cell:
+    """
+    Colunas compactas (ids, x, y) dos POIs que caem em uma célula da grade.
+    """
+    __slots__ = ("ids", "xs", "ys")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.xs = array("q")
+        self.ys = array("q")
+
+    def append(self, poi_id: int, x: int, y: int):
+        self.ids.append(poi_id)
+        self.xs.append(x)
+        self.ys.append(y)
+
+    def remove(self, poi_id: int):
+        """Remove o POI trocando-o pelo último elemento (O(1) após a busca)."""
+        i = self.ids.index(poi_id)
+        last = len(self.ids) - 1
+        if i != last:
+            self.ids[i] = self.ids[last]
+            self.xs[i] = self.xs[last]
+            self.ys[i] = self.ys[last]
+        self.ids.pop()
+        self.xs.pop()
+        self.ys.pop()
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class GridIndex:
+    """
+    Índice espacial em memória baseado em uma grade uniforme.
+
+    Cada célula guarda as colunas (ids, x, y) em arrays contíguos. Uma busca
+    por raio visita apenas as células que intersectam o quadrado envolvente
+    do círculo e compara a distância ao quadrado (sem raiz quadrada).
+    """
+
+    def __init__(self, cell_size: int = DEFAULT_CELL_SIZE):
+        if cell_size <= 0:
+            raise ValueError("cell_size deve ser positivo")
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], _Cell] = {}
+        self._coords: Dict[int, Tuple[int, int]] = {}
+        self._names: Dict[int, str] = {}
+        # Limites (min_cx, max_cx, min_cy, max_cy) das células já ocupadas.
+        # Só crescem; após remoções continuam sendo um envelope válido.
+        self._bounds: Optional[Tuple[int, int, int, int]] = None
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._coords)
+
+    def __contains__(self, poi_id: int):
+        return poi_id in self._coords
+
+    def _cell_key(self, x: int, y: int) -> Tuple[int, int]:
+        return (x // self.cell_size, y // self.cell_size)
+
+    def insert(self, poi_id: int, name: str, x: int, y: int):
+        """Insere (ou substitui) um POI no índice."""
+        with self._lock:
+            if poi_id in self._coords:
+                self._remove_unlocked(poi_id)
+            key = self._cell_key(x, y)
+            cell = self._cells.get(key)
+            if cell is None:
+                cell = self._cells[key] = _Cell()
+                self._grow_bounds(key)
+            cell.append(poi_id, x, y)
+            self._coords[poi_id] = (x, y)
+            self._names[poi_id] = name
+
+    def remove(self, poi_id: int) -> bool:
+        """Remove um POI do índice. Retorna False se ele não estava indexado."""
+        with self._lock:
+            if poi_id not in self._coords:
+                return False
+            self._remove_unlocked(poi_id)
+            return True
+
+    def _remove_unlocked(self, poi_id: int):
+        x, y = self._coords.pop(poi_id)
+        del self._names[poi_id]
+        key = self._cell_key(x, y)
+        cell = self._cells[key]
+        cell.remove(poi_id)
+        if not len(cell):
+            del self._cells[key]
+
+    def _grow_bounds(self, key: Tuple[int, int]):
+        cx, cy = key
+        if self._bounds is None:
+            self._bounds = (cx, cx, cy, cy)
+        else:
+            x0, x1, y0, y1 = self._bounds
+            self._bounds = (min(x0, cx), max(x1, cx), min(y0, cy), max(y1, cy))
+
+    def bulk_load(self, rows: Iterable[Tuple[int, str, int, int]]):
+        """Carrega vários POIs (id, name, x, y) de uma vez."""
+        with self._lock:
+            for poi_id, name, x, y in rows:
+                self.insert(poi_id, name, x, y)
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._coords.clear()
+            self._names.clear()
+            self._bounds = None
+
+    def name_of(self, poi_id: int) -> str:
+        return self._names[poi_id]
+
+    def query_radius(self, x: int, y: int, max_distance: int,
+                     stats: Optional[Dict[str, int]] = None) -> List[Tuple[int, int, int]]:
+        """
+        Retorna as tuplas (id, x, y) dos POIs a uma distância <= max_distance de (x, y).
+
+        Se `stats` for informado, recebe em "scanned" quantos candidatos das
+        células visitadas foram comparados.
+        """
+        if max_distance < 0:
+            return []
+
+        size = self.cell_size
+        max_sq = max_distance * max_distance
+        cx0, cy0 = (x - max_distance) // size, (y - max_distance) // size
+        cx1, cy1 = (x + max_distance) // size, (y + max_distance) // size
+
+        results = []
+        scanned = 0
+        with self._lock:
+            cells = self._cells
+            # Em raios muito grandes é mais barato percorrer só as células ocupadas
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+                keys = [k for k in cells if cx0 <= k[0] <= cx1 and cy0 <= k[1] <= cy1]
+            else:
+                keys = [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)]
+
+            for key in keys:
+                cell = cells.get(key)
+                if cell is None:
+                    continue
+                scanned += len(cell.ids)
+                for poi_id, px, py in zip(cell.ids, cell.xs, cell.ys):
+                    dx = px - x
+                    dy = py - y
+                    if dx * dx + dy * dy <= max_sq:
+                        results.append((poi_id, px, py))
+        if stats is not None:
+            stats["scanned"] = scanned
+        return results
+
+    def query_rows(self, x: int, y: int, max_distance: int,
+                   stats: Optional[Dict[str, int]] = None) -> List[Tuple[int, str, int, int]]:
+        """Como query_radius, mas já com os nomes: linhas (id, name, x, y)."""
+        with self._lock:
+            names = self._names
+            return [(poi_id, names[poi_id], px, py) for poi_id, px, py in self.query_radius(x, y, max_distance, stats)]
+
+    def collect_boxes(self, boxes: Iterable[Tuple[int, int, int, int]]) -> Tuple[array, array, array]:
+        """
+        Concatena as colunas (ids, x, y) de todas as células que intersectam
+        alguma das caixas (x0, y0, x1, y1). Cada célula entra uma única vez,
+        então o resultado serve de candidatos para várias buscas de uma vez.
+        """
+        size = self.cell_size
+        keys = set()
+        ids, xs, ys = array("q"), array("q"), array("q")
+        with self._lock:
+            cells = self._cells
+            for bx0, by0, bx1, by1 in boxes:
+                cx0, cy0 = bx0 // size, by0 // size
+                cx1, cy1 = bx1 // size, by1 // size
+                if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+                    keys.update(k for k in cells if cx0 <= k[0] <= cx1 and cy0 <= k[1] <= cy1)
+                else:
+                    keys.update(
+                        (cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)
+                        if (cx, cy) in cells
+                    )
+            for key in keys:
+                cell = cells[key]
+                ids.extend(cell.ids)
+                xs.extend(cell.xs)
+                ys.extend(cell.ys)
+        return ids, xs, ys
+
+    def _ring(self, qcx: int, qcy: int, r: int) -> Iterable[Tuple[int, int]]:
+        """Células a distância de Chebyshev r de (qcx, qcy), recortadas pelos limites."""
+        x0, x1, y0, y1 = self._bounds
+        if r == 0:
+            yield (qcx, qcy)
+            return
+        lo_x, hi_x = max(qcx - r, x0), min(qcx + r, x1)
+        for cy in (qcy - r, qcy + r):
+            if y0 <= cy <= y1:
+                for cx in range(lo_x, hi_x + 1):
+                    yield (cx, cy)
+        lo_y, hi_y = max(qcy - r + 1, y0), min(qcy + r - 1, y1)
+        for cx in (qcx - r, qcx + r):
+            if x0 <= cx <= x1:
+                for cy in range(lo_y, hi_y + 1):
+                    yield (cx, cy)
+
+    def nearest(self, x: int, y: int, k: int,
+                max_distance: Optional[int] = None) -> List[Tuple[int, int, int, float]]:
+        """
+        Retorna até k tuplas (id, x, y, distância) ordenadas pela distância a (x, y).
+
+        Busca best-first: visita anéis de células cada vez mais distantes e para
+        assim que a menor distância possível do próximo anel supera a k-ésima
+        melhor distância encontrada (ou max_distance, se informado).
+        """
+        if k <= 0 or (max_distance is not None and max_distance < 0):
+            return []
+
+        size = self.cell_size
+        max_sq = None if max_distance is None else max_distance * max_distance
+        qcx, qcy = self._cell_key(x, y)
+        # Distância mínima de (x, y) até a borda da própria célula
+        margin = min(x - qcx * size, (qcx + 1) * size - x,
+                     y - qcy * size, (qcy + 1) * size - y)
+
+        # Max-heap (via valores negados) com os k melhores (dist², id)
+        best: List[Tuple[int, int, int, int]] = []
+        with self._lock:
+            if self._bounds is None:
+                return []
+            x0, x1, y0, y1 = self._bounds
+            # Primeiro anel que pode conter células ocupadas e o último necessário
+            r = max(x0 - qcx, qcx - x1, y0 - qcy, qcy - y1, 0)
+            last = max(qcx - x0, x1 - qcx, qcy - y0, y1 - qcy)
+            cells = self._cells
+            while r <= last:
+                if r > 0:
+                    lower = (r - 1) * size + margin
+                    lower_sq = lower * lower
+                    if max_sq is not None and lower_sq > max_sq:
+                        break
+                    if len(best) == k and lower_sq > -best[0][0]:
+                        break
+                for key in self._ring(qcx, qcy, r):
+                    cell = cells.get(key)
+                    if cell is None:
+                        continue
+                    for poi_id, px, py in zip(cell.ids, cell.xs, cell.ys):
+                        dx = px - x
+                        dy = py - y
+                        d2 = dx * dx + dy * dy
+                        if max_sq is not None and d2 > max_sq:
+                            continue
+                        item = (-d2, -poi_id, px, py)
+                        if len(best) < k:
+                            heapq.heappush(best, item)
+                        elif item > best[0]:
+                            heapq.heapreplace(best, item)
+                r += 1
+
+        best.sort(reverse=True)
+        return [(-neg_id, px, py, math.sqrt(-neg_d2)) for neg_d2, neg_id, px, py in best]
+
+    def nearest_rows(self, x: int, y: int, k: int,
+                     max_distance: Optional[int] = None) -> List[Tuple[int, str, int, int, float]]:
+        """
+        Como nearest, mas já com os nomes: linhas (id, name, x, y, distância).
+        Os nomes são lidos sob a mesma trava da busca, então uma remoção
+        concorrente não deixa um id sem nome.
+        """
+        with self._lock:
+            names = self._names
+            return [(poi_id, names[poi_id], px, py, distance)
+                    for poi_id, px, py, distance in self.nearest(x, y, k, max_distance)]
+
+
+# Índice global do processo; só existe quando o modo em memória é habilitado
+_index: Optional[GridIndex] = None
+
+
+def spatial_index_enabled() -> bool:
+    """Indica se o modo de índice em memória foi habilitado no .env."""
+    return os.getenv("SPATIAL_INDEX", "").lower() in ("1", "true", "memory", "grid")
+
+
+def get_spatial_index() -> Optional[GridIndex]:
+    """Retorna o índice em memória, ou None se ele não foi construído."""
+    return _index
+
+
+def set_spatial_index(index: Optional[GridIndex]):
+    """Define (ou remove, com None) o índice em memória usado pelo finder."""
+    global _index
+    _index = index
@@ -0,0 +1,205 @@
+# app/services/upsert.py
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import inspect, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models.point import POI
+from app.services.cache import Row
+from app.services.finder import POI_COLUMNS, optional_columns, poi_values, publish_write
+from app.services.metrics import record_rows, stage
+from app.services.changes import INSERTED, UPDATED, Change, record_changes
+
+# Gravação idempotente (upsert) de POIs. A chave é o external_id, quando
+# informado, ou a chave natural (name, x, y). Cada lote passa por:
+#   1. dedup no lote: registros repetidos viram um só (o último prevalece);
+#   2. leitura das linhas existentes pelas chaves (índices únicos);
+#   3. INSERT ... ON CONFLICT só com os registros novos ou alterados.
+# Reimportar um feed sem mudanças não grava nada, então o custo acompanha
+# as linhas alteradas e não o tamanho do feed.
+
+# Modos de gravação da importação
+INSERT = "insert"
+UPSERT = "upsert"
+MODES = (INSERT, UPSERT)
+
+# Índice único da chave natural; criado por python -m app.database.migrar_upsert
+# --chave-natural (depois de remover as duplicatas que já existirem)
+NATURAL_KEY_INDEX = "ux_pois_natural_key"
+
+# Índice único de external_id (criado com a tabela); no layout em ladrilhos
+# (app/database/particionar_pois.py) ele não pode ser único e o upsert por
+# external_id fica indisponível
+EXTERNAL_KEY_INDEX = "ux_pois_external_id"
+
+# Registro a gravar: (name, x, y, external_id)
+Record = Tuple[str, int, int, Optional[str]]
+
+_TABLE = POI.__table__
+
+# (URL do banco, índice) dos índices únicos já encontrados
+_unique_ready: set = set()
+
+
+@dataclass
+class UpsertResult:
+    """Resultado do upsert de um lote."""
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    duplicates: int = 0
+    # Linha final (id, name, x, y) de cada registro, na ordem do lote deduplicado
+    rows: List[Optional[Row]] = field(default_factory=list)
+    # Linhas gravadas e as que elas substituíram (índices em memória e cache)
+    written: List[Row] = field(default_factory=list)
+    replaced: List[Row] = field(default_factory=list)
+    # Mudanças registradas no log (app/services/changes.py)
+    changes: List[Change] = field(default_factory=list)
+
+    def publish(self):
+        """Atualiza os índices em memória e o cache; chame depois do commit."""
+        if self.written:
+            publish_write(self.written, replaced=self.replaced)
+
+
+def dedupe(records: Sequence[Record]) -> Tuple[List[Record], int]:
+    """
+    Remove as repetições do lote pela chave (external_id ou name, x, y),
+    mantendo a posição da primeira ocorrência e os valores da última.
+    Retorna (registros únicos, quantidade descartada).
+    """
+    unique: Dict[tuple, Record] = {}
+    for record in records:
+        key = ("external_id", record[3]) if record[3] is not None else record[:3]
+        unique[key] = record
+    return list(unique.values()), len(records) - len(unique)
+
+
+def _unique_index_ready(session: Session, name: str) -> bool:
+    key = (str(session.get_bind().url), name)
+    if key not in _unique_ready:
+        indexes = inspect(session.connection()).get_indexes(POI.__tablename__)
+        if not any(index["name"] == name and index["unique"] for index in indexes):
+            return False
+        _unique_ready.add(key)
+    return True
+
+
+def natural_key_ready(session: Session) -> bool:
+    """Indica se o banco da sessão tem o índice único (name, x, y)."""
+    return _unique_index_ready(session, NATURAL_KEY_INDEX)
+
+
+def external_key_ready(session: Session) -> bool:
+    """Indica se o banco da sessão tem o índice único de external_id."""
+    return _unique_index_ready(session, EXTERNAL_KEY_INDEX)
+
+
+def _insert(session: Session):
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return pg_insert(_TABLE)
+    if dialect == "sqlite":
+        return sqlite_insert(_TABLE)
+    raise ValueError(f"Upsert não suportado no banco {dialect}")
+
+
+def _upsert_external(session: Session, records: List[Record], result: UpsertResult) -> Dict[str, Row]:
+    if not external_key_ready(session):
+        raise ValueError("Upsert por external_id requer o índice único de external_id, "
+                         "ausente no layout em ladrilhos: envie os registros sem external_id")
+    keys = [record[3] for record in records]
+    with stage("query"):
+        existing = {
+            row[0]: tuple(row[1:])
+            for row in session.execute(select(POI.external_id, *POI_COLUMNS).where(POI.external_id.in_(keys)))
+        }
+    final = dict(existing)
+    changed = [r for r in records if r[3] not in existing or existing[r[3]][1:] != r[:3]]
+    result.unchanged += len(records) - len(changed)
+    if not changed:
+        return final
+
+    columns = optional_columns(session)
+    statement = _insert(session)
+    excluded = statement.excluded
+    assigned = {"name": excluded.name, "x": excluded.x, "y": excluded.y}
+    if "zkey" in columns:
+        assigned["zkey"] = excluded.zkey
+    statement = statement.on_conflict_do_update(
+        index_elements=[_TABLE.c.external_id],
+        set_=assigned,
+        # Linhas iguais não são regravadas (nem geram versões novas no Postgres)
+        where=or_(_TABLE.c.name != excluded.name, _TABLE.c.x != excluded.x, _TABLE.c.y != excluded.y),
+    ).returning(_TABLE.c.external_id, _TABLE.c.id, _TABLE.c.name, _TABLE.c.x, _TABLE.c.y)
+    with stage("query"):
+        written = session.execute(
+            statement, [poi_values(columns, name, x, y, ext) for name, x, y, ext in changed]
+        ).all()
+    for ext, *row in written:
+        row = tuple(row)
+        if ext in existing:
+            result.updated += 1
+            result.replaced.append(existing[ext])
+            result.changes.append((UPDATED,) + row)
+        else:
+            result.inserted += 1
+            result.changes.append((INSERTED,) + row)
+        result.written.append(row)
+        final[ext] = row
+    return final
+
+
+def _upsert_natural(session: Session, records: List[Record], result: UpsertResult) -> Dict[tuple, Row]:
+    if not natural_key_ready(session):
+        raise ValueError("Upsert pela chave natural requer o índice único (name, x, y): "
+                         "execute python -m app.database.migrar_upsert --chave-natural")
+    keys = [record[:3] for record in records]
+    with stage("query"):
+        final = {
+            tuple(row[1:]): tuple(row)
+            for row in session.execute(select(*POI_COLUMNS).where(tuple_(POI.name, POI.x, POI.y).in_(keys)))
+        }
+    new = [record for record in records if record[:3] not in final]
+    result.unchanged += len(records) - len(new)
+    if not new:
+        return final
+
+    columns = optional_columns(session)
+    statement = _insert(session).on_conflict_do_nothing(
+        index_elements=[_TABLE.c.name, _TABLE.c.x, _TABLE.c.y]
+    ).returning(_TABLE.c.id, _TABLE.c.name, _TABLE.c.x, _TABLE.c.y)
+    with stage("query"):
+        written = session.execute(statement, [poi_values(columns, name, x, y) for name, x, y, _ in new]).all()
+    for row in written:
+        row = tuple(row)
+        result.inserted += 1
+        result.written.append(row)
+        result.changes.append((INSERTED,) + row)
+        final[row[1:]] = row
+    # Registros gravados por outra transação entre a leitura e o INSERT
+    result.unchanged += len(new) - len(written)
+    return final
+
+
+def upsert_records(session: Session, records: Sequence[Record]) -> UpsertResult:
+    """
+    Grava os registros (name, x, y, external_id) na sessão sem duplicar POIs:
+    com external_id, insere ou atualiza o POI daquele id externo; sem ele,
+    insere apenas se não houver POI com o mesmo (name, x, y). Não faz commit;
+    depois dele, chame result.publish().
+    """
+    unique, duplicates = dedupe(records)
+    result = UpsertResult(duplicates=duplicates)
+    external = [record for record in unique if record[3] is not None]
+    natural = [record for record in unique if record[3] is None]
+    by_external = _upsert_external(session, external, result) if external else {}
+    by_natural = _upsert_natural(session, natural, result) if natural else {}
+    result.rows = [
+        by_external.get(record[3]) if record[3] is not None else by_natural.get(record[:3])
+        for record in unique
+    ]
+    record_rows(len(unique), len(result.written))
+    record_changes(session, result.changes)
+    return result
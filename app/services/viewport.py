@@ -0,0 +1,153 @@
+# app/services/viewport.py
+import math
+from typing import List, Optional
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.point import POI
+from app.services.async_finder import INDEX_INLINE_AREA, run_index
+from app.services.cache import get_query_cache
+from app.services.finder import POI_COLUMNS, boxes_filter
+from app.services.metrics import record_rows, stage
+from app.services.spatial_index import get_spatial_index
+
+# Consulta por retângulo (viewport do mapa) com agrupamento no servidor.
+# Se a caixa tem até `max_points` POIs, eles voltam individualmente; acima
+# disso, a caixa é dividida em células de `cell_size` e cada célula vira um
+# grupo (quantidade e centróide). A agregação é feita no banco (GROUP BY
+# na célula) ou, com o índice em memória, sobre as colunas NumPy; os pontos
+# nunca são trazidos um a um para o Python.
+#
+# Linha do resultado: (count, x, y, id, name). Com count == 1 é um POI (x, y
+# inteiros, id e name preenchidos); acima disso é um grupo, com o centróide
+# em x, y e id/name None.
+
+DEFAULT_MAX_POINTS = 500
+
+# Máximo de células em uma consulta: células menores que isso são ampliadas
+MAX_CELLS = 4096
+
+# Células por lado quando cell_size não é informado
+DEFAULT_CELLS_PER_SIDE = 32
+
+
+def viewport_cell_size(x0: int, y0: int, x1: int, y1: int, cell_size: Optional[int] = None) -> int:
+    """
+    Tamanho de célula efetivo: o informado (ou o que divide o lado maior em
+    DEFAULT_CELLS_PER_SIDE), ampliado até a caixa caber em MAX_CELLS células.
+    """
+    width, height = x1 - x0 + 1, y1 - y0 + 1
+    if cell_size is None:
+        cell_size = math.ceil(max(width, height) / DEFAULT_CELLS_PER_SIDE)
+    cell_size = max(cell_size, 1)
+    while math.ceil(width / cell_size) * math.ceil(height / cell_size) > MAX_CELLS:
+        cell_size *= 2
+    return cell_size
+
+
+def points_statement(x0: int, y0: int, x1: int, y1: int, limit: int):
+    # Sem ORDER BY: o banco para no limite usando o índice (x, y); a ordem vem depois
+    return select(*POI_COLUMNS).where(boxes_filter([(x0, y0, x1, y1)])).limit(limit)
+
+
+def clusters_statement(x0: int, y0: int, x1: int, y1: int, cell_size: int):
+    """
+    Um grupo por célula ocupada: COUNT, centróide (AVG) e, para as células
+    com um único POI, o próprio id e nome (MIN de um só valor).
+    """
+    return (
+        select(func.count(), func.avg(POI.x), func.avg(POI.y), func.min(POI.id), func.min(POI.name))
+        .where(boxes_filter([(x0, y0, x1, y1)]))
+        .group_by(POI.x // cell_size, POI.y // cell_size)
+    )
+
+
+def cluster_rows(rows) -> List[tuple]:
+    """Converte as linhas de clusters_statement em (count, x, y, id, name)."""
+    result = []
+    for count, cx, cy, poi_id, name in rows:
+        if count == 1:
+            result.append((1, int(cx), int(cy), poi_id, name))
+        else:
+            result.append((count, float(cx), float(cy), None, None))
+    return result
+
+
+def aggregate_columns(ids: np.ndarray, xs: np.ndarray, ys: np.ndarray,
+                      cell_size: int, name_of) -> List[tuple]:
+    """Agrupa as colunas (ids, x, y) por célula com NumPy; mesmo formato de cluster_rows."""
+    cx, cy = xs // cell_size, ys // cell_size
+    keys = (cx - cx.min()) * (int(cy.max() - cy.min()) + 1) + (cy - cy.min())
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    sum_x = np.bincount(inverse, weights=xs)
+    sum_y = np.bincount(inverse, weights=ys)
+    # Em células de um único POI, a soma dos ids é o próprio id
+    sum_id = np.bincount(inverse, weights=ids)
+    result = []
+    for count, sx, sy, si in zip(counts.tolist(), sum_x.tolist(), sum_y.tolist(), sum_id.tolist()):
+        if count == 1:
+            result.append((1, int(sx), int(sy), int(si), name_of(int(si))))
+        else:
+            result.append((count, sx / count, sy / count, None, None))
+    return result
+
+
+def _from_index(index, x0: int, y0: int, x1: int, y1: int,
+                cell_size: int, max_points: int) -> List[tuple]:
+    with stage("query"):
+        ids, xs, ys = index.collect_boxes([(x0, y0, x1, y1)])
+    with stage("filter"):
+        ids = np.asarray(ids, dtype=np.int64)
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        # Os candidatos cobrem células (ou o overlay) inteiras: recorta à caixa
+        inside = (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+        ids, xs, ys = ids[inside], xs[inside], ys[inside]
+        record_rows(len(inside), len(ids))
+        if len(ids) == 0:
+            return []
+        if len(ids) <= max_points:
+            order = np.argsort(ids)
+            return [(1, int(xs[i]), int(ys[i]), int(ids[i]), index.name_of(int(ids[i]))) for i in order]
+        return aggregate_columns(ids, xs, ys, cell_size, index.name_of)
+
+
+async def find_viewport_rows(session: AsyncSession, x0: int, y0: int, x1: int, y1: int,
+                             cell_size: int, max_points: int = DEFAULT_MAX_POINTS) -> List[tuple]:
+    """
+    Retorna as linhas (count, x, y, id, name) da caixa [x0, x1] x [y0, y1]:
+    os POIs, se forem até `max_points`, ou um grupo por célula ocupada.
+    Use viewport_cell_size para obter `cell_size`.
+    """
+    if x0 > x1 or y0 > y1:
+        return []
+
+    cache = get_query_cache()
+    key = ("viewport", x0, y0, x1, y1, cell_size, max_points)
+    generation = cache.generation()
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+
+    index = get_spatial_index()
+    if index is not None:
+        large = (x1 - x0) * (y1 - y0) > INDEX_INLINE_AREA
+        rows = await run_index(large, _from_index, index, x0, y0, x1, y1, cell_size, max_points)
+    else:
+        # Um POI a mais que o limite basta para saber se a caixa é densa
+        with stage("query"):
+            points = (await session.execute(points_statement(x0, y0, x1, y1, max_points + 1))).all()
+        if len(points) <= max_points:
+            with stage("hydrate"):
+                rows = [(1, x, y, poi_id, name) for poi_id, name, x, y in sorted(points)]
+            record_rows(len(points), len(rows))
+        else:
+            with stage("query"):
+                result = (await session.execute(clusters_statement(x0, y0, x1, y1, cell_size))).all()
+            with stage("hydrate"):
+                rows = cluster_rows(result)
+            record_rows(sum(row[0] for row in rows), len(rows))
+
+    cache.put(key, rows, generation)
+    return rows
+
@@ -0,0 +1,108 @@
+# app/services/zorder.py
+from typing import List, Tuple
+import numpy as np
+
+# Chave de Morton (curva Z) das coordenadas: os bits de x e y intercalados
+# (x nos bits pares, y nos ímpares). POIs próximos tendem a ter chaves
+# próximas, então um índice B-tree na chave (coluna pois.zkey) agrupa os
+# pontos por região: com CLUSTER pois USING ix_pois_zkey as linhas de uma
+# região ficam nas mesmas páginas. Cada quadrante alinhado de lado 2^k é um
+# intervalo contíguo de chaves, e é assim que uma caixa de busca vira uma
+# lista curta de faixas de chave (key_ranges).
+#
+# Coordenadas são int4 não negativas (31 bits), então a chave tem até 62
+# bits e cabe em BIGINT.
+
+BITS = 31
+MAX_COORD = (1 << BITS) - 1
+
+# Faixas de chave por caixa: mais faixas leem menos linhas fora da caixa, mas
+# cada uma é uma varredura de índice a mais
+DEFAULT_MAX_RANGES = 16
+
+_MASKS = (
+    (16, 0x0000FFFF0000FFFF),
+    (8, 0x00FF00FF00FF00FF),
+    (4, 0x0F0F0F0F0F0F0F0F),
+    (2, 0x3333333333333333),
+    (1, 0x5555555555555555),
+)
+
+
+def _spread(v: int) -> int:
+    """Espalha os bits de v nas posições pares (b0 -> 0, b1 -> 2, ...)."""
+    for shift, mask in _MASKS:
+        v = (v | (v << shift)) & mask
+    return v
+
+
+def morton_key(x: int, y: int) -> int:
+    """Chave de Morton de (x, y)."""
+    return _spread(x) | (_spread(y) << 1)
+
+
+def morton_keys(xs, ys) -> np.ndarray:
+    """Chaves de Morton de colunas de coordenadas (vetorizado, int64)."""
+    xs = np.asarray(xs, dtype=np.uint64)
+    ys = np.asarray(ys, dtype=np.uint64)
+    for shift, mask in _MASKS:
+        xs = (xs | (xs << np.uint64(shift))) & np.uint64(mask)
+        ys = (ys | (ys << np.uint64(shift))) & np.uint64(mask)
+    return (xs | (ys << np.uint64(1))).astype(np.int64)
+
+
+def key_ranges(x0: int, y0: int, x1: int, y1: int,
+               max_ranges: int = DEFAULT_MAX_RANGES) -> List[Tuple[int, int]]:
+    """
+    Decompõe a caixa [x0, x1] x [y0, y1] em até `max_ranges` faixas
+    (lo, hi) de chaves, ordenadas e disjuntas, que cobrem todos os pontos da
+    caixa. A cobertura pode incluir pontos de fora (quadrantes parciais e
+    faixas unidas), então a consulta ainda precisa filtrar x e y.
+
+    Desce a quadtree a partir do menor quadrante que contém a caixa:
+    quadrantes dentro da caixa viram faixas; os parciais são divididos
+    enquanto couberem no orçamento de 4 * max_ranges nós, e no fim entram
+    inteiros. As faixas vizinhas são unidas e, acima de `max_ranges`, as de
+    menor intervalo entre si também.
+    """
+    x0, y0 = max(x0, 0), max(y0, 0)
+    x1, y1 = min(x1, MAX_COORD), min(y1, MAX_COORD)
+    if x0 > x1 or y0 > y1:
+        return []
+
+    level = max((x0 ^ x1).bit_length(), (y0 ^ y1).bit_length())
+    nodes = [(x0 >> level, y0 >> level)]
+    ranges = []
+    while nodes:
+        size = 1 << level
+        partial = []
+        for cx, cy in nodes:
+            nx0, ny0 = cx * size, cy * size
+            nx1, ny1 = nx0 + size - 1, ny0 + size - 1
+            if nx0 > x1 or nx1 < x0 or ny0 > y1 or ny1 < y0:
+                continue
+            if x0 <= nx0 and nx1 <= x1 and y0 <= ny0 and ny1 <= y1:
+                lo = morton_key(cx, cy) << (2 * level)
+                ranges.append((lo, lo + size * size - 1))
+            else:
+                partial.append((cx, cy))
+        if len(ranges) + 4 * len(partial) > 4 * max_ranges:
+            for cx, cy in partial:
+                lo = morton_key(cx, cy) << (2 * level)
+                ranges.append((lo, lo + size * size - 1))
+            break
+        level -= 1
+        nodes = [(2 * cx + dx, 2 * cy + dy) for cx, cy in partial for dy in (0, 1) for dx in (0, 1)]
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for lo, hi in ranges[1:]:
+        if lo == merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    while len(merged) > max_ranges:
+        # Une o par de faixas com o menor intervalo de chaves entre elas
+        i = min(range(len(merged) - 1), key=lambda k: merged[k + 1][0] - merged[k][1])
+        merged[i:i + 2] = [(merged[i][0], merged[i + 1][1])]
+    return merged
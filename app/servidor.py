@@ -0,0 +1,289 @@
+# servidor.py
+import argparse
+import gc
+import json
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger("app.servidor")
+
+# Com fork, o pai faz o trabalho caro (imports, índices, cache) uma única vez e
+# os workers herdam a memória por cópia na escrita (copy-on-write).
+
+
+def warm_cache(path: str) -> int:
+    """
+    Executa as consultas de um arquivo NDJSON para preencher o cache de
+    consultas antes do fork. Cada linha é {"x", "y", "max_distance"} (busca
+    por proximidade) ou {"x", "y", "k"[, "max_distance"]} (k mais próximos).
+    Retorna a quantidade de consultas executadas.
+    """
+    from app.services.finder import find_nearby_pois, find_nearest_pois
+
+    count = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            query = json.loads(line)
+            if "k" in query:
+                find_nearest_pois(query["x"], query["y"], query["k"], query.get("max_distance"))
+            else:
+                find_nearby_pois(query["x"], query["y"], query["max_distance"])
+            count += 1
+    return count
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    """Socket de escuta criado no pai e compartilhado por todos os workers."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _format_memory(memory: Dict[str, int]) -> str:
+    if not memory:
+        return "indisponível"
+    return " ".join(f"{name}={value / 2**20:.1f}MB" for name, value in memory.items())
+
+
+class Supervisor:
+    """
+    Mantém N workers uvicorn criados por fork a partir do processo pai
+    aquecido: avisa quando todos ficam prontos, recria os que morrem e
+    reinicia (com SIGTERM) os que passam do limite de memória privada.
+    """
+
+    def __init__(self, app, sock: socket.socket, workers: int, log_level: str = "info",
+                 max_worker_memory: Optional[int] = None, memory_check_interval: float = 10.0,
+                 ready_file: Optional[str] = None):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.max_worker_memory = max_worker_memory
+        self.memory_check_interval = memory_check_interval
+        self.ready_file = ready_file
+        self.children: Dict[int, float] = {}  # pid -> instante do fork
+        self.ready: Dict[int, float] = {}     # pid -> segundos do fork até ficar pronto
+        self.stopping = False
+        self._ready_r, self._ready_w = os.pipe()
+
+    def spawn(self) -> int:
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(self._ready_r)
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException:
+                logger.exception("Falha no worker %d", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = started
+        return pid
+
+    def _run_worker(self):
+        import uvicorn
+        from app.database import pgsql
+
+        # O uvicorn instala seus próprios tratadores; o pai trata os sinais dele
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        # Conexões abertas pelo pai durante o warmup não podem ser compartilhadas
+        pgsql.engine.dispose(close=False)
+        pgsql.async_engine.sync_engine.dispose(close=False)
+
+        ready_w = self._ready_w
+
+        class WorkerServer(uvicorn.Server):
+            async def startup(self, sockets=None):
+                await super().startup(sockets=sockets)
+                if not self.should_exit:
+                    os.write(ready_w, f"{os.getpid()}\n".encode())
+
+        config = uvicorn.Config(self.app, log_level=self.log_level, lifespan="on")
+        WorkerServer(config).run(sockets=[self.sock])
+
+    def _read_ready(self, timeout: float):
+        readable, _, _ = select.select([self._ready_r], [], [], timeout)
+        if not readable:
+            return
+        for line in os.read(self._ready_r, 4096).decode().split():
+            pid = int(line)
+            if pid in self.children and pid not in self.ready:
+                self.ready[pid] = time.perf_counter() - self.children[pid]
+
+    def _reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.children.pop(pid, None)
+            self.ready.pop(pid, None)
+            if not self.stopping:
+                logger.warning("Worker %d terminou (status %d); criando outro", pid, status)
+                self.spawn()
+
+    def _check_memory(self):
+        from app.services.metrics import process_memory
+
+        for pid in list(self.ready):
+            uss = process_memory(str(pid)).get("uss", 0)
+            if uss > self.max_worker_memory:
+                logger.warning("Worker %d passou do limite de memória (%.1f MB); reiniciando",
+                               pid, uss / 2**20)
+                os.kill(pid, signal.SIGTERM)
+                self.ready.pop(pid, None)
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Espera todos os workers sinalizarem que terminaram o startup."""
+        deadline = time.monotonic() + timeout
+        while len(self.ready) < self.workers and not self.stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._read_ready(min(remaining, 0.5))
+            self._reap()
+        return not self.stopping
+
+    def report(self, started: float, timings: Dict[str, float]):
+        from app.services.metrics import process_memory
+
+        total = time.perf_counter() - started
+        steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+        logger.info("%d workers prontos em %.2fs (%s)", len(self.ready), total, steps)
+        logger.info("Processo pai %d: %s", os.getpid(), _format_memory(process_memory()))
+        for pid, seconds in sorted(self.ready.items()):
+            logger.info("Worker %d: pronto em %.3fs, %s", pid, seconds, _format_memory(process_memory(str(pid))))
+        if self.ready_file:
+            with open(self.ready_file, "w") as f:
+                json.dump({"pid": os.getpid(), "workers": sorted(self.ready), "startup_seconds": total}, f)
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def run(self, started: float, timings: Dict[str, float], ready_timeout: float = 60.0) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        ok = self.wait_ready(ready_timeout)
+        if ok:
+            self.report(started, timings)
+        elif not self.stopping:
+            logger.error("Os workers não ficaram prontos em %.0fs", ready_timeout)
+            self.stopping = True
+
+        last_check = time.monotonic()
+        while not self.stopping:
+            self._read_ready(1.0)
+            self._reap()
+            if self.max_worker_memory and time.monotonic() - last_check >= self.memory_check_interval:
+                self._check_memory()
+                last_check = time.monotonic()
+        self.shutdown()
+        return 0 if ok else 1
+
+    def shutdown(self, timeout: float = 30.0):
+        if self.ready_file and os.path.exists(self.ready_file):
+            os.remove(self.ready_file)
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sobe a API com vários workers que compartilham o warmup do processo pai.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--aquecer-cache", metavar="ARQUIVO",
+                        help="NDJSON com consultas executadas antes do fork para preencher o cache")
+    parser.add_argument("--max-worker-memory", type=int, metavar="MB",
+                        help="reinicia o worker cuja memória privada (USS) passar deste limite")
+    parser.add_argument("--ready-file", help="arquivo criado quando todos os workers estiverem prontos")
+    parser.add_argument("--ready-timeout", type=float, default=60.0)
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers deve ser pelo menos 1")
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    # Importa tudo no pai: os workers já nascem com os módulos carregados
+    import app.main
+    from app.services.cache import QueryCache, get_query_cache
+    from app.services.name_index import name_index_enabled
+    from app.services.snapshot import snapshot_enabled, snapshot_options
+    from app.services.spatial_index import spatial_index_enabled
+    timings["import"] = time.perf_counter() - started
+
+    if args.workers > 1 and (spatial_index_enabled() or name_index_enabled()):
+        # A grade e o índice de nomes só veem as gravações do próprio processo
+        parser.error("SPATIAL_INDEX=memory e NAME_INDEX não acompanham gravações de outros workers; "
+                     "use SPATIAL_INDEX=snapshot com SNAPSHOT_PATH ou --workers 1")
+    if args.workers > 1 and snapshot_enabled() and not snapshot_options()["path"]:
+        # Sem arquivo, o snapshot é privado: o worker que não recebe gravações nunca relê o banco
+        parser.error("SPATIAL_INDEX=snapshot sem SNAPSHOT_PATH não acompanha gravações de outros workers; "
+                     "defina SNAPSHOT_PATH ou use --workers 1")
+    if args.workers > 1 and type(get_query_cache()) is QueryCache:
+        logger.warning("QUERY_CACHE=memory: gravações invalidam só o cache do próprio worker "
+                       "(os demais expiram em QUERY_CACHE_TTL); considere QUERY_CACHE=redis")
+
+    step = time.perf_counter()
+    app.main.warmup()
+    timings["warmup"] = time.perf_counter() - step
+    if args.aquecer_cache:
+        step = time.perf_counter()
+        queries = warm_cache(args.aquecer_cache)
+        timings[f"cache ({queries} consultas)"] = time.perf_counter() - step
+
+    # Objetos criados até aqui viram permanentes para o coletor de lixo, que
+    # assim não toca (nem copia) as páginas herdadas pelos workers
+    gc.collect()
+    gc.freeze()
+
+    # O socket só é aberto depois do warmup: até lá, a porta recusa conexões
+    sock = bind_socket(args.host, args.port, args.backlog)
+    max_memory = args.max_worker_memory * 2**20 if args.max_worker_memory else None
+    supervisor = Supervisor(app.main.app, sock, args.workers, log_level=args.log_level,
+                            max_worker_memory=max_memory, ready_file=args.ready_file)
+    return supervisor.run(started, timings, ready_timeout=args.ready_timeout)
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# Execute no terminal:
+# python -m app.servidor --workers 4 --port 8000
+# SPATIAL_INDEX=snapshot SNAPSHOT_PATH=/tmp/pois.snapshot python -m app.servidor --workers 4 --max-worker-memory 300
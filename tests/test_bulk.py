@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.models.point import Base
+from app.services import bulk, finder
+from app.services.bulk import bulk_delete_pois, bulk_update_pois, merge_patches
+from app.services.zorder import morton_key
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """Banco SQLite temporário com os POIs 1, 2 e 3, usado pelas funções em massa."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'bulk.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO pois (id, name, x, y) VALUES (1, 'A', 1, 1), (2, 'B', 2, 2), (3, 'C', 3, 3)"))
+    monkeypatch.setattr(bulk, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(finder, "_optional_columns", {})
+    return engine
+
+def _rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT id, name, x, y, zkey FROM pois ORDER BY id")).all()
+
+def test_merge_patches():
+    """Testa se patches do mesmo id são unidos (o último prevalece) e campos None são ignorados."""
+    merged = merge_patches([{"id": 2, "x": 1}, {"id": 1, "name": "a"}, {"id": 2, "x": 5, "y": 3, "name": None}])
+    assert list(merged) == [2, 1]
+    assert merged[2] == {"x": 5, "y": 3}
+    assert merged[1] == {"name": "a"}
+
+def test_bulk_update_statuses(engine):
+    """Testa o status de cada id (id repetido, inexistente e patch inválido) com lotes menores que a requisição."""
+    patches = [
+        {"id": 1, "name": "A2"},
+        {"id": 99, "x": 5},
+        {"id": 2, "x": -1},
+        {"id": 3, "y": 30},
+        {"id": 1, "x": 10},
+    ]
+    outcomes = bulk_update_pois(patches, chunk_size=1)
+    assert [(o.id, o.status) for o in outcomes] == [(1, "updated"), (99, "not_found"), (2, "invalid"), (3, "updated")]
+    assert outcomes[2].error
+    # O id repetido recebe os campos dos dois patches; a zkey segue a posição final
+    assert _rows(engine) == [
+        (1, "A2", 10, 1, morton_key(10, 1)),
+        (2, "B", 2, 2, None),
+        (3, "C", 3, 30, morton_key(3, 30)),
+    ]
+
+def test_bulk_delete_statuses(engine):
+    """Testa o status de cada id na remoção em massa, com id repetido, inexistente e vários lotes."""
+    outcomes = bulk_delete_pois([3, 99, 1, 3], chunk_size=2)
+    assert [(o.id, o.status) for o in outcomes] == [(3, "deleted"), (99, "not_found"), (1, "deleted")]
+    assert [row[0] for row in _rows(engine)] == [2]
+    assert [o.status for o in bulk_delete_pois([1, 2])] == ["not_found", "deleted"]
@@ -0,0 +1,47 @@
+import time
+from app.services.cache import QueryCache
+
+def test_cache_hit_miss_and_lru_eviction():
+    """Testa acertos, faltas e remoção do item menos usado quando o cache enche."""
+    cache = QueryCache(max_entries=2, ttl=60)
+    gen = cache.generation()
+    assert cache.get(("nearby", 0, 0, 10)) is None
+    cache.put(("nearby", 0, 0, 10), [(1, "A", 1, 1)], gen)
+    cache.put(("nearby", 50, 50, 10), [], gen)
+    assert cache.get(("nearby", 0, 0, 10)) == [(1, "A", 1, 1)]
+    cache.put(("name", "pad", None), [], gen)
+    assert cache.get(("nearby", 50, 50, 10)) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 2, 1)
+
+def test_cache_ttl():
+    """Testa expiração das entradas pela TTL."""
+    cache = QueryCache(ttl=0.01)
+    cache.put(("nearby", 0, 0, 1), [], cache.generation())
+    time.sleep(0.02)
+    assert cache.get(("nearby", 0, 0, 1)) is None
+
+def test_cache_invalidates_only_affected_regions():
+    """Testa se uma gravação invalida só as consultas cuja região contém o ponto."""
+    cache = QueryCache()
+    gen = cache.generation()
+    cache.put(("nearby", 0, 0, 10), [], gen)
+    cache.put(("nearby", 100, 100, 10), [], gen)
+    cache.put(("nearest", 0, 0, 1, None), [(1, "A", 3, 4, 5.0)], gen, radius=5.0)
+    cache.put(("name", "pad", None), [], gen)
+    cache.put(("autocomplete", "pub", 10), [], gen)
+
+    cache.invalidate_points([("Padaria", 6, 8)])
+    assert cache.get(("nearby", 0, 0, 10)) is None
+    assert cache.get(("nearby", 100, 100, 10)) == []
+    assert cache.get(("nearest", 0, 0, 1, None)) is not None  # 10 > k-ésima distância
+    assert cache.get(("name", "pad", None)) is None
+    assert cache.get(("autocomplete", "pub", 10)) == []
+
+def test_cache_skips_stale_put():
+    """Testa se um resultado calculado antes de uma gravação não é guardado."""
+    cache = QueryCache()
+    gen = cache.generation()
+    cache.invalidate_points([("A", 1, 1)])
+    cache.put(("nearby", 0, 0, 10), [], gen)
+    assert cache.get(("nearby", 0, 0, 10)) is None
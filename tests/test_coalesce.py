@@ -0,0 +1,50 @@
+import asyncio
+from app.services.coalesce import SearchCoalescer
+
+class FakeRunner:
+    """Executor de buscas em memória: registra cada chamada e devolve um POI por busca."""
+
+    def __init__(self, delay: float = 0.01):
+        self.calls = []
+        self.delay = delay
+
+    async def __call__(self, queries):
+        self.calls.append(list(queries))
+        await asyncio.sleep(self.delay)
+        return [[(x * 1000 + y, "POI", x, y)] for x, y, _ in queries]
+
+def test_single_flight_coalesces_identical_searches():
+    """Testa se buscas idênticas simultâneas viram uma execução e se uma nova geração do cache não reaproveita a anterior."""
+    runner = FakeRunner()
+    coalescer = SearchCoalescer(runner=runner)
+
+    async def burst():
+        same = [coalescer.nearby(1, 2, 10, generation=0) for _ in range(20)]
+        other = [coalescer.nearby(3, 4, 10, generation=0), coalescer.nearby(1, 2, 10, generation=1)]
+        return await asyncio.gather(*same, *other)
+
+    results = asyncio.run(burst())
+    assert len(runner.calls) == 3
+    assert all(rows == [(1002, "POI", 1, 2)] for rows in results[:20])
+    assert results[20] == [(3004, "POI", 3, 4)]
+
+def test_micro_batcher_groups_concurrent_searches():
+    """Testa se buscas concorrentes vão juntas em uma execução, cada uma com o próprio resultado, e se buscas isoladas não esperam."""
+    runner = FakeRunner()
+    coalescer = SearchCoalescer(batch=True, concurrency=1, max_batch=8, runner=runner)
+
+    async def burst():
+        return await asyncio.gather(*(coalescer.nearby(i, i, 5) for i in range(17)))
+
+    results = asyncio.run(burst())
+    assert [rows[0][0] for rows in results] == [i * 1000 + i for i in range(17)]
+    # As 17 chegam juntas e, com um lote por vez, seguem em lotes de até 8
+    assert [len(call) for call in runner.calls] == [8, 8, 1]
+
+    # Sem concorrência, cada busca é executada assim que chega
+    runner.calls.clear()
+    async def sequential():
+        for i in range(3):
+            await coalescer.nearby(i, 0, 5)
+    asyncio.run(sequential())
+    assert [len(call) for call in runner.calls] == [1, 1, 1]
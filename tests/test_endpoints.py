@@ -1,6 +1,12 @@
+import uuid
+import orjson
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app # importa minha aplicação
+from app.services.cache import NullQueryCache, get_query_cache, set_query_cache
+from app.services.finder import build_spatial_index, find_nearby_pois_batch
+from app.services.spatial_index import set_spatial_index
+from app.services.serializers import COLUMNS_MEDIA_TYPE, read_columns
 
 ## validar a ideia de módulo e pacote
 ## import app.main
@@ -68,6 +74,110 @@ def test_delete_poi():
     data = response.json()
     assert data["success"] is True
 
+def test_create_poi_upsert():
+    """Testa o cadastro idempotente: o mesmo external_id atualiza o POI em vez de duplicá-lo."""
+    external_id = f"feed-{uuid.uuid4()}"
+    first = client.post("/api/pois/?upsert=true", json={"name": "Upsert", "x": 1, "y": 1, "external_id": external_id}).json()
+    again = client.post("/api/pois/?upsert=true", json={"name": "Upsert", "x": 1, "y": 1, "external_id": external_id}).json()
+    moved = client.post("/api/pois/?upsert=true", json={"name": "Upsert", "x": 2, "y": 3, "external_id": external_id}).json()
+    assert first["poi"]["id"] == again["poi"]["id"] == moved["poi"]["id"]
+    assert "sem alterações" in again["message"]
+    assert (moved["poi"]["x"], moved["poi"]["y"]) == (2, 3)
+
+def test_bulk_update_pois():
+    """Testa atualização em massa via endpoint PUT, com status por id."""
+    ids = [client.post("/api/pois/", json={"name": f"Massa{i}", "x": i, "y": i}).json()["poi"]["id"] for i in range(3)]
+    payload = {"items": [{"id": ids[0], "name": "Massa Atualizado"}, {"id": ids[1], "x": 50}, {"id": ids[2], "y": -1}, {"id": 999999999, "x": 1}]}
+    response = client.put("/api/pois/bulk", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["status"] for r in data["results"]] == ["updated", "updated", "invalid", "not_found"]
+    assert data["succeeded"] == 2 and data["failed"] == 2
+
+def test_bulk_delete_pois():
+    """Testa remoção em massa via endpoint DELETE, com status por id."""
+    ids = [client.post("/api/pois/", json={"name": f"Remover{i}", "x": i, "y": i}).json()["poi"]["id"] for i in range(2)]
+    response = client.request("DELETE", "/api/pois/bulk", json={"ids": ids + [999999999]})
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json()["results"]] == ["deleted", "deleted", "not_found"]
+
+def test_bulk_chunk_size_is_bounded():
+    """Testa se chunk_size fora de 1..5000 é rejeitado antes de montar o comando."""
+    for chunk_size in (0, 5001, 20000):
+        assert client.put(f"/api/pois/bulk?chunk_size={chunk_size}", json={"items": [{"id": 1, "x": 1}]}).status_code == 422
+        assert client.request("DELETE", f"/api/pois/bulk?chunk_size={chunk_size}", json={"ids": [999999999]}).status_code == 422
+    assert client.request("DELETE", "/api/pois/bulk?chunk_size=5000", json={"ids": [999999999]}).status_code == 200
+
+def test_import_chunk_size_is_bounded():
+    """Testa se chunk_size fora de 1..50000 é rejeitado antes de ler o corpo."""
+    body = b'{"name": "Limite", "x": 1, "y": 1}\n'
+    for chunk_size in (0, 50001, 10_000_000):
+        assert client.post(f"/api/pois/bulk?chunk_size={chunk_size}", content=body).status_code == 422
+
+def test_import_csv_with_multiline_field():
+    """Testa a importação CSV em streaming com um nome entre aspas que tem quebra de linha."""
+    name = f"Linha {uuid.uuid4().hex[:8]}"
+    body = f'name,x,y\r\n"{name}\r\ncontinua",7,8\r\n'.encode()
+    response = client.post("/api/pois/bulk", content=body, headers={"Content-Type": "text/csv"})
+    assert response.json()["accepted"] == 1
+    results = client.get(f"/api/pois/by-name?name={name}").json()["results"]
+    assert [poi["name"] for poi in results] == [f"{name}\ncontinua"]
+
+def test_writes_survive_cache_failures():
+    """Testa que uma falha ao invalidar o cache depois do commit não desfaz nem esconde a gravação."""
+    class BrokenCache(NullQueryCache):
+        def invalidate_points(self, points):
+            raise ConnectionError("cache fora do ar")
+
+    previous_cache = get_query_cache()
+    set_query_cache(BrokenCache())
+    try:
+        name = f"CacheFora{uuid.uuid4().hex[:8]}"
+        created = client.post("/api/pois/", json={"name": name, "x": 3, "y": 3}).json()
+        assert created["success"] is True
+        poi_id = created["poi"]["id"]
+        assert client.put(f"/api/pois/{poi_id}", json={"x": 5}).json()["poi"]["x"] == 5
+        assert client.delete(f"/api/pois/{poi_id}").json()["success"] is True
+    finally:
+        set_query_cache(previous_cache)
+    assert client.get(f"/api/pois/by-name?name={name}").json()["results"] == []
+
+def test_changes_since_version(monkeypatch):
+    """Testa o feed de mudanças: só o que mudou depois da versão, a última mudança de cada POI."""
+    monkeypatch.delenv("CHANGE_LOG", raising=False)
+    assert client.get("/api/changes/version").status_code == 404
+    monkeypatch.setenv("CHANGE_LOG", "on")
+    since = client.get("/api/changes/version").json()["version"]
+    poi_id = client.post("/api/pois/", json={"name": "Mudanca", "x": 4, "y": 4}).json()["poi"]["id"]
+    client.put(f"/api/pois/{poi_id}", json={"name": "Mudanca2"})
+    data = client.get(f"/api/changes?since={since}").json()
+    assert [change[1:] for change in data["changes"]] == [["U", poi_id, "Mudanca2", 4, 4]]
+    client.delete(f"/api/pois/{poi_id}")
+    lines = client.get(f"/api/changes?since={data['version']}&format=ndjson").text.splitlines()
+    assert orjson.loads(lines[0])[1:] == ["D", poi_id]
+    assert orjson.loads(lines[-1])["version"] > data["version"]
+
+def test_viewport_points_and_clusters():
+    """Testa o viewport: POIs individuais quando esparso, grupos por célula quando denso."""
+    base = 10**7 + uuid.uuid4().int % 10**6 * 100  # região vazia, mesmo repetindo o teste
+    for i in range(3):
+        client.post("/api/pois/", json={"name": f"Viewport{i}", "x": base + i, "y": base})
+    box = {"min_x": base, "min_y": base, "max_x": base + 99, "max_y": base + 99}
+    sparse = client.get("/api/viewport", params=box).json()
+    assert sparse["total"] == 3 and len(sparse["results"]) == 3 and sparse["clusters"] == []
+    dense = client.get("/api/viewport", params={**box, "max_points": 2, "cell_size": 100}).json()
+    assert dense["results"] == [] and dense["clusters"] == [{"x": base + 1.0, "y": float(base), "count": 3}]
+
+def test_list_pois_binary_columns():
+    """Testa a negociação de conteúdo: mesmo resultado do JSON no formato binário colunar."""
+    client.post("/api/pois/", json={"name": "Binário", "x": 3, "y": 4})
+    expected = client.get("/api/list?limit=50").json()
+    response = client.get("/api/list?limit=50", headers={"Accept": COLUMNS_MEDIA_TYPE})
+    assert response.headers["content-type"] == COLUMNS_MEDIA_TYPE
+    rows, next_after = read_columns(response.content)
+    assert [{"id": i, "name": n, "x": x, "y": y} for i, n, x, y in rows] == expected["results"]
+    assert next_after == expected.get("next_after")
+
 # Teste para inspecionar as rotas
 def test_all_routes():
     """Testa todas as rotas para ver quais estão funcionando"""
@@ -96,3 +206,80 @@ def test_all_routes():
         print(f"{method} {path} -> {response.status_code}")
         # Aceita 200, 404, 422 (rota existe, mas pode faltar dado)
         assert response.status_code in [200, 404, 422]
+
+def test_search_batch_matches_single_searches():
+    """Testa se o lote devolve, por consulta, os mesmos POIs de chamadas individuais a /api/search (banco e índice em memória)."""
+    for i in range(150):
+        client.post("/api/pois/", json={"name": f"Lote {i}", "x": 5000 + (i * 37) % 200, "y": 5000 + (i * 91) % 200})
+    # Caixas sobrepostas, uma consulta vazia e uma com distância negativa
+    queries = [{"x": 5000 + dx, "y": 5000 + dy, "max_distance": d}
+               for dx, dy, d in ((100, 100, 60), (120, 90, 60), (100, 100, 200), (50, 150, 25), (900, 900, 10), (100, 100, -1))]
+
+    def assert_parity():
+        response = client.post("/api/search/batch", json={"queries": queries})
+        assert response.status_code == 200
+        batch = response.json()["results"]
+        assert len(batch) == len(queries)
+        for query, result in zip(queries, batch):
+            single = client.post("/api/search", json=query).json()["results"]
+            assert sorted(result["results"], key=lambda poi: poi["id"]) == sorted(single, key=lambda poi: poi["id"])
+        assert batch[2]["results"] and batch[4]["results"] == [] and batch[5]["results"] == []
+        direct = find_nearby_pois_batch([(q["x"], q["y"], q["max_distance"]) for q in queries])
+        assert [sorted(poi.id for poi in pois) for pois in direct] == [sorted(poi["id"] for poi in r["results"]) for r in batch]
+
+    previous_cache = get_query_cache()
+    set_query_cache(NullQueryCache())
+    try:
+        assert_parity()
+        build_spatial_index(cell_size=64)
+        assert_parity()
+    finally:
+        set_spatial_index(None)
+        set_query_cache(previous_cache)
+
+def test_list_pois_keyset_pagination_walks_every_page():
+    """Testa se seguir o next_after de /api/list até null percorre todos os POIs uma única vez, em ordem de id."""
+    for i in range(23):
+        client.post("/api/pois/", json={"name": f"Pagina {i}", "x": i, "y": i})
+    expected = [poi["id"] for poi in client.get("/api/list").json()["results"]]
+
+    seen, after = [], None
+    while True:
+        params = {"limit": 7} if after is None else {"limit": 7, "after": after}
+        page = client.get("/api/list", params=params).json()
+        assert len(page["results"]) <= 7
+        seen.extend(poi["id"] for poi in page["results"])
+        after = page.get("next_after")
+        if after is None:
+            break
+        assert after == page["results"][-1]["id"]
+    assert seen == expected
+    assert len(set(seen)) == len(seen)
+
+def test_list_pois_ndjson_matches_json():
+    """Testa se o streaming NDJSON (format=ndjson e Accept) traz as mesmas linhas da listagem JSON."""
+    client.post("/api/pois/", json={"name": "NDJSON ç", "x": 3, "y": 4})
+    listing = client.get("/api/list").json()["results"]
+    for response in (client.get("/api/list?format=ndjson"),
+                     client.get("/api/list", headers={"Accept": "application/x-ndjson"})):
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [orjson.loads(line) for line in response.content.splitlines()]
+        assert lines == listing
+
+    after = listing[len(listing) // 2]["id"]
+    tail = [orjson.loads(line) for line in client.get(f"/api/list?format=ndjson&after={after}").content.splitlines()]
+    assert tail == [poi for poi in listing if poi["id"] > after]
+
+def test_search_pois_by_name_is_literal_and_bounded():
+    """Testa se % e _ na busca por nome são literais e se o limite padrão é aplicado."""
+    client.post("/api/pois/", json={"name": "Taxa 100% ok", "x": 1, "y": 1})
+    client.post("/api/pois/", json={"name": "Taxa 100X ok", "x": 1, "y": 1})
+    names = [poi["name"] for poi in client.get("/api/pois/by-name", params={"name": "100%"}).json()["results"]]
+    assert "Taxa 100% ok" in names and "Taxa 100X ok" not in names
+    assert all("_" in name for name in (poi["name"] for poi in client.get("/api/pois/by-name", params={"name": "_"}).json()["results"]))
+
+    for i in range(105):
+        client.post("/api/pois/", json={"name": f"Limitado {i}", "x": 2, "y": 2})
+    assert len(client.get("/api/pois/by-name", params={"name": "Limitado"}).json()["results"]) == 100
+    assert len(client.get("/api/pois/by-name", params={"name": "Limitado", "limit": 200}).json()["results"]) >= 105
@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.services import finder, importer
+from app.services.importer import MAX_ERRORS_PER_CHUNK, LineSplitter, RecordParser, import_chunk, validate_record
+from app.services.upsert import dedupe
+from app.services.zorder import morton_key
+
+def test_line_splitter_partial_chunks():
+    """Testa se linhas quebradas entre blocos (inclusive no meio de um UTF-8) são remontadas."""
+    data = '{"name": "Café", "x": 1, "y": 2}\n{"name": "Pão"'.encode("utf-8")
+    splitter = LineSplitter()
+    lines = []
+    for i in range(0, len(data), 3):
+        lines += splitter.feed(data[i:i + 3])
+    lines += splitter.feed(b', "x": 3, "y": 4}')
+    lines += splitter.close()
+    assert lines == ['{"name": "Café", "x": 1, "y": 2}', '{"name": "Pão", "x": 3, "y": 4}']
+
+def test_record_parser_ndjson():
+    """Testa interpretação de linhas NDJSON válidas e inválidas."""
+    parser = RecordParser("ndjson")
+    assert parser.parse('{"name": "A", "x": 1, "y": 2}') == (1, {"name": "A", "x": 1, "y": 2}, None)
+    assert parser.parse("") is None
+    line, record, error = parser.parse("não é json")
+    assert line == 3 and record is None and error
+
+def test_record_parser_csv():
+    """Testa interpretação de CSV com cabeçalho."""
+    parser = RecordParser("csv")
+    assert parser.parse("name,x,y") is None
+    assert parser.parse('"Bar, do Zé",10,20\r\n') == (2, {"name": "Bar, do Zé", "x": "10", "y": "20"}, None)
+    assert parser.parse("A,1")[2] is not None
+
+def test_record_parser_csv_multiline_fields():
+    """Testa campos entre aspas com quebras de linha e aspas duplicadas, e aspas abertas no fim da entrada."""
+    parser = RecordParser("csv")
+    lines = 'name,x,y\n"Bar\n""do Zé""",1,2\n5" tela,3,4\n"aberto,5,6\n'.split("\n")
+    parsed = [parser.parse(line) for line in lines]
+    assert [p for p in parsed if p is not None] == [
+        (2, {"name": 'Bar\n"do Zé"', "x": "1", "y": "2"}, None),
+        (4, {"name": '5" tela', "x": "3", "y": "4"}, None),
+    ]
+    assert parser.close() == (5, None, "aspas não fechadas")
+    assert parser.close() is None
+
+def test_validate_record_rejects_negative():
+    """Testa se coordenadas negativas são rejeitadas antes de chegar ao banco."""
+    assert validate_record({"name": "A", "x": "1", "y": 2}).x == 1
+    with pytest.raises(ValueError):
+        validate_record({"name": "A", "x": -1, "y": 2})
+
+def test_validate_record_external_id():
+    """Testa se o external_id é opcional e se um valor em branco (CSV) vale como ausente."""
+    assert validate_record({"name": "A", "x": 1, "y": 2}).external_id is None
+    assert validate_record({"name": "A", "x": "1", "y": "2", "external_id": ""}).external_id is None
+    assert validate_record({"name": "A", "x": 1, "y": 2, "external_id": "feed-1"}).external_id == "feed-1"
+
+def test_dedupe_in_batch():
+    """Testa o dedup do lote: mesma chave (external_id ou name, x, y) vira um registro, com os valores do último."""
+    records = [("A", 1, 1, "e1"), ("B", 2, 2, None), ("A2", 5, 5, "e1"), ("B", 2, 2, None), ("B", 2, 2, "e2")]
+    unique, discarded = dedupe(records)
+    assert unique == [("A2", 5, 5, "e1"), ("B", 2, 2, None), ("B", 2, 2, "e2")]
+    assert discarded == 2
+
+def test_import_chunk_hides_write_errors(monkeypatch):
+    """Testa se a falha de gravação vira uma mensagem genérica e se o limite de erros por lote vale para ela."""
+    def fail(rows):
+        raise RuntimeError('duplicate key value violates unique constraint "pois_pkey" (x)=(1)')
+    monkeypatch.setattr(importer, "_write_rows", fail)
+
+    report = import_chunk(1, [(1, {"name": "A", "x": 1, "y": 2}, None)])
+    assert report.accepted == 0 and report.rejected == 1
+    assert report.errors == ["falha ao gravar o lote"]
+
+    invalid = [(line, None, "inválida") for line in range(1, MAX_ERRORS_PER_CHUNK + 1)]
+    report = import_chunk(2, invalid + [(99, {"name": "A", "x": 1, "y": 2}, None)])
+    assert report.rejected == MAX_ERRORS_PER_CHUNK + 1
+    assert len(report.errors) == MAX_ERRORS_PER_CHUNK
+
+def test_import_on_table_without_optional_columns(tmp_path, monkeypatch):
+    """Testa a importação em uma tabela anterior às migrações: sem external_id grava, com ele pede a migração, e zkey é gravada quando a coluna aparece."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'antiga.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE pois (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+                          "x INTEGER NOT NULL, y INTEGER NOT NULL)"))
+    monkeypatch.setattr(importer, "SessionLocal", sessionmaker(bind=engine))
+    assert import_chunk(1, [(1, {"name": "A", "x": 1, "y": 2}, None)]).accepted == 1
+    report = import_chunk(1, [(1, {"name": "A", "x": 1, "y": 2, "external_id": "e1"}, None)])
+    assert report.rejected == 1 and "migrar_upsert" in report.errors[0]
+
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE pois ADD COLUMN zkey BIGINT"))
+    monkeypatch.setattr(finder, "_optional_columns", {})
+    assert import_chunk(2, [(1, {"name": "B", "x": 3, "y": 4}, None)]).accepted == 1
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT name, zkey FROM pois ORDER BY id")).all() == [("A", None), ("B", morton_key(3, 4))]
@@ -0,0 +1,29 @@
+from app.services.metrics import Counter, Histogram, begin_request, finish_request, record_rows, stage, STAGE_SECONDS, ROWS_SCANNED
+
+def test_counter_and_histogram_render_prometheus_text():
+    """Testa o formato de exposição de contadores e histogramas."""
+    counter = Counter("t_total", "Teste.", ("route",))
+    counter.inc(2, "/a")
+    assert 't_total{route="/a"} 2.0' in counter.render()
+
+    histogram = Histogram("t_seconds", "Teste.", buckets=(0.1, 1.0))
+    histogram.observe(0.5)
+    lines = histogram.render()
+    assert 't_seconds_bucket{le="0.1"} 0.0' in lines
+    assert 't_seconds_bucket{le="1.0"} 1.0' in lines
+    assert 't_seconds_bucket{le="+Inf"} 1.0' in lines
+    assert "t_seconds_sum 0.5" in lines
+
+def test_stages_and_rows_are_published_per_route():
+    """Testa se as etapas e as linhas medidas durante uma requisição saem com o rótulo da rota."""
+    metrics, token = begin_request()
+    with stage("query"):
+        pass
+    record_rows(10, 3)
+    assert "query" in metrics.stages and (metrics.scanned, metrics.returned) == (10, 3)
+    finish_request(metrics, token, "POST", "/teste/metrics", 200, 0.01)
+
+    stage_lines = "\n".join(STAGE_SECONDS.render())
+    assert 'poi_stage_duration_seconds_count{route="/teste/metrics",stage="query"} 1.0' in stage_lines
+    assert 'poi_stage_duration_seconds_count{route="/teste/metrics",stage="other"} 1.0' in stage_lines
+    assert 'poi_rows_scanned_total{route="/teste/metrics"} 10.0' in ROWS_SCANNED.render()
@@ -0,0 +1,37 @@
+import random
+from app.services.name_index import NameIndex, similarity
+
+NAMES = ["Padaria do Zé", "Padaria Central", "Papelaria", "Pub", "Posto", "Supermercado", "Lanchonete"]
+
+def test_name_index_search_parity():
+    """Testa se a busca por substring no índice coincide com a varredura completa."""
+    rng = random.Random(1)
+    names = {i: rng.choice(NAMES) + f" {rng.randint(0, 50)}" for i in range(1, 500)}
+    index = NameIndex()
+    index.bulk_load(names.items())
+    for query in ["a", "pa", "ADA", "aria c", "Pub 1", "x", "ria do zé 4"]:
+        expected = sorted(i for i, name in names.items() if query.lower() in name.lower())
+        assert index.search(query) == expected
+
+def test_name_index_autocomplete_ranking_and_limit():
+    """Testa o autocompletar: só prefixos, ordenados pela similaridade e limitados."""
+    index = NameIndex()
+    index.bulk_load(enumerate(NAMES, start=1))
+    assert index.autocomplete("pad", limit=10) == [1, 2]
+    assert len(index.autocomplete("p", limit=2)) == 2
+    assert index.autocomplete("zzz", limit=5) == []
+
+def test_name_index_update_and_remove():
+    """Testa atualização e remoção incrementais."""
+    index = NameIndex()
+    index.insert(1, "Padaria")
+    index.insert(1, "Farmácia")
+    assert index.search("pad") == []
+    assert index.search("farm") == [1]
+    assert index.remove(1) is True
+    assert index.search("farm") == []
+
+def test_similarity_like_pg_trgm():
+    """Testa a similaridade de trigramas (igual a 1 para textos iguais)."""
+    assert similarity("Padaria", "padaria") == 1.0
+    assert similarity("abc", "xyz") == 0.0
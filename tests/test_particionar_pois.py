@@ -0,0 +1,34 @@
+import pytest
+from app.database import particionar_pois
+
+def test_tile_grid_and_partitions():
+    """Testa a grade de ladrilhos (padrão e informada), o limite de ladrilhos e as partições DEFAULT."""
+    assert particionar_pois.tile_grid(1599, 799) == (100, 16, 8)
+    assert particionar_pois.tile_grid(1000, 1000, tile=500) == (500, 3, 3)
+    with pytest.raises(ValueError):
+        particionar_pois.tile_grid(10 ** 6, 10 ** 6, tile=10)
+
+    ddl = particionar_pois.partition_ddl(500, 2, 3)
+    assert "CREATE TABLE pois_t1 PARTITION OF pois_tiled FOR VALUES FROM (500) TO (1000) PARTITION BY RANGE (y)" in ddl
+    assert "CREATE TABLE pois_t1_2 PARTITION OF pois_t1 FOR VALUES FROM (1000) TO (1500)" in ddl
+    assert ddl[-1] == "CREATE TABLE pois_t_default PARTITION OF pois_tiled DEFAULT"
+    assert len(ddl) == 2 * (1 + 3 + 1) + 1
+
+def test_tiled_index_ddl():
+    """Testa se os índices de pois são recriados em pois_tiled e se índices únicos sem x e y deixam de ser únicos."""
+    ddl, dropped = particionar_pois.tiled_index_ddl(
+        "ix_pois_x_y", "CREATE INDEX ix_pois_x_y ON public.pois USING btree (x, y)", False, ["x", "y"])
+    assert ddl == "CREATE INDEX ix_pois_x_y_tiled ON pois_tiled USING btree (x, y)"
+    assert not dropped
+
+    ddl, dropped = particionar_pois.tiled_index_ddl(
+        "ux_pois_external_id", "CREATE UNIQUE INDEX ux_pois_external_id ON public.pois USING btree (external_id)",
+        True, ["external_id"])
+    assert ddl == "CREATE INDEX ux_pois_external_id_tiled ON pois_tiled USING btree (external_id)"
+    assert dropped
+
+    ddl, dropped = particionar_pois.tiled_index_ddl(
+        "ux_pois_natural_key", "CREATE UNIQUE INDEX ux_pois_natural_key ON public.pois USING btree (name, x, y)",
+        True, ["name", "x", "y"])
+    assert ddl.startswith("CREATE UNIQUE INDEX ux_pois_natural_key_tiled ON pois_tiled")
+    assert not dropped
@@ -0,0 +1,27 @@
+import asyncio
+import httpx
+from app.main import app
+from app.database.pgsql import async_engine
+
+# Teste de carga: muito mais requisições simultâneas do que conexões no pool
+CONCURRENT_REQUESTS = 200
+
+async def _burst():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        requests = []
+        for i in range(CONCURRENT_REQUESTS):
+            if i % 3 == 0:
+                requests.append(client.post("/api/search", json={"x": i, "y": i, "max_distance": 50}))
+            elif i % 3 == 1:
+                requests.append(client.get("/api/pois/by-name", params={"name": "POI"}))
+            else:
+                requests.append(client.get("/api/list", params={"limit": 10}))
+        return await asyncio.gather(*requests)
+
+def test_pool_under_concurrent_load():
+    """Testa se o pool atende muitas requisições simultâneas sem esgotar e devolve todas as conexões."""
+    responses = asyncio.run(_burst())
+    assert all(response.status_code == 200 for response in responses)
+    # Cada requisição usa uma sessão (get_async_db) que é devolvida ao pool no final
+    assert async_engine.pool.checkedout() == 0
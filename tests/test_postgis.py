@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from app.models.point import POI
+from app.services import finder
+
+def compile_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+@pytest.fixture
+def postgis():
+    finder.set_spatial_backend("postgis")
+    yield
+    finder.set_spatial_backend("sql")
+
+def test_postgis_statements(postgis):
+    """Testa se o modo PostGIS usa ST_DWithin, o operador <-> e caixas com && (mantendo a checagem exata)."""
+    nearby = compile_sql(finder.nearby_statement(20, 10, 10))
+    assert "ST_DWithin(pois.geom, ST_MakePoint(" in nearby
+    assert "CAST(pois.y AS BIGINT)" in nearby
+
+    nearest = compile_sql(finder.nearest_statement(20, 10, 5, finder.initial_nearest_radius(None)))
+    assert "pois.geom <-> ST_MakePoint(" in nearest
+    assert "ST_DWithin" not in nearest
+    assert "ST_DWithin" in compile_sql(finder.nearest_statement(20, 10, 5, finder.initial_nearest_radius(30)))
+
+    boxes = compile_sql(select(POI.id).where(finder.boxes_filter([(0, 0, 10, 10), (5, 5, 20, 20)])))
+    assert boxes.count("pois.geom && ST_MakeEnvelope(") == 2
+
+def test_spatial_backend_switch():
+    """Testa se o modo SQL puro não usa funções do PostGIS e se backends desconhecidos são rejeitados."""
+    assert finder.spatial_backend() == "sql"
+    assert "geom" not in compile_sql(finder.nearby_statement(20, 10, 10))
+    assert "geom" not in compile_sql(finder.nearest_statement(20, 10, 5, 64))
+    with pytest.raises(ValueError):
+        finder.set_spatial_backend("oracle")
+    assert finder.spatial_backend() == "sql"
+
+def test_tiled_layout_statements(postgis):
+    """Testa se o layout em ladrilhos soma as faixas de x e y (poda de partições) aos filtros do PostGIS."""
+    finder.set_tiled_layout(True)
+    try:
+        nearby = compile_sql(finder.nearby_statement(20, 10, 10))
+        assert "ST_DWithin" in nearby
+        assert "pois.x BETWEEN" in nearby and "pois.y BETWEEN" in nearby
+        nearest = compile_sql(finder.nearest_statement(20, 10, 5, finder.initial_nearest_radius(30)))
+        assert "pois.x BETWEEN" in nearest
+        boxes = compile_sql(select(POI.id).where(finder.boxes_filter([(0, 0, 10, 10)])))
+        assert "pois.geom && ST_MakeEnvelope(" in boxes and "pois.x BETWEEN" in boxes
+    finally:
+        finder.set_tiled_layout(False)
+    assert "BETWEEN" not in compile_sql(finder.nearby_statement(20, 10, 10))
@@ -0,0 +1,42 @@
+import orjson
+from app.schemas.poi_schema import POIItem, POISearchResponse, POIPageResponse, POIDistanceItem, POINearestResponse
+from app.services.changes import compact
+from app.services.serializers import search_json, nearest_json, ndjson_line, changes_json, changes_ndjson, rows_binary, read_columns
+
+ROWS = [(1, "Lanchonete", 27, 12), (2, "Café São João", 0, 2147483647)]
+
+def test_search_json_matches_response_model():
+    """Testa se o JSON gerado das tuplas é igual ao do POISearchResponse/POIPageResponse."""
+    expected = POISearchResponse(results=[POIItem(id=i, name=n, x=x, y=y) for i, n, x, y in ROWS])
+    assert search_json(ROWS) == expected.model_dump_json().encode()
+    page = POIPageResponse(results=expected.results, next_after=2)
+    assert orjson.loads(search_json(ROWS, next_after=2)) == page.model_dump()
+    assert orjson.loads(search_json([])) == {"results": []}
+
+def test_nearest_json_and_ndjson():
+    """Testa o JSON da busca k-NN e as linhas NDJSON."""
+    rows = [row + (5.0,) for row in ROWS]
+    expected = POINearestResponse(results=[POIDistanceItem(id=i, name=n, x=x, y=y, distance=d) for i, n, x, y, d in rows])
+    assert nearest_json(rows) == expected.model_dump_json().encode()
+    assert ndjson_line(ROWS[1]).decode("utf-8") == '{"id":2,"name":"Café São João","x":0,"y":2147483647}\n'
+
+def test_changes_compact_and_json():
+    """Testa a compactação do feed de mudanças (última mudança por POI) e sua forma compacta."""
+    rows = [(1, "I", 7, "A", 1, 1), (2, "I", 8, "B", 2, 2), (3, "U", 7, "A2", 1, 1), (4, "D", 8, None, None, None)]
+    changes = compact(rows)
+    assert changes == [rows[2], rows[3]]
+    assert orjson.loads(changes_json(changes, 4, False)) == {
+        "changes": [[3, "U", 7, "A2", 1, 1], [4, "D", 8]], "version": 4, "more": False}
+    lines = list(changes_ndjson([changes, []], since=0))
+    assert lines[-1] == b'{"version":4}\n' and len(lines) == 3
+    assert list(changes_ndjson([], since=9)) == [b'{"version":9}\n']
+
+def test_rows_binary_round_trip():
+    """Testa o formato binário colunar: linhas, distâncias e next_after voltam iguais."""
+    assert read_columns(rows_binary(ROWS, next_after=2)) == (ROWS, 2)
+    nearest = [row + (1.5,) for row in ROWS]
+    assert read_columns(rows_binary(nearest)) == (nearest, None)
+    assert read_columns(rows_binary([])) == ([], None)
+    # Colunas de tamanho fixo: 24 de cabeçalho + 12 por POI + offsets + nomes
+    body = rows_binary(ROWS)
+    assert len(body) == 24 + 12 * 2 + 4 * 3 + len("Lanchonete") + len("Café São João".encode("utf-8"))
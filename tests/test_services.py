@@ -1,5 +1,5 @@
 import pytest
-from app.services.finder import list_pois, find_poi_by_name, find_pois_nearby
+from app.services.finder import list_pois, find_pois as find_poi_by_name, find_nearby_pois as find_pois_nearby
 
 def test_list_pois():
 	"""Testa se a função retorna uma lista de POIs."""
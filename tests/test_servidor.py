@@ -0,0 +1,36 @@
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.metrics import process_memory
+from app.servidor import main
+
+def test_ready_after_warmup():
+    """Testa se /ready só responde 200 depois do startup (warmup) da aplicação."""
+    client = TestClient(app)
+    assert client.get("/ready").status_code == 503
+    with TestClient(app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="usa /proc/<pid>/smaps_rollup")
+def test_process_memory():
+    """Testa a leitura de RSS, PSS e USS do próprio processo."""
+    memory = process_memory()
+    assert memory["rss"] >= memory["pss"] >= memory["uss"] > 0
+    assert process_memory("999999999") == {}
+
+def test_workers_require_shared_index(monkeypatch, capsys):
+    """Testa se vários workers são recusados com índices privados a cada processo."""
+    monkeypatch.delenv("NAME_INDEX", raising=False)
+    monkeypatch.setenv("SPATIAL_INDEX", "memory")
+    with pytest.raises(SystemExit):
+        main(["--workers", "2"])
+    assert "SNAPSHOT_PATH" in capsys.readouterr().err
+
+    monkeypatch.setenv("SPATIAL_INDEX", "snapshot")
+    monkeypatch.delenv("SNAPSHOT_PATH", raising=False)
+    with pytest.raises(SystemExit):
+        main(["--workers", "2"])
+    assert "SPATIAL_INDEX=snapshot sem SNAPSHOT_PATH" in capsys.readouterr().err
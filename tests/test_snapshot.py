@@ -0,0 +1,96 @@
+import math
+import random
+import pytest
+from app.services.snapshot import ColumnarSnapshot
+from app.services.serializers import columns_binary, read_columns
+
+def brute_force(points, x, y, max_distance):
+    """Filtro original: percorre todos os pontos calculando a distância."""
+    return sorted(
+        poi_id for poi_id, px, py in points
+        if math.sqrt((px - x)**2 + (py - y)**2) <= max_distance
+    )
+
+@pytest.fixture
+def points():
+    rng = random.Random(42)
+    return [(i, rng.randint(0, 1000), rng.randint(0, 1000)) for i in range(1, 2001)]
+
+def snapshot_of(points, path=None):
+    rows = [(poi_id, f"POI {poi_id} ç", x, y) for poi_id, x, y in points]
+    return ColumnarSnapshot(lambda: rows, path=path).load()
+
+def test_snapshot_parity(points, tmp_path):
+    """Testa se a busca vetorizada do snapshot (em memória e mapeado em arquivo) coincide com a força bruta."""
+    for snapshot in (snapshot_of(points), snapshot_of(points, str(tmp_path / "pois.snap"))):
+        rng = random.Random(7)
+        for _ in range(200):
+            x, y = rng.randint(-50, 1050), rng.randint(-50, 1050)
+            d = rng.choice([0, 1, 5, 30, 120, 700, 2000])
+            got = sorted(poi_id for poi_id, _, _ in snapshot.query_radius(x, y, d))
+            assert got == brute_force(points, x, y, d)
+        assert snapshot.name_of(7) == "POI 7 ç"
+        rows = snapshot.query_rows(500, 500, 40)
+        assert sorted(r[0] for r in rows) == brute_force(points, 500, 500, 40)
+        assert all(name == f"POI {poi_id} ç" for poi_id, name, _, _ in rows)
+        assert snapshot.query_radius(0, 0, -1) == []
+
+def test_snapshot_nearest_parity(points):
+    """Testa se o k-NN do snapshot coincide com ordenar todos os pontos pela distância."""
+    snapshot = snapshot_of(points)
+    rng = random.Random(3)
+    for _ in range(100):
+        x, y = rng.randint(-500, 1500), rng.randint(-500, 1500)
+        k = rng.choice([1, 5, 10, 50])
+        max_distance = rng.choice([None, 0, 25, 300])
+        expected = sorted(
+            ((px - x)**2 + (py - y)**2, poi_id) for poi_id, px, py in points
+            if max_distance is None or math.sqrt((px - x)**2 + (py - y)**2) <= max_distance
+        )[:k]
+        got = snapshot.nearest(x, y, k, max_distance)
+        assert [r[0] for r in got] == [poi_id for _, poi_id in expected]
+        assert [r[3] for r in got] == [math.sqrt(d2) for d2, _ in expected]
+
+def test_snapshot_incremental_overlay_and_refresh(points, tmp_path):
+    """Testa as gravações incrementais (overlay) e a troca do arquivo por outro processo."""
+    rows = [(poi_id, "p", x, y) for poi_id, x, y in points]
+    path = str(tmp_path / "pois.snap")
+    snapshot = ColumnarSnapshot(lambda: rows, path=path).load()
+
+    snapshot.insert(1, "Movido", 5000, 5000)
+    assert [r[0] for r in snapshot.query_radius(5000, 5000, 0)] == [1]
+    assert snapshot.name_of(1) == "Movido"
+    assert snapshot.nearest_rows(5000, 5000, 1) == [(1, "Movido", 5000, 5000, 0.0)]
+    assert snapshot.nearest_rows(points[2][1], points[2][2], 1)[0][:2] == (3, "p")
+    assert 1 not in [r[0] for r in snapshot.query_radius(points[0][1], points[0][2], 0)]
+
+    assert snapshot.remove(2) is True
+    assert 2 not in snapshot
+    assert len(snapshot) == len(points) - 1
+
+    # Outro processo regrava o arquivo a partir do banco já atualizado
+    rows[0] = (1, "Movido", 5000, 5000)
+    del rows[1]
+    other = ColumnarSnapshot(lambda: rows, path=path, max_age=0).load()
+    assert [r[0] for r in other.query_radius(5000, 5000, 0)] == [1]
+
+    snapshot._checked_at = 0
+    snapshot._check()
+    assert snapshot._overlay == {} and snapshot._deleted == {}
+    assert [r[0] for r in snapshot.query_radius(5000, 5000, 0)] == [1]
+    assert len(snapshot) == len(points) - 1
+
+def test_snapshot_empty():
+    """Testa buscas em snapshot vazio."""
+    snapshot = ColumnarSnapshot(lambda: []).load()
+    assert snapshot.query_radius(0, 0, 10) == []
+    assert snapshot.nearest(0, 0, 5) == []
+
+def test_snapshot_query_columns_matches_rows(points):
+    """Testa se as colunas da busca (com overlay) decodificam nas mesmas linhas de query_rows."""
+    snapshot = snapshot_of(points)
+    snapshot.insert(5000, "Novo é", 500, 500)
+    snapshot.remove(points[0][0])
+    for x, y, d in ((500, 500, 60), (0, 0, 3), (500, 500, 2000), (500, 500, -1)):
+        rows, _ = read_columns(columns_binary(*snapshot.query_columns(x, y, d)))
+        assert rows == snapshot.query_rows(x, y, d)
@@ -0,0 +1,44 @@
+import pytest
+from benchmarks.soak import LatencyHistogram, check_slos, parse_gauges, parse_mix, trend
+
+def test_latency_histogram_percentiles_within_bucket_error():
+    """Testa se os percentis do histograma logarítmico ficam a até 5% do valor exato."""
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.observe(float(ms))
+    assert histogram.count == 1000 and histogram.max == 1000.0
+    assert 500 <= histogram.percentile(50) <= 500 * 1.05
+    assert 990 <= histogram.percentile(99) <= 1000
+    assert histogram.percentile(100) == 1000.0
+
+    other = LatencyHistogram()
+    other.observe(5000.0)
+    histogram.merge(other)
+    assert histogram.count == 1001 and histogram.percentile(100) == 5000.0
+
+def test_mix_and_slo_checks():
+    """Testa a validação de --mix e as violações de SLO de p99 e de taxa de erros."""
+    assert parse_mix(["search=3", "by_name=1"]) == {"search": 3.0, "by_name": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix(["inexistente=1"])
+    with pytest.raises(ValueError):
+        parse_mix(["search"])
+
+    routes = {
+        "search": {"n": 100, "p99_ms": 80.0, "error_rate": 0.0},
+        "create": {"n": 10, "p99_ms": 20.0, "error_rate": 0.1},
+    }
+    overall = {"n": 110, "p99_ms": 80.0, "error_rate": 1 / 110}
+    violations = check_slos(routes, overall, {"search": 50, "all": 100, "viewport": 10}, max_error_rate=0.05)
+    assert any(v.startswith("SLO de search") for v in violations)
+    assert any(v.startswith("SLO de viewport") for v in violations)
+    assert not any(v.startswith("SLO de all") for v in violations)
+    assert any(v.startswith("Erros em create") for v in violations)
+    assert not any(v.startswith("Erros em all") for v in violations)
+
+def test_memory_trend_and_gauges():
+    """Testa a tendência linear da memória e a leitura dos gauges do /metrics."""
+    assert trend([(0, 100.0), (10, 110.0), (20, 120.0)]) == pytest.approx(1.0)
+    assert trend([(0, 100.0)]) == 0.0
+    body = "# TYPE poi_db_pool_checked_out gauge\npoi_db_pool_checked_out 2\npoi_db_pool_size 10\n"
+    assert parse_gauges(body, ("poi_db_pool_checked_out", "poi_db_sync_pool_checked_out")) == {"poi_db_pool_checked_out": 2.0}
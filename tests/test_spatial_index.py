@@ -0,0 +1,136 @@
+import asyncio
+import math
+import random
+import threading
+import pytest
+import numpy as np
+from app.services import async_finder
+from app.services.cache import NullQueryCache, get_query_cache, set_query_cache
+from app.services.finder import batch_matches
+from app.services.spatial_index import GridIndex, set_spatial_index
+
+def brute_force(points, x, y, max_distance):
+    """Filtro original: percorre todos os pontos calculando a distância."""
+    return sorted(
+        poi_id for poi_id, px, py in points
+        if math.sqrt((px - x)**2 + (py - y)**2) <= max_distance
+    )
+
+@pytest.fixture
+def points():
+    rng = random.Random(42)
+    return [(i, rng.randint(0, 1000), rng.randint(0, 1000)) for i in range(1, 2001)]
+
+def test_grid_index_parity(points):
+    """Testa se a busca no índice retorna os mesmos POIs que a força bruta."""
+    index = GridIndex(cell_size=50)
+    index.bulk_load((poi_id, f"POI {poi_id}", x, y) for poi_id, x, y in points)
+    rng = random.Random(7)
+    for _ in range(200):
+        x, y = rng.randint(-50, 1050), rng.randint(-50, 1050)
+        d = rng.choice([0, 1, 5, 30, 120, 700, 2000])
+        got = sorted(poi_id for poi_id, _, _ in index.query_radius(x, y, d))
+        assert got == brute_force(points, x, y, d)
+
+def test_grid_index_incremental_updates(points):
+    """Testa inserção, atualização e remoção incrementais no índice."""
+    index = GridIndex(cell_size=16)
+    index.bulk_load((poi_id, "p", x, y) for poi_id, x, y in points)
+
+    index.insert(1, "Movido", 5000, 5000)
+    assert [r[0] for r in index.query_radius(5000, 5000, 0)] == [1]
+    assert index.name_of(1) == "Movido"
+
+    assert index.remove(1) is True
+    assert index.remove(1) is False
+    assert index.query_radius(5000, 5000, 0) == []
+    assert len(index) == len(points) - 1
+
+def test_grid_index_negative_distance():
+    """Testa busca com distância negativa (sem resultados)."""
+    index = GridIndex()
+    index.insert(1, "A", 0, 0)
+    assert index.query_radius(0, 0, -1) == []
+
+def test_grid_index_nearest_parity(points):
+    """Testa se o k-NN do índice coincide com ordenar todos os pontos pela distância."""
+    index = GridIndex(cell_size=40)
+    index.bulk_load((poi_id, "p", x, y) for poi_id, x, y in points)
+    rng = random.Random(3)
+    for _ in range(100):
+        x, y = rng.randint(-500, 1500), rng.randint(-500, 1500)
+        k = rng.choice([1, 5, 10, 50])
+        max_distance = rng.choice([None, 0, 25, 300])
+        expected = sorted(
+            ((px - x)**2 + (py - y)**2, poi_id) for poi_id, px, py in points
+            if max_distance is None or math.sqrt((px - x)**2 + (py - y)**2) <= max_distance
+        )[:k]
+        got = index.nearest(x, y, k, max_distance)
+        assert [r[0] for r in got] == [poi_id for _, poi_id in expected]
+        assert [r[3] for r in got] == [math.sqrt(d2) for d2, _ in expected]
+
+def test_grid_index_nearest_empty():
+    """Testa k-NN em índice vazio."""
+    assert GridIndex().nearest(0, 0, 5) == []
+
+def test_grid_index_nearest_rows_with_concurrent_removals(points):
+    """Testa se o k-NN com nomes não falha quando outro thread remove e reinsere os POIs."""
+    index = GridIndex(cell_size=40)
+    index.bulk_load((poi_id, f"POI {poi_id}", x, y) for poi_id, x, y in points)
+    stop = threading.Event()
+
+    def churn():
+        while not stop.is_set():
+            for poi_id, x, y in points[:200]:
+                index.remove(poi_id)
+                index.insert(poi_id, f"POI {poi_id}", x, y)
+
+    thread = threading.Thread(target=churn)
+    thread.start()
+    try:
+        for _ in range(300):
+            rows = index.nearest_rows(points[0][1], points[0][2], 20)
+            assert all(name == f"POI {poi_id}" for poi_id, name, _, _, _ in rows)
+    finally:
+        stop.set()
+        thread.join()
+
+def test_batch_matches_parity(points):
+    """Testa se o filtro vetorizado do lote (consultas x candidatos) coincide com a força bruta por consulta."""
+    cand_x = np.array([x for _, x, _ in points], dtype=np.int64)
+    cand_y = np.array([y for _, _, y in points], dtype=np.int64)
+    rng = random.Random(11)
+    queries = [(rng.randint(0, 1000), rng.randint(0, 1000), rng.choice([0, 10, 80, 400])) for _ in range(50)]
+    for (x, y, d), matches in zip(queries, batch_matches(queries, cand_x, cand_y)):
+        assert sorted(points[j][0] for j in matches) == brute_force(points, x, y, d)
+
+def test_large_index_searches_leave_the_event_loop(points, monkeypatch):
+    """Testa se buscas grandes no índice em memória rodam no pool de threads e as pequenas no próprio event loop."""
+    index = GridIndex(cell_size=50)
+    index.bulk_load((poi_id, f"POI {poi_id}", x, y) for poi_id, x, y in points)
+    threads = []
+    search = async_finder.nearby_from_index
+
+    def recorded(*args):
+        threads.append(threading.get_ident())
+        return search(*args)
+    monkeypatch.setattr(async_finder, "nearby_from_index", recorded)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        small = await async_finder.find_nearby_rows(None, 500, 500, async_finder.INDEX_INLINE_RADIUS)
+        large = await async_finder.find_nearby_rows(None, 500, 500, async_finder.INDEX_INLINE_RADIUS + 1)
+        batch = await async_finder.find_nearby_rows_batch(None, [(500, 500, 10)] * (async_finder.INDEX_INLINE_QUERIES + 1))
+        return loop_thread, small, large, batch
+
+    previous_cache = get_query_cache()
+    set_query_cache(NullQueryCache())
+    set_spatial_index(index)
+    try:
+        loop_thread, small, large, batch = asyncio.run(run())
+    finally:
+        set_spatial_index(None)
+        set_query_cache(previous_cache)
+    assert threads[0] == loop_thread and threads[1] != loop_thread
+    assert len(large) >= len(small) > 0
+    assert len(batch) == async_finder.INDEX_INLINE_QUERIES + 1 and batch[0]
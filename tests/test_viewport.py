@@ -0,0 +1,32 @@
+import random
+from collections import defaultdict
+import numpy as np
+import orjson
+from app.services.viewport import MAX_CELLS, aggregate_columns, viewport_cell_size
+from app.services.serializers import viewport_json
+
+def test_aggregate_columns_matches_python_grouping():
+    """Testa se o agrupamento NumPy por célula bate com o agrupamento feito ponto a ponto."""
+    rng = random.Random(7)
+    points = [(i, rng.randint(0, 500), rng.randint(0, 500)) for i in range(1, 1001)] + [(5000, 999, 999)]
+    ids, xs, ys = (np.array(col, dtype=np.int64) for col in zip(*points))
+    rows = aggregate_columns(ids, xs, ys, 50, lambda poi_id: f"POI {poi_id}")
+
+    cells = defaultdict(list)
+    for poi_id, x, y in points:
+        cells[(x // 50, y // 50)].append((poi_id, x, y))
+    expected = sorted(
+        (len(c), sum(p[1] for p in c) / len(c), sum(p[2] for p in c) / len(c)) for c in cells.values()
+    )
+    assert sorted((r[0], r[1], r[2]) for r in rows) == expected
+    assert (1, 999, 999, 5000, "POI 5000") in rows
+
+def test_viewport_cell_size_and_json():
+    """Testa o tamanho de célula efetivo e o JSON com POIs e grupos."""
+    assert viewport_cell_size(0, 0, 319, 99) == 10
+    assert viewport_cell_size(0, 0, 99, 99, cell_size=7) == 7
+    big = viewport_cell_size(0, 0, 10**6, 10**6, cell_size=1)
+    assert (10**6 // big + 1) ** 2 <= MAX_CELLS
+    body = orjson.loads(viewport_json([(1, 3, 4, 9, "Café"), (12, 10.5, 2.25, None, None)], 64))
+    assert body == {"total": 13, "cell_size": 64, "results": [{"id": 9, "name": "Café", "x": 3, "y": 4}],
+                    "clusters": [{"x": 10.5, "y": 2.25, "count": 12}]}
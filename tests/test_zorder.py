@@ -0,0 +1,42 @@
+import numpy as np
+from sqlalchemy.dialects import postgresql
+from app.services import finder
+from app.services.zorder import MAX_COORD, key_ranges, morton_key, morton_keys
+
+def test_morton_keys():
+    """Testa o intercalamento dos bits (x nos pares, y nos ímpares) e se a versão NumPy dá as mesmas chaves."""
+    assert [morton_key(x, y) for x, y in [(0, 0), (1, 0), (0, 1), (1, 1), (2, 0), (3, 3)]] == [0, 1, 2, 3, 4, 15]
+    assert morton_key(MAX_COORD, MAX_COORD) == (1 << 62) - 1
+    rng = np.random.default_rng(0)
+    xs, ys = rng.integers(0, MAX_COORD, 500), rng.integers(0, MAX_COORD, 500)
+    assert morton_keys(xs, ys).tolist() == [morton_key(int(x), int(y)) for x, y in zip(xs, ys)]
+
+def test_key_ranges_cover_box():
+    """Testa se as faixas cobrem todos os pontos da caixa, respeitam o limite e são ordenadas e disjuntas."""
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        x0, y0 = (int(v) for v in rng.integers(0, 5000, 2))
+        x1, y1 = x0 + int(rng.integers(0, 200)), y0 + int(rng.integers(0, 200))
+        ranges = key_ranges(x0, y0, x1, y1, max_ranges=8)
+        assert 1 <= len(ranges) <= 8
+        assert all(lo <= hi < next_lo for (lo, hi), (next_lo, _) in zip(ranges, ranges[1:]))
+        gx, gy = np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1))
+        keys = morton_keys(gx.ravel(), gy.ravel())
+        lows = np.array([lo for lo, _ in ranges])
+        highs = np.array([hi for _, hi in ranges])
+        slot = np.searchsorted(lows, keys, side="right") - 1
+        assert (slot >= 0).all() and (keys <= highs[slot]).all()
+    # Quadrante alinhado: uma única faixa exata; caixa fora do domínio: nenhuma
+    assert key_ranges(0, 0, 3, 3) == [(0, 15)]
+    assert key_ranges(0, 0, MAX_COORD, MAX_COORD) == [(0, (1 << 62) - 1)]
+    assert key_ranges(-10, -10, -1, -1) == []
+
+def test_zorder_backend_statement():
+    """Testa se o backend zorder filtra por faixas de zkey mantendo a caixa e a distância exata."""
+    finder.set_spatial_backend("zorder")
+    try:
+        sql = str(finder.nearby_statement(20, 10, 10).compile(dialect=postgresql.dialect()))
+    finally:
+        finder.set_spatial_backend("sql")
+    assert "pois.zkey BETWEEN" in sql
+    assert "pois.x BETWEEN" in sql and "CAST(pois.y AS BIGINT)" in sql